@@ -0,0 +1,101 @@
+"""
+Color rule benchmark: LUT classifier vs the original inRange chain.
+
+Checks that the LUT masks are bit-identical to the per-rule masks and
+reports the cost per megapixel of both paths.
+
+Usage:
+    python benchmarks/color_rules.py
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import floodPredictor as fp
+
+SIZES = [(720, 1280), (2160, 3840)]
+REPEATS = 5
+
+
+def reference_masks(frame):
+    """Per-pixel color masks exactly as the detectors built them before the LUT"""
+    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+    lab = cv2.cvtColor(frame, cv2.COLOR_BGR2LAB)
+
+    hsv_water = cv2.inRange(hsv, np.array([80, 30, 30]), np.array([150, 255, 255]))
+    hsv_water = cv2.bitwise_or(hsv_water, cv2.inRange(hsv, np.array([0, 0, 40]), np.array([35, 255, 130])))
+    hsv_water = cv2.bitwise_or(hsv_water, cv2.inRange(hsv, np.array([5, 40, 40]), np.array([30, 220, 170])))
+    hsv_water = cv2.bitwise_or(hsv_water, cv2.inRange(hsv, np.array([90, 20, 50]), np.array([130, 100, 150])))
+
+    vegetation = cv2.bitwise_or(
+        cv2.inRange(hsv, np.array([40, 30, 30]), np.array([85, 200, 180])),
+        cv2.inRange(hsv, np.array([0, 0, 20]), np.array([180, 80, 80])),
+    )
+
+    h, s, v = hsv[:, :, 0], hsv[:, :, 1], hsv[:, :, 2]
+    l, a, b = lab[:, :, 0], lab[:, :, 1], lab[:, :, 2]
+    mixed1 = ((h >= 35) & (h <= 95) & (s >= 30) & (s <= 150) &
+              (v >= 40) & (v <= 180)).astype(np.uint8) * 255
+    mixed2 = ((l >= 40) & (l <= 140) & (a >= 110) & (a <= 135) &
+              (b >= 110) & (b <= 145)).astype(np.uint8) * 255
+    mixed = cv2.bitwise_or(mixed1, mixed2)
+
+    luminance = ((l > 30) & (l < 120)).astype(np.uint8) * 255
+
+    return hsv_water, vegetation, mixed, luminance
+
+
+def lut_masks(frame):
+    rules = fp.classify_colors(frame)
+    return (
+        fp.rule_mask(rules, fp.HSV_WATER_BITS),
+        fp.rule_mask(rules, fp.VEGETATION_BITS),
+        fp.rule_mask(rules, fp.MIXED_BITS),
+        fp.rule_mask(rules, fp.LUMINANCE_BIT),
+    )
+
+
+def time_per_megapixel(fn, frame):
+    fn(frame)
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        fn(frame)
+    elapsed = (time.perf_counter() - start) / REPEATS
+    megapixels = frame.shape[0] * frame.shape[1] / 1e6
+    return elapsed * 1000 / megapixels
+
+
+def main():
+    start = time.perf_counter()
+    fp.get_color_lut()
+    print(f"LUT ready in {time.perf_counter() - start:.2f}s ({fp.COLOR_LUT_PATH.name})")
+
+    rng = np.random.default_rng(0)
+    frames = [(f"{w}x{h} random", rng.integers(0, 256, (h, w, 3), dtype=np.uint8)) for h, w in SIZES]
+    for path in sorted((fp.BASE_DIR / "test_images").glob("*.png")):
+        frame = cv2.imread(str(path))
+        if frame is not None:
+            frames.append((path.name, frame))
+
+    all_identical = True
+    print(f"\n{'frame':40s} {'inRange ms/MP':>14s} {'LUT ms/MP':>10s} {'speedup':>8s}  identical")
+    for name, frame in frames:
+        identical = all(np.array_equal(r, l) for r, l in zip(reference_masks(frame), lut_masks(frame)))
+        all_identical &= identical
+        ref_ms = time_per_megapixel(reference_masks, frame)
+        lut_ms = time_per_megapixel(lut_masks, frame)
+        print(f"{name:40s} {ref_ms:14.2f} {lut_ms:10.2f} {ref_ms / lut_ms:7.2f}x  {identical}")
+
+    if not all_identical:
+        print("\nLUT masks differ from the reference masks")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Overlay compositor benchmark: annotate_frame vs the per-channel overlay.
+
+Checks that annotate_frame renders exactly the same pixels as the
+original overlay code (per-channel astype/clip sums, full-frame copies
+for the blend and the legend) on the test images, synthetic 720p and 4K
+frames and small frames that clip the legend. Reports the time of both
+and how many full-frame allocations each makes. Exits with status 1 on
+any differing pixel.
+
+An allocation is counted for every interpreter step during which traced
+memory (numpy and OpenCV arrays) rose by at least one frame plane
+(height x width bytes) above where the step started, so several
+allocations inside one call count once.
+
+Usage:
+    python benchmarks/compositor.py [--repeat 5]
+"""
+
+import argparse
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import floodPredictor as fp
+from heatmap import synthetic_frame
+
+SYNTHETIC_SIZES = {"720p": (720, 1280), "4k": (2160, 3840), "small 90x160": (90, 160),
+                   "small 150x120": (150, 120)}
+
+
+def reference_annotate(frame, analysis):
+    """Original annotate_frame overlay and compositing"""
+    h, w = frame.shape[:2]
+    output = frame.copy()
+    zones = analysis["zones"]
+    heatmaps = fp.create_zone_heatmaps([zones["zone_a"], zones["zone_b"], zones["zone_c"]], frame.shape)
+    heatmap_a, heatmap_b, heatmap_c = heatmaps[:, :, 0], heatmaps[:, :, 1], heatmaps[:, :, 2]
+
+    overlay = np.zeros_like(frame)
+    overlay[:, :, 2] = np.clip(overlay[:, :, 2] + (heatmap_a * 255).astype(np.uint8), 0, 255)
+    overlay[:, :, 1] = np.clip(overlay[:, :, 1] + (heatmap_b * 200).astype(np.uint8), 0, 255)
+    overlay[:, :, 2] = np.clip(overlay[:, :, 2] + (heatmap_b * 255).astype(np.uint8), 0, 255)
+    overlay[:, :, 0] = np.clip(overlay[:, :, 0] + (heatmap_c * 255).astype(np.uint8), 0, 255)
+    overlay[:, :, 1] = np.clip(overlay[:, :, 1] + (heatmap_c * 255).astype(np.uint8), 0, 255)
+    output = cv2.addWeighted(output, 0.6, overlay, 0.4, 0)
+
+    output = fp.add_water_edge_labels(output, zones, analysis)
+    risk = analysis["risk_level"]
+    water_type = analysis["explainability"].get("water_body_type", "unknown")
+    header_text = f"FLOOD RISK: {risk} | {water_type.upper()} | Coverage: {analysis['water_coverage']}%"
+    cv2.rectangle(output, (0, 0), (w, 50), (0, 0, 0), -1)
+    risk_colors = {"Minimal": (0, 255, 0), "Low": (0, 200, 100), "Guarded": (0, 255, 255),
+                   "Elevated": (0, 165, 255), "Severe": (0, 100, 255), "Extreme": (0, 0, 255)}
+    cv2.putText(output, header_text, (20, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8,
+                risk_colors.get(risk, (255, 255, 255)), 2)
+
+    # Legend: the original blends a full-frame copy, then draws the items
+    legend_x, legend_y = w - 220, h - 140
+    overlay = output.copy()
+    cv2.rectangle(overlay, (legend_x, legend_y), (legend_x + 200, legend_y + 120), (0, 0, 0), -1)
+    output = cv2.addWeighted(output, 0.7, overlay, 0.3, 0)
+    cv2.putText(output, "FLOOD ANALYSIS", (legend_x + 10, legend_y + 20), cv2.FONT_HERSHEY_SIMPLEX,
+                0.5, (255, 255, 255), 1)
+    y_offset = 40
+    for label, color in (("Core Water", (0, 0, 200)), ("Risk Buffer", (0, 165, 255)),
+                         ("Low Risk", (255, 255, 0))):
+        cv2.rectangle(output, (legend_x + 10, legend_y + y_offset),
+                      (legend_x + 25, legend_y + y_offset + 10), color, -1)
+        cv2.putText(output, label, (legend_x + 35, legend_y + y_offset + 8), cv2.FONT_HERSHEY_SIMPLEX,
+                    0.4, (255, 255, 255), 1)
+        y_offset += 20
+    cv2.putText(output, f"Generated: {time.strftime('%Y-%m-%d %H:%M UTC')}", (20, h - 10),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.4, (200, 200, 200), 1)
+    return output
+
+
+def frames():
+    for path in sorted((fp.BASE_DIR / "test_images").glob("*.png")):
+        frame = cv2.imread(str(path))
+        if frame is not None:
+            yield path.name, frame
+    for name, size in SYNTHETIC_SIZES.items():
+        yield name, synthetic_frame(*size)
+
+
+def median_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def count_frame_allocations(fn, plane_bytes):
+    """Interpreter steps in fn whose traced memory rose by plane_bytes or more"""
+    state = {"count": 0, "base": 0}
+
+    def on_step(frame, event, arg):
+        frame.f_trace_opcodes = True
+        if event == "opcode":
+            current, peak = tracemalloc.get_traced_memory()
+            if peak - state["base"] >= plane_bytes:
+                state["count"] += 1
+            tracemalloc.reset_peak()
+            state["base"] = current
+        return on_step
+
+    tracemalloc.start()
+    state["base"] = tracemalloc.get_traced_memory()[0]
+    sys.settrace(on_step)
+    try:
+        fn()
+    finally:
+        sys.settrace(None)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return state["count"] + (peak - state["base"] >= plane_bytes)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    repeat = max(1, args.repeat)
+
+    failures = 0
+    print(f"{'frame':36s} {'identical':>9s} {'old ms':>8s} {'new ms':>8s} {'old allocs':>10s} {'new allocs':>10s}")
+    for name, frame in frames():
+        analysis = fp.analyze_frame(frame)
+        reference = reference_annotate(frame, analysis)
+        candidate = fp.annotate_frame(frame, analysis)
+        identical = np.array_equal(reference, candidate)
+        failures += not identical
+
+        plane = frame.shape[0] * frame.shape[1]
+        old_ms = median_ms(lambda: reference_annotate(frame, analysis), repeat)
+        new_ms = median_ms(lambda: fp.annotate_frame(frame, analysis), repeat)
+        old_allocs = count_frame_allocations(lambda: reference_annotate(frame, analysis), plane)
+        new_allocs = count_frame_allocations(lambda: fp.annotate_frame(frame, analysis), plane)
+        print(f"{name:36s} {str(identical):>9s} {old_ms:8.1f} {new_ms:8.1f} {old_allocs:10d} {new_allocs:10d}")
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Heatmap benchmark: pyramid heatmap engine vs the original scipy blurs.
+
+Reports the time per frame for the three zone heatmaps and the error of
+the pyramid result against the exact gaussian_filter reference, both in
+heatmap units (0..1) and in 8-bit overlay levels.
+
+The reference needs scipy, which the application itself no longer uses.
+
+Usage:
+    pip install scipy
+    python benchmarks/heatmap.py
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+from scipy.ndimage import gaussian_filter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import floodPredictor as fp
+
+# Largest accepted per-pixel deviation from the reference heatmap
+MAX_ABS_ERROR = 0.02
+
+
+def reference_heatmap(mask):
+    """Original create_multi_scale_heatmap: four full-resolution scipy blurs"""
+    heatmap = np.zeros(mask.shape, dtype=np.float32)
+    if np.sum(mask) == 0:
+        return heatmap
+    for scale, weight in zip(fp.HEATMAP_SCALES, fp.HEATMAP_WEIGHTS):
+        heatmap += gaussian_filter(mask.astype(np.float32), sigma=scale) * weight
+    return heatmap / np.max(heatmap)
+
+
+def synthetic_frame(h, w, seed=0):
+    """Blue river band with a lake and speckle on a sand-colored background"""
+    rng = np.random.default_rng(seed)
+    frame = np.full((h, w, 3), (170, 200, 220), dtype=np.uint8)
+    xs = np.arange(w)
+    centre = (h / 2 + h / 6 * np.sin(xs / w * 2 * np.pi)).astype(np.int32)
+    for x, c in zip(xs, centre):
+        frame[max(c - h // 20, 0):c + h // 20, x] = (160, 90, 40)
+    cv2.circle(frame, (w // 4, h // 4), min(h, w) // 10, (150, 100, 50), -1)
+    noise = rng.integers(-20, 20, frame.shape, dtype=np.int16)
+    return np.clip(frame.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+
+def main():
+    frames = [(path.name, cv2.imread(str(path)))
+              for path in sorted((fp.BASE_DIR / "test_images").glob("*.png"))]
+    frames.append(("synthetic 3840x2160", synthetic_frame(2160, 3840)))
+
+    worst = 0.0
+    print(f"{'frame':36s} {'scipy ms':>9s} {'pyramid ms':>11s} {'speedup':>8s} "
+          f"{'max err':>8s} {'mean err':>9s} {'max lvl':>8s}")
+    for name, frame in frames:
+        if frame is None:
+            continue
+        zones = fp.analyze_frame(frame)["zones"]
+        masks = [zones["zone_a"], zones["zone_b"], zones["zone_c"]]
+
+        start = time.perf_counter()
+        reference = np.dstack([reference_heatmap(mask) for mask in masks])
+        ref_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        fast = fp.create_zone_heatmaps(masks, frame.shape)
+        fast_ms = (time.perf_counter() - start) * 1000
+
+        error = np.abs(fast - reference)
+        level_error = np.abs((fast * 255).astype(np.int16) - (reference * 255).astype(np.int16))
+        worst = max(worst, float(error.max()))
+        print(f"{name:36s} {ref_ms:9.1f} {fast_ms:11.1f} {ref_ms / max(fast_ms, 1e-6):7.1f}x "
+              f"{error.max():8.4f} {error.mean():9.5f} {level_error.max():8d}")
+
+    print(f"\nWorst absolute heatmap error: {worst:.4f} (bound {MAX_ABS_ERROR})")
+    if worst > MAX_ABS_ERROR:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
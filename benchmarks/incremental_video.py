@@ -0,0 +1,82 @@
+"""
+Incremental video benchmark: keyframe + propagation vs full analysis.
+
+Builds a synthetic drone clip by panning a window across each test image
+(plus hard cuts between images), analyzes it both ways and reports the
+per-frame coverage deviation, risk agreement and the time saved.
+
+Usage:
+    python benchmarks/incremental_video.py [--tolerance 1.0] [--interval 30]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import floodPredictor as fp
+
+WINDOW = (640, 360)
+FRAMES_PER_SCENE = 40
+PAN_STEP = 3
+
+
+def synthetic_clip():
+    """Slow pans over each test image, with hard cuts between them"""
+    frames = []
+    for path in sorted((fp.BASE_DIR / "test_images").glob("*.png")):
+        image = cv2.imread(str(path))
+        if image is None:
+            continue
+        ww, wh = WINDOW
+        if image.shape[1] < ww + PAN_STEP * FRAMES_PER_SCENE or image.shape[0] < wh:
+            image = cv2.resize(image, (ww + PAN_STEP * FRAMES_PER_SCENE, max(wh, image.shape[0])))
+        for i in range(FRAMES_PER_SCENE):
+            x = i * PAN_STEP
+            frames.append(np.ascontiguousarray(image[:wh, x:x + ww]))
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tolerance", type=float, default=fp.INCREMENTAL_TOLERANCE)
+    parser.add_argument("--interval", type=int, default=fp.KEYFRAME_INTERVAL)
+    args = parser.parse_args()
+
+    frames = synthetic_clip()
+
+    start = time.perf_counter()
+    full = [fp.analyze_frame(frame) for frame in frames]
+    full_s = time.perf_counter() - start
+
+    analyzer = fp.IncrementalAnalyzer(keyframe_interval=args.interval, tolerance=args.tolerance)
+    start = time.perf_counter()
+    incremental = [analyzer.process(frame) for frame in frames]
+    incremental_s = time.perf_counter() - start
+
+    deviation = np.array([abs(a["water_coverage"] - b["water_coverage"])
+                          for a, b in zip(full, incremental)])
+    risk_match = np.mean([a["risk_level"] == b["risk_level"] for a, b in zip(full, incremental)])
+    stats = analyzer.stats()
+
+    print(f"frames                 {len(frames)}")
+    print(f"keyframes              {stats['keyframes']}")
+    print(f"redetected fraction    {stats['redetected_fraction']:.3f}")
+    print(f"full analysis          {full_s:.2f}s ({len(frames) / full_s:.1f} fps)")
+    print(f"incremental analysis   {incremental_s:.2f}s ({len(frames) / incremental_s:.1f} fps)")
+    print(f"speedup                {full_s / incremental_s:.2f}x")
+    print(f"coverage deviation     max {deviation.max():.2f} pp, mean {deviation.mean():.3f} pp "
+          f"(tolerance {args.tolerance} pp)")
+    print(f"risk level agreement   {risk_match * 100:.1f}%")
+
+    if deviation.max() > args.tolerance:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Live stream benchmark: latency and drop rate of /api/stream under load.
+
+Plays a synthetic camera (a slow pan over each test image) into the
+WebSocket endpoint at several frame rates, in process through the
+FastAPI test client, and reports what the session summary says: frames
+analyzed and dropped, drop rate and end-to-end latency percentiles. Past
+the rate analysis can sustain, the drop rate should rise while latency
+stays flat instead of growing with a backlog.
+
+Usage:
+    python benchmarks/live_stream.py [--fps 5 15 30 60] [--seconds 5] [--preset fast]
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import cv2
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import floodPredictor as fp
+from fastapi.testclient import TestClient
+
+WINDOW = (1280, 720)
+PAN_STEP = 4
+
+
+def camera_frames():
+    """JPEG-encoded frames panning across each test image in turn"""
+    frames = []
+    for path in sorted((fp.BASE_DIR / "test_images").glob("*.png")):
+        image = cv2.imread(str(path))
+        if image is None:
+            continue
+        ww, wh = WINDOW
+        image = cv2.resize(image, (ww + PAN_STEP * 30, wh))
+        for i in range(30):
+            frames.append(cv2.imencode(".jpg", image[:, i * PAN_STEP:i * PAN_STEP + ww])[1].tobytes())
+    return frames
+
+
+def play(client, frames, fps, seconds, preset, max_latency_ms):
+    """Send frames at fps for seconds; returns the session summary"""
+    query = f"/api/stream?preset={preset}&max_latency_ms={max_latency_ms}"
+    with client.websocket_connect(query) as ws:
+        ws.receive_json()
+        interval = 1.0 / fps
+        due = time.perf_counter()
+        for index in range(int(fps * seconds)):
+            ws.send_bytes(frames[index % len(frames)])
+            due += interval
+            time.sleep(max(0.0, due - time.perf_counter()))
+        ws.send_text(json.dumps({"type": "stop"}))
+        while True:
+            message = ws.receive_json()
+            if message["type"] == "summary":
+                return message
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fps", nargs="+", type=float, default=[5, 15, 30, 60])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--preset", default=fp.STREAM_PRESET, choices=list(fp.ANALYSIS_PRESETS))
+    parser.add_argument("--max-latency-ms", type=float, default=fp.STREAM_MAX_LATENCY_MS)
+    args = parser.parse_args()
+
+    frames = camera_frames()
+    print(f"{'fps':>5s} {'sent':>6s} {'analyzed':>9s} {'dropped':>8s} {'drop rate':>10s} "
+          f"{'p50 ms':>8s} {'p95 ms':>8s} {'max ms':>8s}")
+    with TestClient(fp.create_app()) as client:
+        for fps in args.fps:
+            summary = play(client, frames, fps, args.seconds, args.preset, args.max_latency_ms)
+            latency = summary["latency_ms"]
+            print(f"{fps:5.0f} {summary['received']:6d} {summary['analyzed']:9d} {summary['dropped']:8d} "
+                  f"{summary['drop_rate']:10.3f} {latency['p50'] or 0:8.1f} {latency['p95'] or 0:8.1f} "
+                  f"{latency['max'] or 0:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
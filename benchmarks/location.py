@@ -0,0 +1,89 @@
+"""
+Location re-analysis benchmark: changed tiles only vs full analysis.
+
+Simulates repeated imaging of one location: each test image (and a
+synthetic 4K frame) is followed by copies with a growing flooded patch
+and mild sensor noise. Every image after the first is re-analyzed with
+reanalyze_location against the stored state of the previous one, and
+compared with a from-scratch analyze_frame: time, tiles re-analyzed,
+coverage deviation and zone agreement (IoU of zone A).
+
+Without noise the result matches analyze_frame wherever the patch
+crossed the change threshold; with it, detection drift left in tiles
+under the threshold shows up as coverage deviation.
+
+Usage:
+    python benchmarks/location.py [--preset balanced] [--steps 4] [--threshold 0.005]
+                                  [--noise 2]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import floodPredictor as fp
+from heatmap import synthetic_frame
+
+
+def scenes():
+    for path in sorted((fp.BASE_DIR / "test_images").glob("*.png")):
+        frame = cv2.imread(str(path))
+        if frame is not None:
+            yield path.name, frame
+    yield "synthetic 4k", synthetic_frame(2160, 3840)
+
+
+def revisits(frame, steps, rng, noise):
+    """The same scene with a flood patch growing from one corner, plus sensor noise"""
+    h, w = frame.shape[:2]
+    center = (int(w * 0.3), int(h * 0.4))
+    for step in range(1, steps + 1):
+        image = frame.copy()
+        cv2.circle(image, center, int(min(h, w) * 0.04 * step), (150, 95, 40), -1)
+        if noise > 0:
+            image = np.clip(image + rng.normal(0, noise, image.shape), 0, 255).astype(np.uint8)
+        yield image
+
+
+def iou(a, b):
+    a, b = a > 0, b > 0
+    union = np.count_nonzero(a | b)
+    return 1.0 if union == 0 else np.count_nonzero(a & b) / union
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--preset", default=fp.DEFAULT_PRESET, choices=list(fp.ANALYSIS_PRESETS))
+    parser.add_argument("--steps", type=int, default=4)
+    parser.add_argument("--threshold", type=float, default=fp.LOCATION_CHANGE_THRESHOLD)
+    parser.add_argument("--noise", type=float, default=2.0, help="sensor noise sigma (gray levels)")
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    print(f"{'scene':36s} {'step':>4s} {'tiles':>7s} {'full ms':>8s} {'tiled ms':>9s} "
+          f"{'cov full':>8s} {'cov tiled':>9s} {'IoU A':>6s}")
+    for name, frame in scenes():
+        _, state, _ = fp.reanalyze_location(frame, None, args.preset, threshold=args.threshold)
+        for step, image in enumerate(revisits(frame, args.steps, rng, args.noise), 1):
+            full, full_ms = timed(fp.analyze_frame, image, args.preset)
+            (tiled, state, change), tiled_ms = timed(fp.reanalyze_location, image, state, args.preset,
+                                                     threshold=args.threshold)
+            print(f"{name:36s} {step:4d} {change['changed_tiles']:3d}/{change['tiles']:<3d} "
+                  f"{full_ms:8.1f} {tiled_ms:9.1f} {full['water_coverage']:8.2f} "
+                  f"{tiled['water_coverage']:9.2f} {iou(full['zones']['zone_a'], tiled['zones']['zone_a']):6.3f}")
+
+
+if __name__ == "__main__":
+    main()
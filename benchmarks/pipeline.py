@@ -0,0 +1,197 @@
+"""
+Pipeline benchmark: time and memory of every analysis stage, against baselines.
+
+Runs each stage of the analysis pipeline on the test_images corpus and on
+synthetic 720p, 4K and 8K frames, reports the median time and the peak
+traced allocation per stage, and compares both with the baselines stored
+in benchmarks/baselines.json. Exits with status 1 when a stage is slower
+or allocates more than its baseline by more than the threshold.
+
+Baselines are machine specific: regenerate them with --update on the
+machine the comparison runs on (the file records where they were taken).
+
+Usage:
+    python benchmarks/pipeline.py [--sizes test_images 720p 4k 8k] [--repeat 3]
+                                  [--threshold 0.3] [--update]
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import floodPredictor as fp
+from heatmap import synthetic_frame
+
+BASELINES = Path(__file__).resolve().parent / "baselines.json"
+SYNTHETIC_SIZES = {"720p": (720, 1280), "4k": (2160, 3840), "8k": (4320, 7680)}
+
+# Timings below this many milliseconds of slowdown are treated as noise
+TIME_SLACK_MS = 2.0
+# Relative and absolute headroom for traced memory peaks
+MEMORY_THRESHOLD = 0.1
+MEMORY_SLACK_MB = 1.0
+
+
+def stage_inputs(frame):
+    """Intermediate results each stage consumes, computed once up front"""
+    features = fp.FrameFeatures(frame)
+    combined = fp.detect_water_mask(features)
+    filtered = fp.suppress_road_false_positives(combined, frame)
+    zones = dict(zip(("zone_a", "zone_b", "zone_c"), fp.classify_water_zones(filtered, frame)))
+    analysis = fp.analyze_frame(frame)
+    annotated = fp.annotate_frame(frame, analysis)
+    return features, combined, filtered, zones, analysis, annotated
+
+
+def warm_features(frame):
+    features = fp.FrameFeatures(frame)
+    for plane in ("color_rules", "hsv", "gray", "lab", "blurred_gray"):
+        getattr(features, plane)
+    return features
+
+
+def pipeline_stages(frame, out_dir):
+    """(stage, callable) pairs; each callable runs one stage on frame"""
+    features, combined, filtered, zones, analysis, annotated = stage_inputs(frame)
+    out_path = Path(out_dir) / f"frame{fp.artifact_suffix()}"
+    return [
+        ("features", lambda: warm_features(frame)),
+        ("detect_vegetation_water", lambda: fp.detect_vegetation_water(features)),
+        ("detect_water_mask", lambda: fp.detect_water_mask(features)),
+        ("suppress_road_false_positives", lambda: fp.suppress_road_false_positives(combined, frame)),
+        ("classify_water_zones", lambda: fp.classify_water_zones(filtered, frame)),
+        ("water_body_inventory", lambda: fp.water_body_inventory(filtered, zones)),
+        ("create_multi_scale_heatmap", lambda: fp.create_multi_scale_heatmap(zones["zone_a"], frame.shape)),
+        ("annotate_frame", lambda: fp.annotate_frame(frame, analysis)),
+        ("encode", lambda: fp.write_image_artifact(annotated, out_path)),
+        ("analyze_frame", lambda: fp.analyze_frame(frame)),
+    ]
+
+
+def median_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def peak_mb(fn):
+    """Peak traced allocation (numpy and OpenCV output arrays) while fn runs"""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def corpus(sizes):
+    """(name, frames) per requested size; test_images is one multi-frame corpus"""
+    for size in sizes:
+        if size == "test_images":
+            frames = [cv2.imread(str(path)) for path in sorted((fp.BASE_DIR / "test_images").glob("*.png"))]
+            yield size, [frame for frame in frames if frame is not None]
+        else:
+            yield size, [synthetic_frame(*SYNTHETIC_SIZES[size])]
+
+
+def measure(sizes, repeat):
+    """{size: {stage: {"ms": total median ms, "peak_mb": largest peak}}}"""
+    results = {}
+    with tempfile.TemporaryDirectory() as out_dir:
+        for size, frames in corpus(sizes):
+            stats = {}
+            for frame in frames:
+                for stage, fn in pipeline_stages(frame, out_dir):
+                    fn()
+                    entry = stats.setdefault(stage, {"ms": 0.0, "peak_mb": 0.0})
+                    entry["ms"] += median_ms(fn, repeat)
+                    entry["peak_mb"] = max(entry["peak_mb"], peak_mb(fn))
+            results[size] = {stage: {"ms": round(entry["ms"], 2), "peak_mb": round(entry["peak_mb"], 2)}
+                             for stage, entry in stats.items()}
+            print(f"measured {size} ({len(frames)} frame{'s' if len(frames) != 1 else ''})")
+    return results
+
+
+def machine():
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+    }
+
+
+def compare(results, baselines, threshold):
+    """Print the report; returns the list of regressions"""
+    regressions = []
+    print(f"\n{'size':12s} {'stage':30s} {'ms':>9s} {'base ms':>9s} {'peak MB':>9s} {'base MB':>9s}")
+    for size, stages in results.items():
+        for stage, entry in stages.items():
+            base = baselines.get(size, {}).get(stage)
+            base_ms = f"{base['ms']:9.1f}" if base else f"{'-':>9s}"
+            base_mb = f"{base['peak_mb']:9.1f}" if base else f"{'-':>9s}"
+            flag = ""
+            if base:
+                if entry["ms"] > base["ms"] * (1 + threshold) + TIME_SLACK_MS:
+                    flag += " SLOWER"
+                if entry["peak_mb"] > base["peak_mb"] * (1 + MEMORY_THRESHOLD) + MEMORY_SLACK_MB:
+                    flag += " MEMORY"
+            if flag:
+                regressions.append(f"{size}/{stage}:{flag}")
+            print(f"{size:12s} {stage:30s} {entry['ms']:9.1f} {base_ms} "
+                  f"{entry['peak_mb']:9.1f} {base_mb}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", nargs="+", default=["test_images", "720p", "4k", "8k"],
+                        choices=["test_images", *SYNTHETIC_SIZES])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--threshold", type=float, default=0.3,
+                        help="accepted relative slowdown per stage")
+    parser.add_argument("--update", action="store_true", help="store these results as the baselines")
+    args = parser.parse_args()
+
+    fp.get_color_lut()
+    results = measure(args.sizes, max(1, args.repeat))
+    stored = json.loads(BASELINES.read_text()) if BASELINES.exists() else {}
+    regressions = compare(results, stored.get("stages", {}), args.threshold)
+    print(f"\nPeak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+    if args.update:
+        stages = stored.get("stages", {})
+        stages.update(results)
+        BASELINES.write_text(json.dumps({"machine": machine(), "stages": stages}, indent=2) + "\n")
+        print(f"Baselines written to {BASELINES}")
+        return
+
+    if stored.get("machine") and stored["machine"] != machine():
+        print("Note: baselines were taken on a different machine:", stored["machine"])
+    if regressions:
+        print("\nRegressions past the threshold:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
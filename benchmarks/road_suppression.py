@@ -0,0 +1,111 @@
+"""
+Road suppression benchmark: vectorized contour features vs the per-contour loop.
+
+Checks that suppress_road_false_positives keeps exactly the same pixels
+as the original loop over contours on the test images, random masks at
+several scales and speckled 4K masks, and reports the time of both.
+Exits with status 1 on any differing pixel.
+
+Usage:
+    python benchmarks/road_suppression.py [--random 500]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import floodPredictor as fp
+
+SCALES = (1.0, 0.5, 0.37)
+
+
+def reference_suppression(mask, scale=1.0):
+    """Original suppress_road_false_positives: one contour at a time"""
+    opened = cv2.morphologyEx(mask, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2, 2)))
+    contours, _ = cv2.findContours(opened, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    filtered_mask = np.zeros_like(mask)
+    for contour in contours:
+        area = cv2.contourArea(contour)
+        if area < 30 * scale * scale:
+            continue
+        width, height = cv2.minAreaRect(contour)[1]
+        if width > 0 and height > 0:
+            aspect_ratio = max(width, height) / min(width, height)
+            perimeter = cv2.arcLength(contour, True)
+            if perimeter > 0 and (aspect_ratio > 12 or area / (perimeter * perimeter) < 0.005):
+                continue
+        cv2.drawContours(filtered_mask, [contour], -1, 255, -1)
+    return filtered_mask
+
+
+def random_mask(rng, h, w):
+    """Speckle, blobs, thin lines and rings"""
+    mask = (rng.random((h, w)) < rng.uniform(0.2, 0.8)).astype(np.uint8) * 255
+    mask = cv2.GaussianBlur(mask, (0, 0), rng.uniform(0.5, 4))
+    mask = (mask > rng.integers(60, 200)).astype(np.uint8) * 255
+    for _ in range(6):
+        start = tuple(int(v) for v in rng.integers(0, (w, h)))
+        end = tuple(int(v) for v in rng.integers(0, (w, h)))
+        cv2.line(mask, start, end, 255, int(rng.integers(1, 4)))
+    for _ in range(3):
+        centre = tuple(int(v) for v in rng.integers(0, (w, h)))
+        cv2.circle(mask, centre, int(rng.integers(3, 40)), int(rng.choice([0, 255])), int(rng.choice([-1, 1, 2])))
+    return mask
+
+
+def speckle_mask(rng, h, w, density):
+    mask = (rng.random((h, w)) < density).astype(np.uint8) * 255
+    return (cv2.GaussianBlur(mask, (0, 0), 1.2) > 127).astype(np.uint8) * 255
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--random", type=int, default=500)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    masks = []
+    for path in sorted((fp.BASE_DIR / "test_images").glob("*.png")):
+        frame = cv2.imread(str(path))
+        masks.append((path.name, fp.detect_water_mask(fp.FrameFeatures(frame)), 1.0))
+    for density in (0.3, 0.5, 0.7):
+        masks.append((f"speckle 3840x2160 p={density}", speckle_mask(rng, 2160, 3840, density), 1.0))
+
+    failures = 0
+    print(f"{'mask':36s} {'contours':>9s} {'loop ms':>8s} {'vector ms':>10s} {'identical':>10s}")
+    for name, mask, scale in masks:
+        reference, reference_ms = timed(reference_suppression, mask, scale)
+        candidate, candidate_ms = timed(fp.suppress_road_false_positives, mask, None, scale)
+        identical = np.array_equal(reference, candidate)
+        failures += not identical
+        contours = len(cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[0])
+        print(f"{name:36s} {contours:9d} {reference_ms:8.1f} {candidate_ms:10.1f} {str(identical):>10s}")
+
+    differing = 0
+    for index in range(args.random):
+        h, w = rng.integers(20, 300, 2)
+        mask = random_mask(rng, h, w)
+        scale = SCALES[index % len(SCALES)]
+        if not np.array_equal(reference_suppression(mask, scale),
+                              fp.suppress_road_false_positives(mask, None, scale)):
+            differing += 1
+    print(f"\nRandom masks with differing output: {differing}/{args.random}")
+
+    if failures or differing:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Startup benchmark: cold import, app factory and worker memory.
+
+Each measurement runs in a fresh interpreter so nothing is cached in
+process. Reports the time to import floodPredictor, to build the app with
+create_app(), to run the startup hook (color LUT, analysis pool warm-up),
+and the resident memory of the server process and of every analysis
+worker, plus what loading torch adds on top.
+
+Usage:
+    python benchmarks/startup.py [--runs 3]
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+CHILD = r"""
+import json, os, sys, time
+sys.path.insert(0, sys.argv[1])
+started = time.perf_counter()
+import floodPredictor as fp
+timings = {"import": time.perf_counter() - started}
+
+def memory(pid):
+    # Resident, anonymous (private) and file-backed (shareable) MB
+    fields = {}
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "RssAnon", "RssFile"):
+                fields[key] = int(value.split()[0]) / 1024
+    return fields
+
+if __name__ == "__main__":
+    result = {"torch_on_import": fp.torch is not None}
+    started = time.perf_counter()
+    app = fp.create_app()
+    timings["create_app"] = time.perf_counter() - started
+    result["server_before_startup"] = memory(os.getpid())
+
+    started = time.perf_counter()
+    fp.warm_up()
+    timings["startup_hook"] = time.perf_counter() - started
+    pids = [fp.get_analysis_pool().submit(fp._warm_worker).result()
+            for _ in range(fp.ANALYSIS_WORKERS)]
+    result["server"] = memory(os.getpid())
+    result["workers"] = [memory(pid) for pid in sorted(set(pids))]
+
+    started = time.perf_counter()
+    fp.get_device()
+    timings["load_torch"] = time.perf_counter() - started
+    result["server_with_torch"] = memory(os.getpid())
+
+    fp.shut_down()
+    result["timings"] = timings
+    print("RESULT " + json.dumps(result))
+"""
+
+
+def run_once():
+    output = subprocess.run([sys.executable, "-c", CHILD, str(ROOT)], capture_output=True,
+                            text=True, check=True, cwd=ROOT).stdout
+    line = next(line for line in output.splitlines() if line.startswith("RESULT "))
+    return json.loads(line[len("RESULT "):])
+
+
+def describe(fields):
+    return (f"{fields.get('VmRSS', 0):7.1f} MB resident "
+            f"({fields.get('RssAnon', 0):6.1f} private, {fields.get('RssFile', 0):6.1f} file-backed)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    if not Path("/proc/self/status").exists():
+        sys.exit("This benchmark reads /proc and needs Linux")
+
+    runs = [run_once() for _ in range(max(1, args.runs))]
+    last = runs[-1]
+
+    print(f"{'stage':16s} {'median s':>9s} {'min s':>7s}")
+    for stage in last["timings"]:
+        samples = [run["timings"][stage] for run in runs]
+        print(f"{stage:16s} {statistics.median(samples):9.3f} {min(samples):7.3f}")
+
+    print(f"\ntorch imported with the module: {last['torch_on_import']}")
+    print(f"server after create_app   {describe(last['server_before_startup'])}")
+    print(f"server after startup      {describe(last['server'])}")
+    for index, worker in enumerate(last["workers"]):
+        print(f"analysis worker {index:<9d} {describe(worker)}")
+    print(f"server with torch loaded  {describe(last['server_with_torch'])}")
+
+
+if __name__ == "__main__":
+    main()
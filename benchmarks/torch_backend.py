@@ -0,0 +1,85 @@
+"""
+Torch backend benchmark: batched tensor analysis vs the OpenCV path.
+
+Checks that the torch backend's zone masks match the OpenCV backend on
+the test images and synthetic frames, and reports the time per frame of
+both backends at several micro-batch sizes on DEVICE, and of
+analyze_frames, which stacks frames on CUDA only.
+
+Usage:
+    python benchmarks/torch_backend.py [--batch 1 4 8]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import floodPredictor as fp
+from heatmap import synthetic_frame
+
+# Largest accepted share of differing zone pixels per frame
+MAX_MISMATCH = 0.001
+SYNTHETIC_FRAMES = 8
+
+
+def mismatch(reference, candidate):
+    return max(float(np.mean(reference["zones"][name] != candidate["zones"][name]))
+               for name in reference["zones"])
+
+
+def time_per_frame(fn, frames):
+    fn(frames[:1])
+    start = time.perf_counter()
+    fn(frames)
+    return (time.perf_counter() - start) * 1000 / len(frames)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 4, 8])
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    fp.get_torch_backend()
+    print(f"Torch backend ready on {fp.DEVICE} in {time.perf_counter() - start:.2f}s")
+
+    images = [(path.name, cv2.imread(str(path)))
+              for path in sorted((fp.BASE_DIR / "test_images").glob("*.png"))]
+    images += [(f"synthetic 1280x720 #{seed}", synthetic_frame(720, 1280, seed))
+               for seed in range(SYNTHETIC_FRAMES)]
+
+    worst = 0.0
+    print(f"\n{'frame':40s} {'opencv %':>9s} {'torch %':>8s} {'zone mismatch':>14s}")
+    for name, frame in images:
+        reference = fp.analyze_frame(frame)
+        candidate = fp.analyze_frames([frame], backend="torch")[0]
+        error = mismatch(reference, candidate)
+        worst = max(worst, error)
+        print(f"{name:40s} {reference['water_coverage']:9.2f} "
+              f"{candidate['water_coverage']:8.2f} {error:14.6f}")
+
+    frames = [frame for name, frame in images if name.startswith("synthetic")]
+    print(f"\n{'backend':20s} {'ms/frame':>9s}")
+    print(f"{'opencv':20s} {time_per_frame(fp.analyze_frames, frames):9.1f}")
+    engine = fp.get_torch_backend()
+    for batch in args.batch:
+        run = lambda stack: [engine.analyze_batch(stack[i:i + batch], 1.0)
+                             for i in range(0, len(stack), batch)]
+        print(f"{f'torch batch {batch}':20s} {time_per_frame(run, frames):9.1f}")
+    run = lambda stack: fp.analyze_frames(stack, backend="torch")
+    effective = fp.torch_batch_size(fp.TORCH_BATCH_SIZE)
+    print(f"{f'analyze_frames ({effective})':20s} {time_per_frame(run, frames):9.1f}")
+
+    if worst > MAX_MISMATCH:
+        print(f"\nZone mismatch {worst:.6f} exceeds {MAX_MISMATCH}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Zone engine benchmark: distance transforms vs morphology.
+
+Runs classify_water_zones with both engines on the water masks of the
+test images and of synthetic 720p and 4K frames. Reports how closely the
+distance engine's zones match the morphology engine's (intersection over
+union per zone) at the default widths, and the time of both engines as
+the buffer width grows: morphology cost follows the kernel area, the
+distance engine's stays flat.
+
+Usage:
+    python benchmarks/zones.py [--buffers 12 25 50 100] [--repeat 3]
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import floodPredictor as fp
+from heatmap import synthetic_frame
+
+SYNTHETIC_SIZES = {"720p": (720, 1280), "4k": (2160, 3840)}
+ZONES = ("zone_a", "zone_b", "zone_c")
+
+
+def water_masks():
+    """(name, filtered water mask) for the test images and synthetic frames"""
+    frames = [(path.name, cv2.imread(str(path))) for path in sorted((fp.BASE_DIR / "test_images").glob("*.png"))]
+    frames += [(name, synthetic_frame(*size)) for name, size in SYNTHETIC_SIZES.items()]
+    for name, frame in frames:
+        if frame is not None:
+            yield name, fp.analyze_frame(frame)["mask"]
+
+
+def iou(a, b):
+    a, b = a > 0, b > 0
+    union = np.count_nonzero(a | b)
+    return 1.0 if union == 0 else np.count_nonzero(a & b) / union
+
+
+def median_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--buffers", nargs="+", type=float, default=[12, 25, 50, 100])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    repeat = max(1, args.repeat)
+
+    masks = list(water_masks())
+    distance = fp.parse_zone_options("distance")
+
+    print(f"{'mask':36s} {'IoU A':>7s} {'IoU B':>7s} {'IoU C':>7s}")
+    scores = []
+    for name, mask in masks:
+        reference = fp.classify_water_zones(mask, None)
+        candidate = fp.classify_water_zones(mask, None, options=distance)
+        scores.append([iou(a, b) for a, b in zip(reference, candidate)])
+        print(f"{name:36s} " + " ".join(f"{score:7.3f}" for score in scores[-1]))
+    print(f"{'mean':36s} " + " ".join(f"{score:7.3f}" for score in np.mean(scores, axis=0)))
+
+    print(f"\n{'mask':36s} {'buffer px':>9s} {'morph ms':>9s} {'distance ms':>12s}")
+    for name, mask in masks:
+        if name not in SYNTHETIC_SIZES:
+            continue
+        for buffer in args.buffers:
+            timed = {engine: fp.parse_zone_options(engine, buffer=buffer) for engine in fp.ZONE_ENGINES}
+            morph = median_ms(lambda: fp.classify_water_zones(mask, None, options=timed["morphology"]), repeat)
+            dist = median_ms(lambda: fp.classify_water_zones(mask, None, options=timed["distance"]), repeat)
+            print(f"{name:36s} {buffer:9.0f} {morph:9.1f} {dist:12.1f}")
+
+
+if __name__ == "__main__":
+    main()
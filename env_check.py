@@ -15,7 +15,6 @@ REQUIRED_PACKAGES = [
     "psutil",
     "requests",
     "tqdm",
-    "scipy",
     "skimage"
 ]
 
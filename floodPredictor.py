@@ -9,20 +9,43 @@ Runs:
 
 import os
 import cv2
+import asyncio
 import json
+import base64
+import zlib
+import hashlib
 import time
-import torch
-import uvicorn
-import webbrowser
+import bisect
+import weakref
+import uuid
+import queue
+import sqlite3
+import shutil
+import tempfile
+import zipfile
+import contextlib
+import threading
+import multiprocessing
 import numpy as np
-from fastapi import FastAPI, UploadFile, File
-from scipy import ndimage
-from scipy.ndimage import gaussian_filter
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, FastAPI, UploadFile, File, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from pathlib import Path
-from typing import Optional
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+from typing import List, Optional
+
+try:
+    from PIL import Image
+except ImportError:  # header-only size probing is optional
+    Image = None
+
+try:
+    import psutil
+except ImportError:  # job ownership checks fall back to os.kill on POSIX
+    psutil = None
 
 # ==========================
 # SYSTEM SETUP
@@ -32,138 +55,519 @@ BASE_DIR = Path(__file__).parent
 STATIC_DIR = BASE_DIR
 UPLOAD_DIR = BASE_DIR / "uploads"
 OUTPUT_DIR = BASE_DIR / "outputs"
+CACHE_DIR = BASE_DIR / "cache"
+
+def prepare_dirs():
+    for directory in (UPLOAD_DIR, OUTPUT_DIR, CACHE_DIR):
+        directory.mkdir(exist_ok=True)
+
+# torch is imported on first use (torch backend or device query), so the
+# server and its analysis workers start without paying for it
+torch = None
+_device = None
+_torch_lock = threading.Lock()
 
-UPLOAD_DIR.mkdir(exist_ok=True)
-OUTPUT_DIR.mkdir(exist_ok=True)
+def load_torch():
+    global torch
+    with _torch_lock:
+        if torch is None:
+            import torch as torch_module
+            torch = torch_module
+    return torch
 
-DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+def get_device():
+    """
+    "cuda" if available else "cpu"; imports torch on first call
+    """
+    global _device
+    if _device is None:
+        _device = "cuda" if load_torch().cuda.is_available() else "cpu"
+        print(f"[INFO] Running on device: {_device.upper()}")
+    return _device
+
+def probe_device():
+    """
+    Device the torch backend will run on, without importing torch: the
+    loaded device once get_device() has run, else "cuda" when an NVIDIA
+    driver is installed and CUDA_VISIBLE_DEVICES does not hide every GPU
+    """
+    if _device is not None:
+        return _device
+    visible = os.environ.get("CUDA_VISIBLE_DEVICES")
+    if visible is not None and visible.strip() in ("", "-1"):
+        return "cpu"
+    driver = Path("/proc/driver/nvidia/gpus")
+    if (driver.is_dir() and any(driver.iterdir())) or shutil.which("nvidia-smi"):
+        return "cuda"
+    return "cpu"
 
-print(f"[INFO] Running on device: {DEVICE.upper()}")
+def __getattr__(name):
+    # DEVICE and app are resolved lazily (PEP 562), so importing the module
+    # for a pool worker or a benchmark never loads torch or builds the app
+    global app
+    if name == "DEVICE":
+        return get_device()
+    if name == "app":
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # ==========================
 # FASTAPI APP
 # ==========================
 
-app = FastAPI(title="Flood Risk Predictor Backend")
+# Routes register here; create_app() builds an application around them
+router = APIRouter()
+
+def warm_up():
+    # Utilization is measured from startup
+    get_metrics()
+    # Build or map the color LUT before the first request needs it
+    get_color_lut()
+    # Start analysis workers now rather than on the first request
+    warm_analysis_pool()
+    # Resume video jobs left unfinished by a previous run
+    get_job_manager()
+    # Expire old outputs in the background
+    start_artifact_sweeper()
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+def shut_down():
+    stop_artifact_sweeper()
+    shutdown_analysis_pool()
 
 # ==========================
 # HEALTH CHECK
 # ==========================
 
-@app.get("/api/health")
+@router.get("/api/health")
 def health():
     return {
         "status": "ok",
-        "device": DEVICE,
+        # Probed without loading torch; confirmed once the torch backend loads
+        "device": probe_device(),
+        "device_confirmed": _device is not None,
         "backend": "online"
     }
 
+# ==========================
+# METRICS
+# ==========================
+
+# Latency histogram bucket upper bounds, in seconds
+METRIC_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Histogram:
+    """
+    Latency histogram with Prometheus-style cumulative buckets
+    """
+
+    def __init__(self, buckets=METRIC_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f"{name}_sum{{{labels}}} {self.sum:.6f}"
+        yield f"{name}_count{{{labels}}} {self.count}"
+
+class Metrics:
+    """
+    Process-wide timing histograms (pipeline stages and HTTP requests)
+    plus analysis pool accounting, rendered in Prometheus text format
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._requests = {}
+        self._queues = weakref.WeakSet()
+        self.started = time.time()
+        self.pool_in_flight = 0
+        self.pool_tasks = 0
+        self.pool_busy_seconds = 0.0
+        self.stream_received = 0
+        self.stream_dropped = 0
+
+    def observe_stage(self, stage, seconds):
+        with self._lock:
+            self._stages.setdefault(stage, Histogram()).observe(seconds)
+
+    def observe_timings(self, timings, prefix=""):
+        """Record a timings dict (stage -> milliseconds) as stage spans"""
+        with self._lock:
+            for stage, ms in timings.items():
+                self._stages.setdefault(prefix + stage, Histogram()).observe(ms / 1000)
+
+    def observe_request(self, method, route, status, seconds):
+        with self._lock:
+            self._requests.setdefault((method, route, status), Histogram()).observe(seconds)
+
+    def track_queue(self, q):
+        """Count a pipeline queue towards the video queue depth while it lives"""
+        with self._lock:
+            self._queues.add(q)
+
+    def pool_submitted(self):
+        with self._lock:
+            self.pool_in_flight += 1
+
+    def pool_finished(self, busy_seconds, wait_seconds):
+        with self._lock:
+            self.pool_in_flight -= 1
+            self.pool_tasks += 1
+            self.pool_busy_seconds += busy_seconds
+            self._stages.setdefault("pool.queue_wait", Histogram()).observe(wait_seconds)
+
+    def stream_frames(self, received=0, dropped=0):
+        with self._lock:
+            self.stream_received += received
+            self.stream_dropped += dropped
+
+    def render(self):
+        with self._lock:
+            uptime = max(time.time() - self.started, 1e-6)
+            video_depth = sum(q.qsize() for q in self._queues)
+            lines = [
+                "# HELP flood_stage_seconds Time spent in each analysis pipeline stage",
+                "# TYPE flood_stage_seconds histogram",
+            ]
+            for stage, histogram in sorted(self._stages.items()):
+                lines.extend(histogram.lines("flood_stage_seconds", f'stage="{stage}"'))
+            lines += [
+                "# HELP flood_request_seconds HTTP request latency",
+                "# TYPE flood_request_seconds histogram",
+            ]
+            for (method, route, status), histogram in sorted(self._requests.items()):
+                lines.extend(histogram.lines(
+                    "flood_request_seconds", f'method="{method}",route="{route}",status="{status}"'))
+            lines += [
+                "# HELP flood_analysis_workers Analysis pool worker processes",
+                "# TYPE flood_analysis_workers gauge",
+                f"flood_analysis_workers {ANALYSIS_WORKERS}",
+                "# HELP flood_analysis_in_flight Analysis tasks submitted and not finished",
+                "# TYPE flood_analysis_in_flight gauge",
+                f"flood_analysis_in_flight {self.pool_in_flight}",
+                "# HELP flood_analysis_queue_depth Analysis tasks waiting for a free worker",
+                "# TYPE flood_analysis_queue_depth gauge",
+                f"flood_analysis_queue_depth {max(0, self.pool_in_flight - ANALYSIS_WORKERS)}",
+                "# HELP flood_analysis_tasks_total Analysis tasks finished",
+                "# TYPE flood_analysis_tasks_total counter",
+                f"flood_analysis_tasks_total {self.pool_tasks}",
+                "# HELP flood_analysis_busy_seconds_total Worker time spent running analysis tasks",
+                "# TYPE flood_analysis_busy_seconds_total counter",
+                f"flood_analysis_busy_seconds_total {self.pool_busy_seconds:.6f}",
+                "# HELP flood_analysis_utilization Share of worker capacity used since start",
+                "# TYPE flood_analysis_utilization gauge",
+                f"flood_analysis_utilization {self.pool_busy_seconds / (ANALYSIS_WORKERS * uptime):.6f}",
+                "# HELP flood_video_queue_depth Frames waiting in live video pipeline queues",
+                "# TYPE flood_video_queue_depth gauge",
+                f"flood_video_queue_depth {video_depth}",
+                "# HELP flood_stream_frames_received_total Frames received by live streams",
+                "# TYPE flood_stream_frames_received_total counter",
+                f"flood_stream_frames_received_total {self.stream_received}",
+                "# HELP flood_stream_frames_dropped_total Live stream frames dropped as stale",
+                "# TYPE flood_stream_frames_dropped_total counter",
+                f"flood_stream_frames_dropped_total {self.stream_dropped}",
+            ]
+        return lines
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+def get_metrics():
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = Metrics()
+        return _metrics
+
+def report_timings(timings, profile=False):
+    """
+    Record a request's stage timings in the metrics. The breakdown returned
+    for the response keeps only top-level stages unless profile is set.
+    """
+    get_metrics().observe_timings(timings)
+    if profile:
+        return timings
+    return {stage: ms for stage, ms in timings.items() if "." not in stage}
+
+async def record_request_metrics(request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Route templates (not raw paths) keep label cardinality bounded
+    route = request.scope.get("route")
+    if route is not None and request.url.path.startswith("/api/"):
+        get_metrics().observe_request(request.method, route.path, response.status_code,
+                                      time.perf_counter() - started)
+    return response
+
+@router.get("/api/metrics")
+def metrics():
+    lines = get_metrics().render()
+    lines += [
+        "# HELP flood_jobs_queued Video jobs waiting to run",
+        "# TYPE flood_jobs_queued gauge",
+        f"flood_jobs_queued {get_job_manager().store.count('queued')}",
+        "# HELP flood_jobs_running Video jobs running",
+        "# TYPE flood_jobs_running gauge",
+        f"flood_jobs_running {get_job_manager().store.count('running')}",
+        "# HELP flood_streams_active Live stream sessions open",
+        "# TYPE flood_streams_active gauge",
+        f"flood_streams_active {len(_stream_sessions)}",
+    ]
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+# ==========================
+# COLOR RULE LOOKUP TABLE
+# ==========================
+
+# Every per-pixel color rule used by the detectors, as inclusive
+# (color space, lower, upper) boxes. Each rule owns one bit of the LUT.
+COLOR_RULES = [
+    ("water_blue",    "hsv", (80, 30, 30),   (150, 255, 255)),
+    ("water_dark",    "hsv", (0, 0, 40),     (35, 255, 130)),
+    ("water_muddy",   "hsv", (5, 40, 40),    (30, 220, 170)),
+    ("water_gray",    "hsv", (90, 20, 50),   (130, 100, 150)),
+    ("green_water",   "hsv", (40, 30, 30),   (85, 200, 180)),
+    ("shadow_water",  "hsv", (0, 0, 20),     (180, 80, 80)),
+    ("mixed_hsv",     "hsv", (35, 30, 40),   (95, 150, 180)),
+    ("mixed_lab",     "lab", (40, 110, 110), (140, 135, 145)),
+    ("luminance",     "lab", (31, 0, 0),     (119, 255, 255)),
+]
+
+RULE_BITS = {name: 1 << i for i, (name, _, _, _) in enumerate(COLOR_RULES)}
+
+HSV_WATER_BITS = (RULE_BITS["water_blue"] | RULE_BITS["water_dark"] |
+                  RULE_BITS["water_muddy"] | RULE_BITS["water_gray"])
+VEGETATION_BITS = RULE_BITS["green_water"] | RULE_BITS["shadow_water"]
+MIXED_BITS = RULE_BITS["mixed_hsv"] | RULE_BITS["mixed_lab"]
+LUMINANCE_BIT = RULE_BITS["luminance"]
+
+COLOR_LUT_VERSION = 1
+COLOR_LUT_PATH = CACHE_DIR / f"color_lut_v{COLOR_LUT_VERSION}_cv{cv2.__version__}.npy"
+
+_color_lut = None
+_color_lut_lock = threading.Lock()
+
+def all_bgr_colors():
+    """
+    Every 24-bit BGR value as a 4096x4096 image, laid out by the LUT
+    index B | G << 8 | R << 16 (see classify_colors)
+    """
+    index = np.arange(1 << 24, dtype=np.uint32)
+    bgr = np.empty((1 << 24, 3), dtype=np.uint8)
+    bgr[:, 0] = index & 0xFF
+    bgr[:, 1] = (index >> 8) & 0xFF
+    bgr[:, 2] = index >> 16
+    return bgr.reshape(4096, 4096, 3)
+
+def build_color_lut():
+    """
+    Evaluate every color rule once for all 2^24 BGR values.
+    Index layout is B | G << 8 | R << 16 (see classify_colors).
+    """
+    bgr = all_bgr_colors()
+
+    spaces = {
+        "hsv": cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV),
+        "lab": cv2.cvtColor(bgr, cv2.COLOR_BGR2LAB),
+    }
+
+    lut = np.zeros(1 << 24, dtype=np.uint16)
+    for name, space, lower, upper in COLOR_RULES:
+        rule_mask = cv2.inRange(spaces[space], np.array(lower), np.array(upper))
+        lut[rule_mask.reshape(-1) != 0] |= RULE_BITS[name]
+    return lut
+
+def get_color_lut():
+    """
+    Load the color LUT, memory-mapped from the cache file.
+    The file is built on first use and reused across restarts.
+    """
+    global _color_lut
+    if _color_lut is not None:
+        return _color_lut
+
+    with _color_lut_lock:
+        if _color_lut is not None:
+            return _color_lut
+        lut = None
+        if not COLOR_LUT_PATH.exists():
+            lut = build_color_lut()
+            tmp_path = COLOR_LUT_PATH.with_name(f"{COLOR_LUT_PATH.stem}.{os.getpid()}.tmp.npy")
+            try:
+                COLOR_LUT_PATH.parent.mkdir(parents=True, exist_ok=True)
+                np.save(tmp_path, lut)
+                os.replace(tmp_path, COLOR_LUT_PATH)
+            except Exception as e:
+                print(f"Error saving color LUT cache, keeping it in memory: {e}")
+                tmp_path.unlink(missing_ok=True)
+                _color_lut = lut
+                return _color_lut
+        try:
+            _color_lut = np.load(COLOR_LUT_PATH, mmap_mode="r")
+        except Exception as e:
+            print(f"Error loading color LUT cache, building in memory: {e}")
+            _color_lut = lut if lut is not None else build_color_lut()
+    return _color_lut
+
+def classify_colors(frame):
+    """
+    Evaluate all color rules for a BGR frame in one gather.
+    Returns a uint16 plane of RULE_BITS.
+    """
+    h, w = frame.shape[:2]
+    # Little-endian BGRA view gives B | G << 8 | R << 16 | A << 24
+    bgra = cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA)
+    index = bgra.view(np.uint32).reshape(h, w)
+    np.bitwise_and(index, 0xFFFFFF, out=index)
+    return np.take(get_color_lut(), index)
+
+def rule_mask(rules, bits):
+    """
+    Binary 0/255 mask of pixels matching any of the given rule bits
+    """
+    return cv2.compare(np.bitwise_and(rules, np.uint16(bits)), 0, cv2.CMP_NE)
+
+# ==========================
+# FRAME FEATURES
+# ==========================
+
+class FrameFeatures:
+    """
+    Lazily computed per-frame planes shared by every detector.
+    Each derived plane (color conversion, LUT rules, blur) is built
+    on first access and reused for the rest of the frame.
+    """
+
+    def __init__(self, frame: np.ndarray, scale=1.0):
+        self.frame = frame
+        # Frame resolution relative to the source, for kernel scaling
+        self.scale = scale
+        self._cache = {}
+
+    def _get(self, key, build):
+        plane = self._cache.get(key)
+        if plane is None:
+            plane = build()
+            self._cache[key] = plane
+        return plane
+
+    @property
+    def shape(self):
+        return self.frame.shape
+
+    @property
+    def color_rules(self):
+        """Per-pixel RULE_BITS from the color LUT"""
+        return self._get("color_rules", lambda: classify_colors(self.frame))
+
+    @property
+    def gray(self):
+        return self._get("gray", lambda: cv2.cvtColor(self.frame, cv2.COLOR_BGR2GRAY))
+
+    @property
+    def lab(self):
+        return self._get("lab", lambda: cv2.cvtColor(self.frame, cv2.COLOR_BGR2LAB))
+
+    @property
+    def blurred_gray(self):
+        """Gray plane smoothed with a 9x9 Gaussian (mixed-signature analysis)"""
+        size = scaled_kernel(9, self.scale)
+        return self._get("blurred_gray", lambda: cv2.GaussianBlur(self.gray, (size, size), 0))
+
+
+# ==========================
+# TEXTURE ENGINE
+# ==========================
+
+_texture_scratch = threading.local()
+
+def _texture_buffers(shape):
+    """
+    Per-thread float32 gradient buffers, reused while the frame size is unchanged
+    """
+    buffers = getattr(_texture_scratch, "buffers", None)
+    if buffers is None or buffers[0].shape != shape:
+        buffers = (np.empty(shape, dtype=np.float32), np.empty(shape, dtype=np.float32))
+        _texture_scratch.buffers = buffers
+    return buffers
+
+def texture_mask(gray, ksize, threshold, out=None):
+    """
+    Smooth-surface mask: 255 where the Sobel gradient magnitude is below threshold.
+    Compares the squared magnitude against threshold**2 in float32 scratch
+    buffers, which is exact for uint8 input and avoids float64 temporaries.
+    """
+    grad_x, grad_y = _texture_buffers(gray.shape)
+    cv2.Sobel(gray, cv2.CV_32F, 1, 0, dst=grad_x, ksize=ksize)
+    cv2.Sobel(gray, cv2.CV_32F, 0, 1, dst=grad_y, ksize=ksize)
+    cv2.multiply(grad_x, grad_x, dst=grad_x)
+    cv2.multiply(grad_y, grad_y, dst=grad_y)
+    cv2.add(grad_x, grad_y, dst=grad_x)
+    if out is None:
+        out = np.empty(gray.shape, dtype=np.uint8)
+    cv2.compare(grad_x, float(threshold * threshold), cv2.CMP_LT, dst=out)
+    return out
+
 # ==========================
 # CORE ANALYSIS LOGIC
 # ==========================
 
-def detect_vegetation_water(frame, hsv, gray):
+def scaled_kernel(size, scale):
     """
-    Advanced water detection for vegetation-surrounded areas
+    Kernel size covering the same source area at a reduced resolution.
+    Stays odd and never shrinks below 3 (small kernels are left as is).
     """
-    try:
-        h, w, _ = frame.shape
-        
-        # 1. Greenish water detection (vegetation reflections)
-        lower_green_water = np.array([40, 30, 30])   # Green-tinted water
-        upper_green_water = np.array([85, 200, 180])
-        green_water_mask = cv2.inRange(hsv, lower_green_water, upper_green_water)
-        
-        # 2. Shadow water detection (under tree canopy)
-        lower_shadow_water = np.array([0, 0, 20])    # Very dark water
-        upper_shadow_water = np.array([180, 80, 80])
-        shadow_water_mask = cv2.inRange(hsv, lower_shadow_water, upper_shadow_water)
-        
-        # 3. Texture-based water detection using gradient analysis
-        # Water typically has low texture variance
-        grad_x = cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=3)
-        grad_y = cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=3)
-        gradient_magnitude = np.sqrt(grad_x**2 + grad_y**2)
-        
-        # Low gradient areas (smooth surfaces like water)
-        low_texture_mask = (gradient_magnitude < 15).astype(np.uint8) * 255
-        
-        # 4. Reflectance analysis - water often has specific brightness patterns
-        # Use LAB color space for better luminance analysis
-        lab = cv2.cvtColor(frame, cv2.COLOR_BGR2LAB)
-        l_channel = lab[:, :, 0]
-        
-        # Water often has moderate luminance with low variance
-        mean_l = cv2.blur(l_channel, (15, 15))
-        luminance_mask = ((l_channel > 30) & (l_channel < 120) & 
-                         (np.abs(l_channel.astype(np.int16) - mean_l.astype(np.int16)) < 20)).astype(np.uint8) * 255
-        
-        # 5. Combine all vegetation-aware masks
-        vegetation_water_mask = cv2.bitwise_or(green_water_mask, shadow_water_mask)
-        vegetation_water_mask = cv2.bitwise_or(vegetation_water_mask, 
-                                              cv2.bitwise_and(low_texture_mask, luminance_mask))
-        
-        # Clean up with morphological operations
-        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
-        vegetation_water_mask = cv2.morphologyEx(vegetation_water_mask, cv2.MORPH_CLOSE, kernel)
-        vegetation_water_mask = cv2.morphologyEx(vegetation_water_mask, cv2.MORPH_OPEN, kernel)
-        
-        return vegetation_water_mask
-        
-    except Exception as e:
-        print(f"Error in vegetation water detection: {e}")
-        return np.zeros((frame.shape[0], frame.shape[1]), dtype=np.uint8)
+    if scale >= 1.0 or size <= 3:
+        return size
+    return max(3, int(round(size * scale)) | 1)
 
-def detect_vegetation_water(frame, hsv, gray):
+def detect_vegetation_water(features):
     """
     Advanced water detection for vegetation-surrounded areas
     """
+    frame = features.frame
     try:
-        h, w, _ = frame.shape
-        
-        # 1. Greenish water detection (vegetation reflections)
-        lower_green_water = np.array([40, 30, 30])   # Green-tinted water
-        upper_green_water = np.array([85, 200, 180])
-        green_water_mask = cv2.inRange(hsv, lower_green_water, upper_green_water)
-        
-        # 2. Shadow water detection (under tree canopy)
-        lower_shadow_water = np.array([0, 0, 20])    # Very dark water
-        upper_shadow_water = np.array([180, 80, 80])
-        shadow_water_mask = cv2.inRange(hsv, lower_shadow_water, upper_shadow_water)
-        
+        rules = features.color_rules
+
+        # 1. Greenish water (vegetation reflections) and 2. shadow water
+        # (under tree canopy), both evaluated through the color LUT
+        green_shadow_mask = rule_mask(rules, VEGETATION_BITS)
+
         # 3. Texture-based water detection using gradient analysis
         # Water typically has low texture variance
-        grad_x = cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=3)
-        grad_y = cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=3)
-        gradient_magnitude = np.sqrt(grad_x**2 + grad_y**2)
-        
         # Low gradient areas (smooth surfaces like water)
-        low_texture_mask = (gradient_magnitude < 15).astype(np.uint8) * 255
-        
+        low_texture_mask = texture_mask(features.gray, 3, 15)
+
         # 4. Reflectance analysis - water often has specific brightness patterns
         # Use LAB color space for better luminance analysis
-        lab = cv2.cvtColor(frame, cv2.COLOR_BGR2LAB)
-        l_channel = lab[:, :, 0]
+        l_channel = features.lab[:, :, 0]
         
         # Water often has moderate luminance with low variance
-        mean_l = cv2.blur(l_channel, (15, 15))
-        luminance_mask = ((l_channel > 30) & (l_channel < 120) & 
-                         (np.abs(l_channel.astype(np.int16) - mean_l.astype(np.int16)) < 20)).astype(np.uint8) * 255
-        
+        blur_size = scaled_kernel(15, features.scale)
+        mean_l = cv2.blur(l_channel, (blur_size, blur_size))
+        low_variance_mask = cv2.compare(cv2.absdiff(l_channel, mean_l), 20, cv2.CMP_LT)
+        luminance_mask = cv2.bitwise_and(rule_mask(rules, LUMINANCE_BIT), low_variance_mask)
+
         # 5. Combine all vegetation-aware masks
-        vegetation_water_mask = cv2.bitwise_or(green_water_mask, shadow_water_mask)
-        vegetation_water_mask = cv2.bitwise_or(vegetation_water_mask, 
+        vegetation_water_mask = cv2.bitwise_or(green_shadow_mask,
                                               cv2.bitwise_and(low_texture_mask, luminance_mask))
-        
+
         # Clean up with morphological operations
-        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+        size = scaled_kernel(5, features.scale)
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (size, size))
         vegetation_water_mask = cv2.morphologyEx(vegetation_water_mask, cv2.MORPH_CLOSE, kernel)
         vegetation_water_mask = cv2.morphologyEx(vegetation_water_mask, cv2.MORPH_OPEN, kernel)
         
@@ -173,50 +577,24 @@ def detect_vegetation_water(frame, hsv, gray):
         print(f"Error in vegetation water detection: {e}")
         return np.zeros((frame.shape[0], frame.shape[1]), dtype=np.uint8)
 
-def detect_mixed_water_vegetation(frame, hsv):
+def detect_mixed_water_vegetation(features):
     """
     Detect water areas with floating vegetation or debris (common in floods)
     """
+    frame = features.frame
     try:
-        h, w, _ = frame.shape
-        
-        # Convert to different color spaces for comprehensive analysis
-        lab = cv2.cvtColor(frame, cv2.COLOR_BGR2LAB)
-        
-        # 1. Detect areas with moderate green but low saturation (algae/debris water)
-        h_channel = hsv[:, :, 0]
-        s_channel = hsv[:, :, 1] 
-        v_channel = hsv[:, :, 2]
-        
-        # Mixed signature: greenish hue, moderate saturation, variable value
-        mixed_mask1 = ((h_channel >= 35) & (h_channel <= 95) & 
-                       (s_channel >= 30) & (s_channel <= 150) & 
-                       (v_channel >= 40) & (v_channel <= 180)).astype(np.uint8) * 255
-        
-        # 2. Use LAB space to detect water-like surfaces with organic matter
-        l_channel = lab[:, :, 0]
-        a_channel = lab[:, :, 1] 
-        b_channel = lab[:, :, 2]
-        
-        # Water with vegetation tends to have specific a,b values
-        mixed_mask2 = ((l_channel >= 40) & (l_channel <= 140) & 
-                       (a_channel >= 110) & (a_channel <= 135) & 
-                       (b_channel >= 110) & (b_channel <= 145)).astype(np.uint8) * 255
-        
+        # 1. Greenish hue, moderate saturation, variable value (algae/debris water)
+        # 2. LAB a,b signature of water-like surfaces with organic matter
+        # Both come straight from the color LUT
+        mixed_color_mask = rule_mask(features.color_rules, MIXED_BITS)
+
         # 3. Temporal smoothness analysis (even single frame can benefit)
         # Water areas typically have smoother transitions
-        blurred = cv2.GaussianBlur(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (9, 9), 0)
-        
         # Areas with gentle gradients (water-like)
-        grad_x = cv2.Sobel(blurred, cv2.CV_64F, 1, 0, ksize=5)
-        grad_y = cv2.Sobel(blurred, cv2.CV_64F, 0, 1, ksize=5)
-        gradient_mag = np.sqrt(grad_x**2 + grad_y**2)
-        
-        smooth_mask = (gradient_mag < 25).astype(np.uint8) * 255
+        smooth_mask = texture_mask(features.blurred_gray, 5, 25)
         
         # Combine mixed signature masks
-        final_mixed_mask = cv2.bitwise_or(mixed_mask1, mixed_mask2)
-        final_mixed_mask = cv2.bitwise_and(final_mixed_mask, smooth_mask)
+        final_mixed_mask = cv2.bitwise_and(mixed_color_mask, smooth_mask)
         
         # Clean up
         kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
@@ -229,7 +607,41 @@ def detect_mixed_water_vegetation(frame, hsv):
         print(f"Error in mixed water-vegetation detection: {e}")
         return np.zeros((frame.shape[0], frame.shape[1]), dtype=np.uint8)
 
-def suppress_road_false_positives(mask, frame):
+ROAD_MIN_AREA = 30  # px at full resolution, scaled by scale**2
+ROAD_MAX_ASPECT = 12
+ROAD_MIN_AP_RATIO = 0.005
+
+def contour_points(contours):
+    """
+    All contour points as one (N, 2) array, the step from each point to the
+    next on the same closed contour, and each contour's first index
+    """
+    counts = np.fromiter(map(len, contours), np.intp, len(contours))
+    ends = np.cumsum(counts)
+    starts = ends - counts
+    points = np.concatenate(contours).reshape(-1, 2)
+
+    steps = np.roll(points, -1, axis=0)
+    steps[ends - 1] = points[starts]
+    steps -= points
+    return points, steps, starts
+
+def contour_features(contours):
+    """
+    Area, perimeter and squared bounding-box diagonal of every contour,
+    computed over all points at once
+    """
+    points, steps, starts = contour_points(contours)
+
+    # Shoelace area; integer coordinates make this identical to cv2.contourArea
+    cross = points[:, 0] * steps[:, 1] - points[:, 1] * steps[:, 0]
+    area = np.abs(np.add.reduceat(cross, starts, dtype=np.int64)) / 2
+    perimeter = np.add.reduceat(np.sqrt(np.einsum("ij,ij->i", steps, steps), dtype=np.float64), starts)
+    span = np.maximum.reduceat(points, starts) - np.minimum.reduceat(points, starts)
+    diagonal2 = (span.astype(np.int64) ** 2).sum(axis=1)
+    return area, perimeter, diagonal2
+
+def suppress_road_false_positives(mask, frame, scale=1.0):
     """
     Remove road-like structures from water detection (less aggressive)
     """
@@ -240,49 +652,141 @@ def suppress_road_false_positives(mask, frame):
         
         # Find contours
         contours, _ = cv2.findContours(opened, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        # Filter out road-like contours with relaxed criteria
         filtered_mask = np.zeros_like(mask)
-        for contour in contours:
-            area = cv2.contourArea(contour)
-            if area < 30:  # Smaller minimum area threshold
-                continue
-                
-            # Calculate aspect ratio and area-to-perimeter ratio
-            rect = cv2.minAreaRect(contour)
-            width, height = rect[1]
+        if not contours:
+            return filtered_mask
+
+        # Area and area-to-perimeter ratio for every contour at once
+        area, perimeter, diagonal2 = contour_features(contours)
+        keep = area >= ROAD_MIN_AREA * scale * scale  # Smaller minimum area threshold
+        ap_ratio = np.divide(area, perimeter * perimeter, out=np.zeros_like(area), where=perimeter > 0)
+        borderline = np.abs(ap_ratio - ROAD_MIN_AP_RATIO) < 1e-6
+        keep &= (ap_ratio >= ROAD_MIN_AP_RATIO) | borderline
+
+        # The min-area rectangle's aspect ratio never exceeds diagonal^2 / area,
+        # so only possibly elongated or borderline contours need the exact test
+        exact = keep & (borderline | (diagonal2 > (ROAD_MAX_ASPECT - 0.1) * area))
+        for i in np.flatnonzero(exact):
+            width, height = cv2.minAreaRect(contours[i])[1]
             if width > 0 and height > 0:
                 aspect_ratio = max(width, height) / min(width, height)
-                perimeter = cv2.arcLength(contour, True)
-                if perimeter > 0:
-                    ap_ratio = area / (perimeter * perimeter)
-                    
+                exact_perimeter = cv2.arcLength(contours[i], True)
+                if exact_perimeter > 0:
                     # Less aggressive road filtering (higher thresholds)
-                    if aspect_ratio > 12 or ap_ratio < 0.005:  # More lenient
-                        continue
-            
-            # Keep this contour
-            cv2.drawContours(filtered_mask, [contour], -1, 255, -1)
+                    if (aspect_ratio > ROAD_MAX_ASPECT or
+                            area[i] / (exact_perimeter * exact_perimeter) < ROAD_MIN_AP_RATIO):
+                        keep[i] = False
+
+        # Fill the surviving contours in one call; they are all external, so
+        # none of them overlap
+        cv2.drawContours(filtered_mask, [contours[i] for i in np.flatnonzero(keep)], -1, 255, -1)
         
         return filtered_mask
     except Exception as e:
         print(f"Error in road suppression: {e}")
         return mask
 
-def classify_water_zones(mask, frame):
+# Zone engines: "morphology" closes/opens and dilates with elliptic
+# kernels, "distance" thresholds Euclidean distance transforms, so its cost
+# depends on the frame size only, not on the zone widths
+ZONE_ENGINES = ("morphology", "distance")
+ZONE_UNITS = ("px", "m", "rel")
+# Core radius and buffer width in source pixels: the radii of the
+# morphology engine's 15x15 and 25x25 ellipses
+ZONE_CORE_RADIUS = 7
+ZONE_BUFFER_WIDTH = 12
+
+def parse_zone_options(engine="morphology", core=None, buffer=None, units="px", meters_per_pixel=None):
+    """
+    Validated zone settings for analyze_frame, or raises ValueError.
+    core and buffer are in units: "px" source pixels, "m" meters (needs
+    meters_per_pixel) or "rel" fractions of the frame diagonal; None keeps
+    the default width in source pixels (both are needed in "m" or "rel").
+    """
+    if engine not in ZONE_ENGINES:
+        raise ValueError(f"zone_engine must be one of {', '.join(ZONE_ENGINES)}")
+    if units not in ZONE_UNITS:
+        raise ValueError(f"zone_units must be one of {', '.join(ZONE_UNITS)}")
+    if units == "m" and not (meters_per_pixel and meters_per_pixel > 0):
+        raise ValueError("meters_per_pixel must be positive for zone_units=m")
+    for name, value in (("core_width", core), ("buffer_width", buffer)):
+        if value is not None and not (value > 0 and np.isfinite(value)):
+            raise ValueError(f"{name} must be positive")
+    if core is None and buffer is None:
+        units = "px"
+    elif units != "px" and (core is None or buffer is None):
+        raise ValueError("core_width and buffer_width are both required in these units")
+    return {
+        "engine": engine,
+        "core": float(ZONE_CORE_RADIUS if core is None else core),
+        "buffer": float(ZONE_BUFFER_WIDTH if buffer is None else buffer),
+        "units": units,
+        "meters_per_pixel": float(meters_per_pixel) if units == "m" else None,
+    }
+
+def zone_widths(options, shape, scale=1.0):
+    """
+    Core radius and buffer width in pixels of a working frame of shape
+    that is scale times the source resolution
+    """
+    core, buffer = options["core"], options["buffer"]
+    if options["units"] == "rel":
+        diagonal = float(np.hypot(shape[0], shape[1]))
+        return core * diagonal, buffer * diagonal
+    if options["units"] == "m":
+        core, buffer = core / options["meters_per_pixel"], buffer / options["meters_per_pixel"]
+    return core * scale, buffer * scale
+
+def _distance_to_zero(mask):
+    """Euclidean distance of every nonzero pixel to the nearest zero pixel"""
+    return cv2.distanceTransform(mask, cv2.DIST_L2, cv2.DIST_MASK_PRECISE)
+
+def classify_water_zones_distance(mask, core_radius, buffer_width):
+    """
+    Zones from four distance transforms: the mask closed then opened by a
+    disk of core_radius (zone A), a buffer_width band around it (zone B)
+    and the rest of the mask (zone C)
+    """
+    # Closing: grow by the radius, then keep what lies deeper than it
+    grown = cv2.compare(_distance_to_zero(cv2.bitwise_not(mask)), core_radius, cv2.CMP_LE)
+    closed = cv2.compare(_distance_to_zero(grown), core_radius, cv2.CMP_GT)
+
+    # Opening erodes the closed mask by the radius; the distance from that
+    # seed gives zone A (grown back by the radius) and zone B in one pass
+    seed = cv2.compare(_distance_to_zero(closed), core_radius, cv2.CMP_GT)
+    reach = _distance_to_zero(cv2.bitwise_not(seed))
+    zone_a = cv2.compare(reach, core_radius, cv2.CMP_LE)
+    zone_b = cv2.compare(reach, core_radius + buffer_width, cv2.CMP_LE)
+    cv2.subtract(zone_b, zone_a, dst=zone_b)
+
+    # Same uint8 difference as the morphology engine
+    zone_c = mask - zone_a
+    return zone_a, zone_b, zone_c
+
+def classify_water_zones(mask, frame, scale=1.0, options=None):
     """
-    Classify water into core, buffer, and low-risk zones
+    Classify water into core, buffer, and low-risk zones. options from
+    parse_zone_options() select the engine and zone widths; by default the
+    morphology engine runs with the 15x15 and 25x25 ellipses.
     """
     try:
-        h, w = mask.shape
-        
+        if options is not None:
+            core_radius, buffer_width = zone_widths(options, mask.shape, scale)
+            if options["engine"] == "distance":
+                return classify_water_zones_distance(mask, core_radius, buffer_width)
+            core_size = 2 * max(1, int(round(core_radius))) + 1
+            buffer_size = 2 * max(1, int(round(buffer_width))) + 1
+        else:
+            core_size = scaled_kernel(15, scale)
+            buffer_size = scaled_kernel(25, scale)
+
         # Zone A: Core water bodies (morphological closing)
-        kernel_large = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (15, 15))
+        kernel_large = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (core_size, core_size))
         zone_a = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel_large)
         zone_a = cv2.morphologyEx(zone_a, cv2.MORPH_OPEN, kernel_large)
         
         # Zone B: Buffer zones (dilation around core)
-        kernel_buffer = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (25, 25))
+        kernel_buffer = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (buffer_size, buffer_size))
         zone_b = cv2.dilate(zone_a, kernel_buffer, iterations=1)
         zone_b = zone_b - zone_a  # Remove core from buffer
         
@@ -295,238 +799,504 @@ def classify_water_zones(mask, frame):
         print(f"Error in zone classification: {e}")
         return mask, np.zeros_like(mask), np.zeros_like(mask)
 
-def detect_water_body_type(mask, frame):
+def near_image_edge(points, shape, margin):
+    """
+    Which (x, y) points lie within margin pixels of the image border
+    """
+    h, w = shape[:2]
+    x, y = points[:, 0], points[:, 1]
+    return (x <= margin) | (x >= w - margin) | (y <= margin) | (y >= h - margin)
+
+def classify_water_body(contour, shape, scale=1.0):
     """
-    Classify the type of water body with improved ocean vs river detection
+    Classify one water body from its external contour with improved ocean
+    vs river detection
+    """
+    h, w = shape[:2]
+    area = cv2.contourArea(contour)
+    perimeter = cv2.arcLength(contour, True)
+    
+    if perimeter == 0:
+        return "unknown"
+    
+    # Check if water touches image edges (indicates ocean/sea)
+    edge_margin = max(1, round(5 * scale))  # pixels from edge
+    touches_edges = np.count_nonzero(near_image_edge(contour.reshape(-1, 2), (h, w), edge_margin))
+    edge_touch_ratio = touches_edges / len(contour)
+    
+    # Shape analysis
+    circularity = 4 * np.pi * area / (perimeter * perimeter)
+    rect = cv2.minAreaRect(contour)
+    width, height = rect[1]
+    
+    if width > 0 and height > 0:
+        aspect_ratio = max(width, height) / min(width, height)
+        
+        # Ocean detection: Large area AND touches multiple edges
+        if (area > h * w * 0.4 and 
+            edge_touch_ratio > 0.1):  # Touches edges significantly
+            return "ocean"
+        
+        # River detection: Elongated shape OR doesn't touch edges much
+        elif (aspect_ratio > 4 or edge_touch_ratio < 0.05):  # Elongated or inland
+            if aspect_ratio > 8:  # Very elongated
+                return "river"
+            elif circularity > 0.5:  # Somewhat circular but inland
+                return "lake"
+            else:
+                return "river"  # Default for inland water
+        
+        # Lake detection: Circular and moderate size
+        elif circularity > 0.6 and area < h * w * 0.2:
+            return "lake"
+        
+        # Default classification for inland water bodies
+        else:
+            return "river"
+    
+    return "river"  # Default to river for inland water
+
+def detect_water_body_type(mask, frame, scale=1.0, contours=None):
+    """
+    Type of the largest water body in the mask. contours, if given, are
+    the mask's external contours.
     """
     try:
-        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if contours is None:
+            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         if not contours:
             return "unknown"
         
-        h, w = frame.shape[:2]
-        
         # Find largest contour
         largest_contour = max(contours, key=cv2.contourArea)
-        area = cv2.contourArea(largest_contour)
-        perimeter = cv2.arcLength(largest_contour, True)
-        
-        if perimeter == 0:
-            return "unknown"
-        
-        # Check if water touches image edges (indicates ocean/sea)
-        edge_margin = 5  # pixels from edge
-        touches_edges = 0
-        
-        for point in largest_contour:
-            x, y = point[0]
-            if (x <= edge_margin or x >= w - edge_margin or 
-                y <= edge_margin or y >= h - edge_margin):
-                touches_edges += 1
-        
-        edge_touch_ratio = touches_edges / len(largest_contour)
-        
-        # Shape analysis
-        circularity = 4 * np.pi * area / (perimeter * perimeter)
-        rect = cv2.minAreaRect(largest_contour)
-        width, height = rect[1]
-        
-        if width > 0 and height > 0:
-            aspect_ratio = max(width, height) / min(width, height)
-            
-            # Ocean detection: Large area AND touches multiple edges
-            if (area > frame.shape[0] * frame.shape[1] * 0.4 and 
-                edge_touch_ratio > 0.1):  # Touches edges significantly
-                return "ocean"
-            
-            # River detection: Elongated shape OR doesn't touch edges much
-            elif (aspect_ratio > 4 or edge_touch_ratio < 0.05):  # Elongated or inland
-                if aspect_ratio > 8:  # Very elongated
-                    return "river"
-                elif circularity > 0.5:  # Somewhat circular but inland
-                    return "lake"
-                else:
-                    return "river"  # Default for inland water
-            
-            # Lake detection: Circular and moderate size
-            elif circularity > 0.6 and area < frame.shape[0] * frame.shape[1] * 0.2:
-                return "lake"
-            
-            # Default classification for inland water bodies
-            else:
-                return "river"
-        
-        return "river"  # Default to river for inland water
+        return classify_water_body(largest_contour, frame.shape, scale)
     except Exception as e:
         print(f"Error in water body classification: {e}")
         return "unknown"
 
-def analyze_frame(frame: np.ndarray):
+WATER_BODY_LIMIT = 50  # largest bodies listed per frame
+
+def polygon_moments(points, steps, starts):
     """
-    Research-grade visual flood analysis with vegetation-aware detection
+    Area, centroid and central second moments of every closed contour
+    (Green's theorem over the polygon edges, as cv2.moments does)
     """
-    try:
-        h, w, _ = frame.shape
+    x0, y0 = points[:, 0].astype(np.float64), points[:, 1].astype(np.float64)
+    x1, y1 = x0 + steps[:, 0], y0 + steps[:, 1]
+    cross = x0 * y1 - x1 * y0
+    m00 = np.add.reduceat(cross, starts) / 2
+    m10 = np.add.reduceat((x0 + x1) * cross, starts) / 6
+    m01 = np.add.reduceat((y0 + y1) * cross, starts) / 6
+    m20 = np.add.reduceat((x0 * x0 + x0 * x1 + x1 * x1) * cross, starts) / 12
+    m02 = np.add.reduceat((y0 * y0 + y0 * y1 + y1 * y1) * cross, starts) / 12
+    m11 = np.add.reduceat((x0 * y1 + 2 * x0 * y0 + 2 * x1 * y1 + x1 * y0) * cross, starts) / 24
 
-        # Enhanced multi-spectrum water detection
-        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        
-        # 1. Expanded standard water detection ranges
-        lower_water1 = np.array([80, 30, 30])   # More inclusive blue water
-        upper_water1 = np.array([150, 255, 255])
-        
-        lower_water2 = np.array([0, 0, 40])     # More inclusive dark water  
-        upper_water2 = np.array([35, 255, 130])
-        
-        # 3. Enhanced brownish/muddy water (common in flood conditions)
-        lower_water3 = np.array([5, 40, 40])    # More inclusive brown/muddy water
-        upper_water3 = np.array([30, 220, 170])
-        
-        # 4. Additional water range for satellite imagery (grayish-blue water)
-        lower_water4 = np.array([90, 20, 50])   # Low saturation blue-gray water
-        upper_water4 = np.array([130, 100, 150])
-        
-        mask1 = cv2.inRange(hsv, lower_water1, upper_water1)
-        mask2 = cv2.inRange(hsv, lower_water2, upper_water2)
-        mask3 = cv2.inRange(hsv, lower_water3, upper_water3)
-        mask4 = cv2.inRange(hsv, lower_water4, upper_water4)
-        
-        # 2. Vegetation-aware water detection
-        vegetation_mask = detect_vegetation_water(frame, hsv, gray)
-        
-        # Combine all water detection masks (now more comprehensive)
-        combined_mask = cv2.bitwise_or(mask1, mask2)
-        combined_mask = cv2.bitwise_or(combined_mask, mask3)
-        combined_mask = cv2.bitwise_or(combined_mask, mask4)
-        combined_mask = cv2.bitwise_or(combined_mask, vegetation_mask)
-        
-        # Additional enhancement for flood water (often has debris/vegetation)
-        # Detect areas with mixed water-vegetation signatures
-        mixed_signature_mask = detect_mixed_water_vegetation(frame, hsv)
-        combined_mask = cv2.bitwise_or(combined_mask, mixed_signature_mask)
-        
-        # Suppress road false positives
-        filtered_mask = suppress_road_false_positives(combined_mask, frame)
-        
-        # Classify into zones
-        zone_a, zone_b, zone_c = classify_water_zones(filtered_mask, frame)
-        
-        # Calculate coverage for each zone
-        total_pixels = h * w
-        zone_a_ratio = float(np.sum(zone_a > 0) / total_pixels)
-        zone_b_ratio = float(np.sum(zone_b > 0) / total_pixels)
-        zone_c_ratio = float(np.sum(zone_c > 0) / total_pixels)
-        total_water_ratio = zone_a_ratio + zone_b_ratio + zone_c_ratio
-        
-        # Enhanced risk assessment
-        if zone_a_ratio > 0.15:  # Core water dominates
-            risk = "Extreme"
-        elif zone_a_ratio > 0.08:
-            risk = "Severe"
-        elif (zone_a_ratio + zone_b_ratio) > 0.2:
-            risk = "Elevated"
-        elif total_water_ratio > 0.15:
-            risk = "Guarded"
-        elif total_water_ratio > 0.05:
-            risk = "Low"
-        else:
-            risk = "Minimal"
-        
-        # Detect water body type
-        water_body_type = detect_water_body_type(filtered_mask, frame)
-        
-        # Calculate edge confidence
-        edges = cv2.Canny(filtered_mask, 50, 150)
-        edge_pixels = np.sum(edges > 0)
-        edge_confidence = min(1.0, float(edge_pixels / max(1, np.sum(filtered_mask > 0))))
-        
-        return {
-            "risk_level": risk,
-            "water_coverage": round(total_water_ratio * 100, 2),
-            "explainability": {
-                "Water presence": f"{round(total_water_ratio*100,2)}%",
-                "Core water bodies": f"{round(zone_a_ratio*100,2)}%",
-                "Buffer zones": f"{round(zone_b_ratio*100,2)}%",
-                "Moisture areas": f"{round(zone_c_ratio*100,2)}%",
-                "River/Ocean detected": bool(total_water_ratio > 0.15),
-                "Surface saturation": "High" if total_water_ratio > 0.3 else "Moderate",
-                "Historical zone": "Likely" if total_water_ratio > 0.2 else "Unlikely",
-                "water_body_type": water_body_type,
-                "edge_confidence": round(edge_confidence, 3),
-                "false_positive_suppressed": True
-            },
-            "zones": {
-                "zone_a": zone_a,
-                "zone_b": zone_b, 
-                "zone_c": zone_c
-            },
-            "mask": filtered_mask
-        }
-    except Exception as e:
-        print(f"Error in analyze_frame: {e}")
-        # Return safe default values
-        return {
-            "risk_level": "Unknown",
-            "water_coverage": 0.0,
-            "explainability": {
-                "Water presence": "0%",
-                "Core water bodies": "0%",
-                "Buffer zones": "0%",
-                "Moisture areas": "0%",
-                "River/Ocean detected": False,
-                "Surface saturation": "Unknown",
-                "Historical zone": "Unknown",
-                "water_body_type": "unknown",
-                "edge_confidence": 0.0,
-                "false_positive_suppressed": True
-            },
-            "zones": {
-                "zone_a": np.zeros((frame.shape[0], frame.shape[1]), dtype=np.uint8),
-                "zone_b": np.zeros((frame.shape[0], frame.shape[1]), dtype=np.uint8),
-                "zone_c": np.zeros((frame.shape[0], frame.shape[1]), dtype=np.uint8)
-            },
-            "mask": np.zeros((frame.shape[0], frame.shape[1]), dtype=np.uint8)
-        }
+    area = np.abs(m00)
+    safe = np.where(m00 != 0, m00, 1)
+    cx, cy = m10 / safe, m01 / safe
+    mu20 = m20 / safe - cx * cx
+    mu02 = m02 / safe - cy * cy
+    mu11 = m11 / safe - cx * cy
+    return area, cx, cy, mu20, mu02, mu11
 
-def create_multi_scale_heatmap(mask, shape):
+def body_zone_shares(mask, zones, points):
     """
-    Generate dense heatmap with multiple Gaussian kernels
+    Share of pixels in every zone for the water body (8-connected region of
+    mask) containing each (x, y) point
+    """
+    _, labels = cv2.connectedComponents(mask, connectivity=8, ltype=cv2.CV_32S)
+    body_labels = labels[points[:, 1], points[:, 0]]
+    inside = mask > 0
+    pixel_labels = labels[inside]
+    pixel_area = np.maximum(np.bincount(pixel_labels, minlength=labels.max() + 1), 1)
+    return {name: (np.bincount(pixel_labels, weights=plane[inside] > 0,
+                               minlength=len(pixel_area)) / pixel_area)[body_labels]
+            for name, plane in zones.items()}
+
+def water_body_inventory(mask, zones, scale=1.0, contours=None, zone_share=None):
+    """
+    Area, circularity, elongation, edge contact and zone membership of every
+    water body in the filtered mask, largest first; each body's type comes
+    from classify_water_body, as for detect_water_body_type. contours are
+    the mask's external contours, if already found; zone_share maps each
+    zone to every contour's share in it (see body_zone_shares), computed
+    from the mask when not given.
     """
     try:
-        h, w = shape[:2]
-        heatmap = np.zeros((h, w), dtype=np.float32)
-        
-        if np.sum(mask) == 0:
-            return heatmap
-        
-        # Multiple scale Gaussian kernels for density
-        scales = [5, 10, 20, 30]
-        weights = [0.4, 0.3, 0.2, 0.1]
-        
-        for scale, weight in zip(scales, weights):
-            smoothed = gaussian_filter(mask.astype(np.float32), sigma=scale)
-            heatmap += smoothed * weight
-        
-        # Normalize
-        if np.max(heatmap) > 0:
-            heatmap = heatmap / np.max(heatmap)
-        
-        return heatmap
+        if contours is None:
+            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if not contours:
+            return []
+        h, w = mask.shape[:2]
+        frame_area = h * w
+
+        points, steps, starts = contour_points(contours)
+        area, cx, cy, mu20, mu02, mu11 = polygon_moments(points, steps, starts)
+        perimeter = np.add.reduceat(np.hypot(steps[:, 0], steps[:, 1]), starts)
+        circularity = np.divide(4 * np.pi * area, perimeter * perimeter,
+                                out=np.zeros_like(area), where=perimeter > 0)
+
+        # Elongation: axis ratio of the equivalent ellipse (L/W for an L x W rectangle)
+        half_spread = np.sqrt(((mu20 - mu02) / 2) ** 2 + mu11 ** 2)
+        major = (mu20 + mu02) / 2 + half_spread
+        minor = (mu20 + mu02) / 2 - half_spread
+        elongation = np.sqrt(np.divide(major, minor, out=np.full_like(major, np.inf), where=minor > 1e-9))
+
+        # Share of contour points near the image border
+        edge_margin = max(1, round(5 * scale))
+        counts = np.diff(np.append(starts, len(points)))
+        edge_contact = np.add.reduceat(near_image_edge(points, (h, w), edge_margin).astype(np.intp),
+                                       starts) / counts
+
+        # Zone membership: share of each body's pixels in every zone
+        if zone_share is None:
+            zone_share = body_zone_shares(mask, zones, points[starts])
+
+        lo = np.minimum.reduceat(points, starts)
+        hi = np.maximum.reduceat(points, starts)
+        order = np.argsort(-area, kind="stable")[:WATER_BODY_LIMIT]
+        return [{
+            "type": classify_water_body(contours[i], (h, w), scale),
+            "area_pct": round(float(area[i] / frame_area * 100), 3),
+            "centroid": [round(float(cx[i] / w), 4), round(float(cy[i] / h), 4)],
+            "bbox": [round(float(lo[i, 0] / w), 4), round(float(lo[i, 1] / h), 4),
+                     round(float((hi[i, 0] + 1) / w), 4), round(float((hi[i, 1] + 1) / h), 4)],
+            "circularity": round(float(min(circularity[i], 1.0)), 3),
+            "elongation": round(float(min(elongation[i], 999.0)), 2),
+            "edge_contact": round(float(edge_contact[i]), 3),
+            "zones": {name: round(float(share[i]), 3) for name, share in zone_share.items()}
+        } for i in order]
     except Exception as e:
-        print(f"Error creating heatmap: {e}")
-        return np.zeros(shape[:2], dtype=np.float32)
+        print(f"Error in water body inventory: {e}")
+        return []
 
-def add_water_edge_labels(output, zones, analysis):
+def describe_water_bodies(mask, frame, zones, scale=1.0):
     """
-    Add floating risk labels along water edges
+    Largest body's type and the inventory, from one contour search
     """
-    try:
-        zone_a = zones["zone_a"]
-        
-        # Find contours for edge detection
-        contours, _ = cv2.findContours(zone_a, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    return (detect_water_body_type(mask, frame, scale, contours),
+            water_body_inventory(mask, zones, scale, contours))
+
+def detect_water_mask(features):
+    """
+    Combined multi-spectrum water mask, before road suppression.
+    Every step is a fixed-size neighborhood operation (see DETECTION_HALO).
+    """
+    # 1. Standard HSV water ranges (blue, dark, muddy, satellite gray-blue)
+    # evaluated in one LUT gather, see COLOR_RULES
+    hsv_water_mask = rule_mask(features.color_rules, HSV_WATER_BITS)
+
+    # 2. Vegetation-aware water detection
+    vegetation_mask = detect_vegetation_water(features)
+
+    # Combine all water detection masks (now more comprehensive)
+    combined_mask = cv2.bitwise_or(hsv_water_mask, vegetation_mask)
+
+    # Additional enhancement for flood water (often has debris/vegetation)
+    # Detect areas with mixed water-vegetation signatures
+    mixed_signature_mask = detect_mixed_water_vegetation(features)
+    return cv2.bitwise_or(combined_mask, mixed_signature_mask)
+
+def build_analysis(total_pixels, zone_pixels, water_body_type, edge_confidence, zones, mask,
+                   water_bodies=None):
+    """
+    Risk level and explainability from per-zone pixel counts
+    """
+    water_bodies = water_bodies or []
+    # Calculate coverage for each zone
+    zone_a_ratio = float(zone_pixels[0] / total_pixels)
+    zone_b_ratio = float(zone_pixels[1] / total_pixels)
+    zone_c_ratio = float(zone_pixels[2] / total_pixels)
+    total_water_ratio = zone_a_ratio + zone_b_ratio + zone_c_ratio
+
+    # Enhanced risk assessment
+    if zone_a_ratio > 0.15:  # Core water dominates
+        risk = "Extreme"
+    elif zone_a_ratio > 0.08:
+        risk = "Severe"
+    elif (zone_a_ratio + zone_b_ratio) > 0.2:
+        risk = "Elevated"
+    elif total_water_ratio > 0.15:
+        risk = "Guarded"
+    elif total_water_ratio > 0.05:
+        risk = "Low"
+    else:
+        risk = "Minimal"
+
+    return {
+        "risk_level": risk,
+        "water_coverage": round(total_water_ratio * 100, 2),
+        "explainability": {
+            "Water presence": f"{round(total_water_ratio*100,2)}%",
+            "Core water bodies": f"{round(zone_a_ratio*100,2)}%",
+            "Buffer zones": f"{round(zone_b_ratio*100,2)}%",
+            "Moisture areas": f"{round(zone_c_ratio*100,2)}%",
+            "River/Ocean detected": bool(total_water_ratio > 0.15),
+            "Surface saturation": "High" if total_water_ratio > 0.3 else "Moderate",
+            "Historical zone": "Likely" if total_water_ratio > 0.2 else "Unlikely",
+            "water_body_type": water_body_type,
+            "water_body_count": len(water_bodies),
+            "edge_confidence": round(edge_confidence, 3),
+            "false_positive_suppressed": True
+        },
+        "water_bodies": water_bodies,
+        "zones": zones,
+        "mask": mask
+    }
+
+def empty_analysis(shape):
+    """
+    Safe default analysis for frames that failed to process
+    """
+    h, w = shape[:2]
+    return {
+        "risk_level": "Unknown",
+        "water_coverage": 0.0,
+        "explainability": {
+            "Water presence": "0%",
+            "Core water bodies": "0%",
+            "Buffer zones": "0%",
+            "Moisture areas": "0%",
+            "River/Ocean detected": False,
+            "Surface saturation": "Unknown",
+            "Historical zone": "Unknown",
+            "water_body_type": "unknown",
+            "water_body_count": 0,
+            "edge_confidence": 0.0,
+            "false_positive_suppressed": True
+        },
+        "water_bodies": [],
+        "zones": {
+            "zone_a": np.zeros((h, w), dtype=np.uint8),
+            "zone_b": np.zeros((h, w), dtype=np.uint8),
+            "zone_c": np.zeros((h, w), dtype=np.uint8)
+        },
+        "mask": np.zeros((h, w), dtype=np.uint8)
+    }
+
+def mask_edge_confidence(mask):
+    """
+    Share of mask pixels on a Canny edge, capped at 1
+    """
+    edges = cv2.Canny(mask, 50, 150)
+    edge_pixels = cv2.countNonZero(edges)
+    return min(1.0, float(edge_pixels / max(1, cv2.countNonZero(mask))))
+
+def analyze_water_mask(combined_mask, frame, scale=1.0, timings=None, zone_options=None):
+    """
+    Region-level stages on a detected water mask: road suppression,
+    zones, water body type and edge confidence. timings, if given,
+    receives a "regions.<stage>" span for each.
+    """
+    h, w = combined_mask.shape
+    started = time.perf_counter()
+
+    # Suppress road false positives
+    filtered_mask = suppress_road_false_positives(combined_mask, frame, scale)
+    started = _lap(timings, "regions.road_suppression", started)
+
+    # Classify into zones
+    zone_a, zone_b, zone_c = classify_water_zones(filtered_mask, frame, scale, zone_options)
+    zone_pixels = [cv2.countNonZero(zone_a), cv2.countNonZero(zone_b), cv2.countNonZero(zone_c)]
+    started = _lap(timings, "regions.zones", started)
+
+    # Detect water body type; the inventory reuses the same contours
+    contours, _ = cv2.findContours(filtered_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    water_body_type = detect_water_body_type(filtered_mask, frame, scale, contours)
+    started = _lap(timings, "regions.water_body_type", started)
+
+    zones = {
+        "zone_a": zone_a,
+        "zone_b": zone_b,
+        "zone_c": zone_c
+    }
+    water_bodies = water_body_inventory(filtered_mask, zones, scale, contours)
+    started = _lap(timings, "regions.water_bodies", started)
+    edge_confidence = mask_edge_confidence(filtered_mask)
+    _lap(timings, "regions.edge_confidence", started)
+    return build_analysis(h * w, zone_pixels, water_body_type, edge_confidence,
+                          zones, filtered_mask, water_bodies)
+
+# Working resolution budget (pixels) per quality preset; None is native
+ANALYSIS_PRESETS = {
+    "fast": 1_000_000,
+    "balanced": 4_000_000,
+    "full": None,
+}
+DEFAULT_PRESET = "balanced"
+
+def preset_scale(shape, preset):
+    """
+    Downscale factor that brings a frame within the preset's pixel budget
+    """
+    budget = ANALYSIS_PRESETS[preset]
+    pixels = shape[0] * shape[1]
+    if budget is None or pixels <= budget:
+        return 1.0
+    return float(np.sqrt(budget / pixels))
+
+def _lap(timings, stage, started):
+    now = time.perf_counter()
+    if timings is not None:
+        timings[stage] = round((now - started) * 1000, 2)
+    return now
+
+def analyze_frame(frame: np.ndarray, preset="full", source_scale=1.0, timings=None,
+                  zone_options=None):
+    """
+    Research-grade visual flood analysis with vegetation-aware detection.
+    Non-full presets analyze a downscaled copy with kernels scaled to match
+    and return zones upsampled to the frame. source_scale is how much the
+    frame itself was already reduced (e.g. by a reduced decode); timings,
+    if given, receives per-stage milliseconds. zone_options come from
+    parse_zone_options().
+    """
+    try:
+        started = time.perf_counter()
+        h, w = frame.shape[:2]
+        scale = preset_scale(frame.shape, preset)
+        working = frame
+        if scale < 1.0:
+            size = (max(1, round(w * scale)), max(1, round(h * scale)))
+            working = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        started = _lap(timings, "resize", started)
+
+        # Enhanced multi-spectrum water detection (planes shared by all detectors)
+        features = FrameFeatures(working, scale * source_scale)
+        combined_mask = detect_water_mask(features)
+        started = _lap(timings, "detect", started)
+
+        analysis = analyze_water_mask(combined_mask, working, scale * source_scale, timings,
+                                      zone_options)
+        started = _lap(timings, "regions", started)
+
+        if working is not frame:
+            for name, zone in analysis["zones"].items():
+                analysis["zones"][name] = cv2.resize(zone, (w, h), interpolation=cv2.INTER_NEAREST)
+            analysis["mask"] = cv2.resize(analysis["mask"], (w, h), interpolation=cv2.INTER_NEAREST)
+            _lap(timings, "upsample", started)
+        return analysis
+    except Exception as e:
+        print(f"Error in analyze_frame: {e}")
+        # Return safe default values
+        return empty_analysis(frame.shape)
+
+# Multiple scale Gaussian kernels for density
+HEATMAP_SCALES = [5, 10, 20, 30]
+HEATMAP_WEIGHTS = [0.4, 0.3, 0.2, 0.1]
+
+# Each scale is blurred on the pyramid level where sigma / factor stays
+# at or above this, so every blur costs about the same regardless of sigma
+HEATMAP_MIN_LEVEL_SIGMA = 3.0
+# Padding around the frame, in coarsest-level pixels
+HEATMAP_MARGIN_LEVELS = 4
+
+def _heatmap_level(sigma):
+    factor = 1
+    while sigma / (factor * 2) >= HEATMAP_MIN_LEVEL_SIGMA:
+        factor *= 2
+    return factor
+
+def _heatmap_level_sigma(sigma, factor):
+    """
+    Blur sigma (in level pixels) that, after the smoothing added by the
+    area downsample and bilinear upsample chain, matches sigma at full size
+    """
+    if factor == 1:
+        return sigma
+    down_var = (factor * factor - 1) / 12.0
+    up_var = 0.0
+    step = factor
+    while step > 1:
+        up_var += step * step / 6.0
+        step //= 2
+    return np.sqrt(max(sigma * sigma - down_var - up_var, 0.25)) / factor
+
+def create_zone_heatmaps(masks, shape):
+    """
+    Multi-scale density heatmaps for several masks at once.
+    Masks are stacked into one multi-channel image and blurred on an image
+    pyramid (downsample, blur, upsample), accumulating coarse to fine.
+    Returns an (h, w, len(masks)) float32 array, each channel normalized to 1.
+    Empty masks are skipped and come back as zeros.
+    """
+    h, w = shape[:2]
+    heatmaps = np.zeros((h, w, len(masks)), dtype=np.float32)
+    try:
+        active = [i for i, mask in enumerate(masks) if cv2.countNonZero(mask) > 0]
+        if not active:
+            return heatmaps
+
+        levels = {}
+        for sigma, weight in zip(HEATMAP_SCALES, HEATMAP_WEIGHTS):
+            levels.setdefault(_heatmap_level(sigma), []).append((sigma, weight))
+        max_factor = max(levels)
+
+        # Reflect-pad by a margin so coarse-level edge effects fall outside
+        # the frame, and up to a multiple of the coarsest factor so levels align
+        margin = HEATMAP_MARGIN_LEVELS * max_factor
+        stacked = cv2.merge([masks[i] for i in active])
+        stacked = cv2.copyMakeBorder(stacked, margin, margin + (-h % max_factor),
+                                     margin, margin + (-w % max_factor), cv2.BORDER_REFLECT)
+        stacked = stacked.astype(np.float32)
+        if stacked.ndim == 2:
+            stacked = stacked[:, :, None]
+
+        pyramid = {1: stacked}
+        factor = 1
+        while factor < max_factor:
+            level = pyramid[factor]
+            factor *= 2
+            pyramid[factor] = cv2.resize(level, (level.shape[1] // 2, level.shape[0] // 2),
+                                         interpolation=cv2.INTER_AREA)
+
+        accumulated = None
+        factor = max_factor
+        while factor >= 1:
+            level = pyramid[factor]
+            if accumulated is not None:
+                accumulated = cv2.resize(accumulated, (level.shape[1], level.shape[0]),
+                                         interpolation=cv2.INTER_LINEAR)
+            for sigma, weight in levels.get(factor, []):
+                blurred = cv2.GaussianBlur(level, (0, 0), _heatmap_level_sigma(sigma, factor),
+                                           borderType=cv2.BORDER_REFLECT)
+                if accumulated is None:
+                    accumulated = blurred * weight
+                else:
+                    cv2.scaleAdd(blurred, weight, accumulated, dst=accumulated)
+            factor //= 2
+
+        accumulated = accumulated.reshape(accumulated.shape[0], accumulated.shape[1], -1)
+        accumulated = accumulated[margin:margin + h, margin:margin + w]
+
+        # Normalize
+        peaks = accumulated.reshape(-1, len(active)).max(axis=0)
+        for channel, i in enumerate(active):
+            if peaks[channel] > 0:
+                heatmaps[:, :, i] = accumulated[:, :, channel] / peaks[channel]
+
+        return heatmaps
+    except Exception as e:
+        print(f"Error creating heatmaps: {e}")
+        return np.zeros((h, w, len(masks)), dtype=np.float32)
+
+def create_multi_scale_heatmap(mask, shape):
+    """
+    Generate dense heatmap with multiple Gaussian kernels
+    """
+    return create_zone_heatmaps([mask], shape)[:, :, 0]
+
+def add_water_edge_labels(output, zones, analysis):
+    """
+    Add floating risk labels along water edges
+    """
+    try:
+        zone_a = zones["zone_a"]
+        
+        # Find contours for edge detection
+        contours, _ = cv2.findContours(zone_a, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        
         water_type = analysis["explainability"].get("water_body_type", "water")
         risk_level = analysis["risk_level"]
         
@@ -588,12 +1358,13 @@ def add_research_legend(output):
         legend_x = w - legend_w - 20
         legend_y = h - legend_h - 20
         
-        # Semi-transparent background
-        overlay = output.copy()
-        cv2.rectangle(overlay, (legend_x, legend_y), 
-                     (legend_x + legend_w, legend_y + legend_h), 
-                     (0, 0, 0), -1)
-        output = cv2.addWeighted(output, 0.7, overlay, 0.3, 0)
+        # Semi-transparent background, blended in place inside the
+        # rectangle only (outside it the blend leaves pixels unchanged)
+        x0, y0 = max(legend_x, 0), max(legend_y, 0)
+        x1, y1 = min(legend_x + legend_w + 1, w), min(legend_y + legend_h + 1, h)
+        if x1 > x0 and y1 > y0:
+            region = output[y0:y1, x0:x1]
+            cv2.addWeighted(region, 0.7, np.zeros_like(region), 0.3, 0, dst=region)
         
         # Title
         cv2.putText(output, "FLOOD ANALYSIS", 
@@ -633,43 +1404,75 @@ def add_research_legend(output):
         print(f"Error adding legend: {e}")
         return output
 
-def annotate_frame(frame, analysis):
+_overlay_scratch = threading.local()
+
+def _overlay_buffers(shape):
+    """
+    Per-thread overlay buffers, reused while the frame size is unchanged:
+    float32 and uint8 zone products, the BGR overlay and one float32 and
+    one uint8 spare plane
+    """
+    h, w = shape[:2]
+    buffers = getattr(_overlay_scratch, "buffers", None)
+    if buffers is None or buffers[4].shape != (h, w):
+        buffers = (np.empty((h, w, 3), dtype=np.float32), np.empty((h, w, 3), dtype=np.uint8),
+                   np.empty((h, w, 3), dtype=np.uint8), np.empty((h, w), dtype=np.float32),
+                   np.empty((h, w), dtype=np.uint8))
+        _overlay_scratch.buffers = buffers
+    return buffers
+
+# Heatmap weights for zones A, B and C in their main overlay channel
+# (red, green and blue); orange and cyan add a second channel at 255
+OVERLAY_WEIGHTS = (255, 200, 255, 0)
+
+def composite_zone_overlay(heatmaps):
+    """
+    BGR overlay of the (h, w, 3) zone A/B/C heatmaps: A deep red, B orange,
+    C cyan. Written into a per-thread buffer, valid until the next call on
+    the thread. Products are truncated to uint8 and summed modulo 256.
+    """
+    products, truncated, overlay, spare, spare_u8 = _overlay_buffers(heatmaps.shape)
+
+    # A*255, B*200 and C*255 in one pass, moved to R, G and B
+    cv2.multiply(heatmaps, OVERLAY_WEIGHTS, dst=products)
+    np.copyto(truncated, products, casting="unsafe")
+    cv2.mixChannels([truncated], [overlay], [0, 2, 1, 1, 2, 0])
+
+    # Cyan also feeds green, orange also feeds red
+    np.add(overlay[:, :, 1], overlay[:, :, 0], out=overlay[:, :, 1])
+    np.multiply(heatmaps[:, :, 1], np.float32(255), out=spare)
+    np.copyto(spare_u8, spare, casting="unsafe")
+    np.add(overlay[:, :, 2], spare_u8, out=overlay[:, :, 2])
+    return overlay
+
+def annotate_frame(frame, analysis, timings=None, out=None):
     """
-    Research-grade flood visualization with multi-zone heatmaps
+    Research-grade flood visualization with multi-zone heatmaps.
+    timings, if given, receives a "render.<stage>" span for each step;
+    out, if given, is a uint8 array of the frame's shape to render into.
     """
     try:
+        started = time.perf_counter()
         h, w = frame.shape[:2]
-        output = frame.copy()
         
         zones = analysis["zones"]
         zone_a = zones["zone_a"]
         zone_b = zones["zone_b"] 
         zone_c = zones["zone_c"]
         
-        # Create multi-scale heatmaps for each zone
-        heatmap_a = create_multi_scale_heatmap(zone_a, frame.shape)
-        heatmap_b = create_multi_scale_heatmap(zone_b, frame.shape)
-        heatmap_c = create_multi_scale_heatmap(zone_c, frame.shape)
-        
-        # Create colored overlays
-        overlay = np.zeros_like(frame)
+        # Create multi-scale heatmaps for all zones in one stacked pass
+        heatmaps = create_zone_heatmaps([zone_a, zone_b, zone_c], frame.shape)
+        started = _lap(timings, "render.heatmaps", started)
         
-        # Zone A: Deep Red (Core water)
-        overlay[:, :, 2] = np.clip(overlay[:, :, 2] + (heatmap_a * 255).astype(np.uint8), 0, 255)
-        
-        # Zone B: Orange/Yellow (Risk buffer)
-        overlay[:, :, 1] = np.clip(overlay[:, :, 1] + (heatmap_b * 200).astype(np.uint8), 0, 255)
-        overlay[:, :, 2] = np.clip(overlay[:, :, 2] + (heatmap_b * 255).astype(np.uint8), 0, 255)
-        
-        # Zone C: Cyan (Low risk)
-        overlay[:, :, 0] = np.clip(overlay[:, :, 0] + (heatmap_c * 255).astype(np.uint8), 0, 255)
-        overlay[:, :, 1] = np.clip(overlay[:, :, 1] + (heatmap_c * 255).astype(np.uint8), 0, 255)
-        
-        # Blend with original frame
-        output = cv2.addWeighted(output, 0.6, overlay, 0.4, 0)
+        # Colored zone overlay, blended with the original frame
+        overlay = composite_zone_overlay(heatmaps)
+        del heatmaps
+        output = cv2.addWeighted(frame, 0.6, overlay, 0.4, 0, dst=out)
+        started = _lap(timings, "render.overlay", started)
         
         # Add water edge labels
         output = add_water_edge_labels(output, zones, analysis)
+        started = _lap(timings, "render.labels", started)
         
         # Main status header
         risk = analysis['risk_level']
@@ -698,106 +1501,2987 @@ def annotate_frame(frame, analysis):
         
         # Add professional legend
         output = add_research_legend(output)
+        _lap(timings, "render.header_legend", started)
         
         return output
         
     except Exception as e:
         print(f"Error in annotate_frame: {e}")
         # Return original frame with basic error overlay
-        output = frame.copy()
+        if out is None:
+            output = frame.copy()
+        else:
+            output = out
+            output[:] = frame
         cv2.putText(output, "Analysis Error - See Logs", (20, 50), 
                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
         return output
 
 # ==========================
-# IMAGE INFERENCE
+# TILED RASTER ANALYSIS
 # ==========================
 
-@app.post("/api/infer/image")
-async def infer_image(file: UploadFile = File(...)):
-    try:
-        contents = await file.read()
-        npimg = np.frombuffer(contents, np.uint8)
-        frame = cv2.imdecode(npimg, cv2.IMREAD_COLOR)
+# Halo around each tile, wide enough that every pixel in the tile core
+# sees exactly the neighborhood it would see in the untiled frame.
+# Detection: 15x15 luminance blur (7) + 5x5 close/open (8) in the
+# vegetation detector; 9x9 blur (4) + 5x5 Sobel (2) + 3x3 open/close (4)
+# in the mixed detector.
+DETECTION_HALO = 16
+# Zones: 15x15 close/open (28) + 25x25 dilation (12), plus Canny (2)
+ZONE_HALO = 48
 
+TILE_SIZE = 2048
+RASTER_PREVIEW_SIDE = 2048
+
+def open_raster(path):
+    """
+    Memory-map a BGR raster. .npy rasters are mapped directly; encoded
+    images are decoded once and spilled to a .npy next to the source.
+    OpenCV decodes the whole image at once, so that conversion briefly
+    holds the full 3-byte-per-pixel frame; upload .npy rasters to stay
+    within tile memory.
+    """
+    path = Path(path)
+    if path.suffix.lower() != ".npy":
+        frame = cv2.imread(str(path), cv2.IMREAD_COLOR)
         if frame is None:
-            return JSONResponse({"error": "Invalid image format"}, status_code=400)
+            return None
+        npy_path = path.with_suffix(".npy")
+        np.save(npy_path, frame)
+        del frame
+        path = npy_path
+    raster = np.load(path, mmap_mode="r")
+    if raster.ndim != 3 or raster.shape[2] != 3 or raster.dtype != np.uint8:
+        return None
+    return raster
 
-        analysis = analyze_frame(frame)
-        output = annotate_frame(frame, analysis)
+def _tile_grid(h, w, tile_size):
+    for y0 in range(0, h, tile_size):
+        for x0 in range(0, w, tile_size):
+            yield y0, min(y0 + tile_size, h), x0, min(x0 + tile_size, w)
 
-        out_path = OUTPUT_DIR / f"output_{int(time.time())}.png"
-        cv2.imwrite(str(out_path), output)
+def _with_halo(y0, y1, x0, x1, halo, h, w):
+    """
+    Tile bounds grown by the halo (clamped to the image) and the core's
+    offset inside the grown tile
+    """
+    hy0, hy1 = max(0, y0 - halo), min(h, y1 + halo)
+    hx0, hx1 = max(0, x0 - halo), min(w, x1 + halo)
+    return (hy0, hy1, hx0, hx1), (slice(y0 - hy0, y1 - hy0), slice(x0 - hx0, x1 - hx0))
 
-        # Create JSON-safe response by excluding the mask
-        response_data = {
-            "risk": analysis["risk_level"],
-            "water_coverage": analysis["water_coverage"],
-            "details": analysis["explainability"],
-            "output_image": out_path.name
-        }
+def _open_planes(work_dir, names, shape, mode):
+    return {name: np.lib.format.open_memmap(Path(work_dir) / f"{name}.npy", mode=mode,
+                                            dtype=np.uint8, shape=shape)
+            for name in names}
 
-        return JSONResponse(response_data)
+def _detect_tile(raster_path, work_dir, bounds):
+    """
+    Worker: combined water mask for one tile core
+    """
+    raster = np.load(raster_path, mmap_mode="r")
+    h, w = raster.shape[:2]
+    y0, y1, x0, x1 = bounds
+    (hy0, hy1, hx0, hx1), core = _with_halo(y0, y1, x0, x1, DETECTION_HALO, h, w)
+
+    features = FrameFeatures(np.ascontiguousarray(raster[hy0:hy1, hx0:hx1]))
+    combined = detect_water_mask(features)
+
+    planes = _open_planes(work_dir, ["combined"], (h, w), "r+")
+    planes["combined"][y0:y1, x0:x1] = combined[core]
+    planes["combined"].flush()
+
+def _zone_tile(work_dir, shape, bounds, points):
+    """
+    Worker: zones and edge pixels for one tile core of the filtered mask.
+    Returns per-zone, edge and mask pixel counts for the core, and the
+    core's water body labels (see _tile_bodies) at the given (x, y) points.
+    """
+    h, w = shape
+    y0, y1, x0, x1 = bounds
+    (hy0, hy1, hx0, hx1), core = _with_halo(y0, y1, x0, x1, ZONE_HALO, h, w)
+
+    filtered = _open_planes(work_dir, ["filtered"], shape, "r")["filtered"]
+    tile = np.ascontiguousarray(filtered[hy0:hy1, hx0:hx1])
+    zone_a, zone_b, zone_c = classify_water_zones(tile, None)
+    edges = cv2.Canny(tile, 50, 150)
+
+    planes = _open_planes(work_dir, ["zone_a", "zone_b", "zone_c"], shape, "r+")
+    counts = []
+    for name, zone in (("zone_a", zone_a), ("zone_b", zone_b), ("zone_c", zone_c)):
+        planes[name][y0:y1, x0:x1] = zone[core]
+        planes[name].flush()
+        counts.append(cv2.countNonZero(zone[core]))
+    counts.append(cv2.countNonZero(edges[core]))
+    counts.append(cv2.countNonZero(tile[core]))
+    bodies = _tile_bodies(np.ascontiguousarray(tile[core]),
+                          [zone[core] for zone in (zone_a, zone_b, zone_c)], points - (x0, y0))
+    return counts, bodies
+
+def _tile_bodies(mask, zones, points):
+    """
+    8-connected regions of one tile core: pixel and per-zone counts of
+    every label, the labels along the core's border (top, bottom, left,
+    right) and at the given local (x, y) points
+    """
+    count, labels = cv2.connectedComponents(mask, connectivity=8, ltype=cv2.CV_32S)
+    return {
+        "pixels": np.bincount(labels.ravel(), minlength=count),
+        "zones": [np.bincount(labels[zone > 0], minlength=count) for zone in zones],
+        "border": (labels[0].copy(), labels[-1].copy(), labels[:, 0].copy(), labels[:, -1].copy()),
+        "points": labels[points[:, 1], points[:, 0]],
+    }
+
+def _edge_pairs(a, b, offset_a, offset_b):
+    """
+    Global label pairs joined across a shared tile edge: each pixel of
+    border a touches the three nearest pixels of border b (8-connectivity)
+    """
+    pairs = []
+    for shift in (-1, 0, 1):
+        la = a[max(0, -shift):len(a) - max(0, shift)]
+        lb = b[max(0, shift):len(b) - max(0, -shift)]
+        joined = (la > 0) & (lb > 0)
+        pairs.append(np.stack([la[joined] + offset_a, lb[joined] + offset_b], axis=1))
+    return pairs
+
+def _merge_labels(count, pairs):
+    """
+    Smallest equivalent label of every label, given pairs of joined labels
+    """
+    root = np.arange(count)
+    if not len(pairs):
+        return root
+    a, b = np.unique(pairs, axis=0).T
+    while True:
+        root_a, root_b = root[a], root[b]
+        if np.array_equal(root_a, root_b):
+            return root
+        low = np.minimum(root_a, root_b)
+        np.minimum.at(root, root_a, low)
+        np.minimum.at(root, root_b, low)
+        while True:
+            jumped = root[root]
+            if np.array_equal(jumped, root):
+                break
+            root = jumped
+
+def merge_tile_bodies(tiles, bodies, names=("zone_a", "zone_b", "zone_c")):
+    """
+    Zone shares of the water bodies at the points passed to _zone_tile,
+    joining regions that cross tile edges; matches body_zone_shares on
+    the whole mask
+    """
+    offsets = np.cumsum([0] + [len(body["pixels"]) for body in bodies])
+    index = {(y0, x0): i for i, (y0, y1, x0, x1) in enumerate(tiles)}
+    pairs = []
+    for i, (y0, y1, x0, x1) in enumerate(tiles):
+        top, bottom, left, right = bodies[i]["border"]
+        below, beside, diagonal = index.get((y1, x0)), index.get((y0, x1)), index.get((y1, x1))
+        if beside is not None:
+            pairs += _edge_pairs(right, bodies[beside]["border"][2], offsets[i], offsets[beside])
+        if below is not None:
+            pairs += _edge_pairs(bottom, bodies[below]["border"][0], offsets[i], offsets[below])
+        if diagonal is not None and bottom[-1] and bodies[diagonal]["border"][0][0]:
+            pairs.append(np.array([[bottom[-1] + offsets[i], bodies[diagonal]["border"][0][0] + offsets[diagonal]]]))
+        if below is not None and beside is not None and bodies[below]["border"][0][-1] and bodies[beside]["border"][1][0]:
+            pairs.append(np.array([[bodies[below]["border"][0][-1] + offsets[below],
+                                    bodies[beside]["border"][1][0] + offsets[beside]]]))
+    root = _merge_labels(offsets[-1], np.concatenate(pairs) if pairs else [])
+
+    pixels = np.bincount(root, weights=np.concatenate([body["pixels"] for body in bodies]),
+                         minlength=len(root))
+    body_roots = root[np.concatenate([body["points"] + offset for body, offset in zip(bodies, offsets)])]
+    shares = {}
+    for z, name in enumerate(names):
+        zone = np.bincount(root, weights=np.concatenate([body["zones"][z] for body in bodies]),
+                           minlength=len(root))
+        shares[name] = zone[body_roots] / np.maximum(pixels[body_roots], 1)
+    return shares
+
+def _run_tiles(fn, pool, *args):
+    """
+    fn over every tile in the analysis pool (pool=None is the shared one),
+    results in tile order
+    """
+    futures = [submit_analysis(fn, *call, pool=pool) for call in zip(*args)]
+    return [future.result() for future in futures]
+
+def analyze_raster_tiled(raster_path, work_dir, tile_size=TILE_SIZE, pool=None):
+    """
+    Tiled analysis of a large .npy raster, matching analyze_frame exactly.
+    Tiles (with halo) run in the shared analysis pool, so concurrent
+    rasters share its CPU budget, and write into disk-backed planes in
+    work_dir. Only road suppression and the contour search for water body
+    typing, which depend on whole connected regions, run in this process
+    over the full uint8 mask. They hold a few uint8 planes of the raster
+    size, the one analysis step whose memory grows with the raster.
+    The inventory's zone membership is counted per tile and joined across
+    tile edges (see merge_tile_bodies).
+    Returns the analyze_frame result with memory-mapped zone planes.
+    """
+    raster = np.load(raster_path, mmap_mode="r")
+    h, w = raster.shape[:2]
+    tiles = list(_tile_grid(h, w, tile_size))
+
+    try:
+        _open_planes(work_dir, ["combined", "filtered", "zone_a", "zone_b", "zone_c"], (h, w), "w+")
+
+        # 1. Per-pixel detection, tile by tile
+        _run_tiles(_detect_tile, pool, [raster_path] * len(tiles), [work_dir] * len(tiles), tiles)
+
+        # 2. Region-level road suppression over the whole mask
+        planes = _open_planes(work_dir, ["combined", "filtered"], (h, w), "r+")
+        combined = np.asarray(planes["combined"])
+        planes["filtered"][:] = suppress_road_false_positives(combined, raster)
+        planes["filtered"].flush()
+        contours, _ = cv2.findContours(np.asarray(planes["filtered"]), cv2.RETR_EXTERNAL,
+                                       cv2.CHAIN_APPROX_SIMPLE)
+        water_body_type = detect_water_body_type(None, raster, contours=contours)
+        del combined, planes
+
+        # 3. Zones, edges and water body labels, tile by tile. Each body
+        # is found by its contour's first point, looked up in its tile
+        starts = np.array([contour[0, 0] for contour in contours], dtype=np.intp).reshape(-1, 2)
+        tile_of = (starts[:, 1] // tile_size) * len(range(0, w, tile_size)) + starts[:, 0] // tile_size
+        order = np.argsort(tile_of, kind="stable")
+        points = np.split(starts[order], np.searchsorted(tile_of[order], np.arange(1, len(tiles))))
+        results = _run_tiles(_zone_tile, pool, [work_dir] * len(tiles), [(h, w)] * len(tiles),
+                             tiles, points)
+
+        counts = np.array([result[0] for result in results]).sum(axis=0)
+        zone_pixels = counts[:3]
+        edge_confidence = min(1.0, float(counts[3] / max(1, counts[4])))
+        zone_share = {name: np.empty(len(order)) for name in ("zone_a", "zone_b", "zone_c")}
+        for name, share in merge_tile_bodies(tiles, [result[1] for result in results]).items():
+            zone_share[name][order] = share
+
+        planes = _open_planes(work_dir, ["filtered", "zone_a", "zone_b", "zone_c"], (h, w), "r")
+        zones = {name: planes[name] for name in ("zone_a", "zone_b", "zone_c")}
+        water_bodies = water_body_inventory(planes["filtered"], zones, contours=contours,
+                                            zone_share=zone_share)
+        analysis = build_analysis(h * w, zone_pixels, water_body_type, edge_confidence,
+                                  zones, planes["filtered"], water_bodies)
+        analysis["tiles"] = len(tiles)
+        return analysis
     except Exception as e:
-        print(f"Error in image inference: {e}")
-        return JSONResponse({"error": str(e)}, status_code=500)
+        print(f"Error in tiled raster analysis: {e}")
+        return empty_analysis((h, w))
+
+def raster_preview(raster, analysis, max_side=RASTER_PREVIEW_SIDE):
+    """
+    Downscaled annotated rendering of a tiled analysis
+    """
+    h, w = raster.shape[:2]
+    scale = min(1.0, max_side / max(h, w))
+    size = (max(1, int(w * scale)), max(1, int(h * scale)))
+    frame = cv2.resize(raster, size, interpolation=cv2.INTER_AREA)
+    zones = {name: cv2.resize(np.asarray(zone), size, interpolation=cv2.INTER_NEAREST)
+             for name, zone in analysis["zones"].items()}
+    return annotate_frame(frame, {**analysis, "zones": zones})
 
 # ==========================
-# VIDEO INFERENCE
+# TORCH BACKEND
+# ==========================
+
+ANALYSIS_BACKENDS = ("opencv", "torch")
+# Frames per tensor stack; each 4K frame needs ~300 MB of float32 planes
+TORCH_BATCH_SIZE = 4
+TORCH_MAX_BATCH_SIZE = 16
+TORCH_THREADS = max(1, os.cpu_count() or 1)
+
+def build_lightness_lut():
+    """
+    LAB L channel for all 2^24 BGR values, matching cv2.COLOR_BGR2LAB
+    """
+    return cv2.cvtColor(all_bgr_colors(), cv2.COLOR_BGR2LAB)[:, :, 0].reshape(-1)
+
+class TorchBackend:
+    """
+    Batched tensor version of the pixel and morphology stages over
+    (N, 3, H, W) frame stacks on the torch device: color rules and lightness come
+    from the same 2^24 LUTs as the OpenCV path, gray uses OpenCV's
+    fixed-point weights, and ellipse morphology works row by row on
+    boolean planes. Road suppression and water body type stay on OpenCV
+    per frame.
+    """
+
+    def __init__(self, device=None):
+        load_torch()
+        self.device = torch.device(device or get_device())
+        if self.device.type == "cpu":
+            torch.set_num_threads(TORCH_THREADS)
+        self.rules_lut = torch.from_numpy(np.asarray(get_color_lut()).astype(np.int16)).to(self.device)
+        self.lightness_lut = torch.from_numpy(build_lightness_lut()).to(self.device)
+        self._ellipses = {}
+
+    # ---- filters ----
+
+    def _filter(self, planes, kx, ky):
+        """
+        Separable filter with BORDER_REFLECT_101 (OpenCV's default) as
+        shifted multiply-adds, which beats conv2d for single-channel taps
+        """
+        kx, ky = np.ravel(kx), np.ravel(ky)
+        px, py = len(kx) // 2, len(ky) // 2
+        h, w = planes.shape[-2:]
+        padded = torch.nn.functional.pad(planes, (px, px, py, py), mode="reflect")
+        rows = None
+        for i, weight in enumerate(kx):
+            if weight != 0:
+                tap = padded[..., i:i + w] * float(weight)
+                rows = tap if rows is None else rows.add_(tap)
+        out = None
+        for i, weight in enumerate(ky):
+            if weight != 0:
+                tap = rows[..., i:i + h, :] * float(weight)
+                out = tap if out is None else out.add_(tap)
+        return out
+
+    def _sobel_magnitude2(self, planes, ksize):
+        grad_x = self._filter(planes, *cv2.getDerivKernels(1, 0, ksize, normalize=False))
+        grad_y = self._filter(planes, *cv2.getDerivKernels(0, 1, ksize, normalize=False))
+        return grad_x.mul_(grad_x).add_(grad_y.mul_(grad_y))
+
+    def _gaussian(self, planes, size):
+        kernel = cv2.getGaussianKernel(size, 0)
+        return self._filter(planes, kernel, kernel).round_()
+
+    def _box(self, planes, size):
+        kernel = np.full(size, 1.0 / size)
+        return self._filter(planes, kernel, kernel).round_()
+
+    # ---- binary morphology on boolean (N, 1, H, W) planes ----
+
+    def _ellipse_rows(self, size):
+        """
+        (row offset, half width) of each row of OpenCV's ellipse kernel
+        """
+        rows = self._ellipses.get(size)
+        if rows is None:
+            kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (size, size))
+            center = size // 2
+            rows = [(y - center, int(np.flatnonzero(row)[-1]) - center)
+                    for y, row in enumerate(kernel) if row.any()]
+            self._ellipses[size] = rows
+        return rows
+
+    def _dilate(self, planes, size):
+        """
+        Ellipse dilation: a horizontal window per distinct row width, read
+        from one running sum, ORed over the kernel's row offsets. Pixels
+        outside the frame count as unset, like OpenCV's dilate border.
+        """
+        rows = self._ellipse_rows(size)
+        reach = size // 2
+        h, w = planes.shape[-2:]
+        sums = planes.to(torch.int32).cumsum(-1)
+        lead = sums.new_zeros(*sums.shape[:-1], reach + 1)
+        sums = torch.cat([lead, sums, sums[..., -1:].expand(*sums.shape[:-1], reach)], -1)
+
+        spans = {}
+        out = torch.zeros_like(planes)
+        for dy, half in rows:
+            span = spans.get(half)
+            if span is None:
+                # Window [x - half, x + half] as a difference of running sums
+                span = (sums[..., reach + half + 1:reach + half + 1 + w]
+                        - sums[..., reach - half:reach - half + w]) > 0
+                span = spans[half] = torch.nn.functional.pad(span, (0, 0, reach, reach))
+            out |= span[..., reach + dy:reach + dy + h, :]
+        return out
+
+    def _erode(self, planes, size):
+        # Outside pixels count as set, like OpenCV's erode border
+        return ~self._dilate(~planes, size)
+
+    def _close(self, planes, size):
+        return self._erode(self._dilate(planes, size), size)
+
+    def _open(self, planes, size):
+        return self._dilate(self._erode(planes, size), size)
+
+    # ---- stages ----
+
+    def _rule(self, rules, bits):
+        return (rules & bits) != 0
+
+    def detect(self, frames, scale=1.0):
+        """
+        Combined water masks (N, H, W) uint8 0/255 for (N, H, W, 3) BGR
+        uint8 frames on the device, matching detect_water_mask
+        """
+        frames = frames.to(torch.int32)
+        b, g, r = frames[..., 0], frames[..., 1], frames[..., 2]
+        index = b | (g << 8) | (r << 16)
+        rules = self.rules_lut[index]
+        gray = ((r * 9798 + g * 19235 + b * 3735 + 16384) >> 15).unsqueeze(1).float()
+        lightness = self.lightness_lut[index].unsqueeze(1).float()
+        del frames, b, g, r, index
+
+        # Vegetation-aware water
+        low_texture = self._sobel_magnitude2(gray, 3) < 15 * 15
+        mean_l = self._box(lightness, scaled_kernel(15, scale))
+        low_variance = (lightness - mean_l).abs_() < 20
+        luminance = self._rule(rules, LUMINANCE_BIT).unsqueeze(1) & low_variance
+        vegetation = self._rule(rules, VEGETATION_BITS).unsqueeze(1) | (low_texture & luminance)
+        size = scaled_kernel(5, scale)
+        vegetation = self._open(self._close(vegetation, size), size)
+        del low_texture, mean_l, low_variance, luminance, lightness
+
+        # Mixed water-vegetation signatures
+        smooth = self._sobel_magnitude2(self._gaussian(gray, scaled_kernel(9, scale)), 5) < 25 * 25
+        mixed = self._rule(rules, MIXED_BITS).unsqueeze(1) & smooth
+        mixed = self._close(self._open(mixed, 3), 3)
+        del smooth, gray
+
+        combined = self._rule(rules, HSV_WATER_BITS).unsqueeze(1) | vegetation | mixed
+        return combined.squeeze(1).to(torch.uint8) * 255
+
+    def zones(self, masks, scale=1.0):
+        """
+        Zone A/B/C planes (N, H, W) uint8 for filtered masks, matching
+        classify_water_zones including its uint8 wrap-around in zone C
+        """
+        core_size = scaled_kernel(15, scale)
+        planes = (masks > 0).unsqueeze(1)
+        core = self._open(self._close(planes, core_size), core_size)
+        buffer = self._dilate(core, scaled_kernel(25, scale))
+        zone_a = core.squeeze(1).to(torch.uint8) * 255
+        zone_b = buffer.squeeze(1).to(torch.uint8) * 255 - zone_a
+        zone_c = masks - zone_a
+        return zone_a, zone_b, zone_c
+
+    def analyze_batch(self, frames, scale=1.0):
+        """
+        Full analyses for a list of equally sized BGR frames
+        """
+        with torch.no_grad():
+            return self._analyze_batch(frames, scale)
+
+    def _analyze_batch(self, frames, scale):
+        stack = torch.from_numpy(np.stack(frames)).to(self.device)
+        combined = self.detect(stack, scale).cpu().numpy()
+        del stack
+
+        filtered = [suppress_road_false_positives(mask, frame, scale)
+                    for mask, frame in zip(combined, frames)]
+        planes = self.zones(torch.from_numpy(np.stack(filtered)).to(self.device), scale)
+        counts = [plane.flatten(1).count_nonzero(1).tolist() for plane in planes]
+        zone_a, zone_b, zone_c = (plane.cpu().numpy() for plane in planes)
+
+        h, w = frames[0].shape[:2]
+        analyses = []
+        for i, (mask, frame) in enumerate(zip(filtered, frames)):
+            zones = {"zone_a": zone_a[i], "zone_b": zone_b[i], "zone_c": zone_c[i]}
+            water_body_type, water_bodies = describe_water_bodies(mask, frame, zones, scale)
+            analyses.append(build_analysis(
+                h * w, [counts[0][i], counts[1][i], counts[2][i]],
+                water_body_type, mask_edge_confidence(mask), zones, mask, water_bodies))
+        return analyses
+
+_torch_backend = None
+_torch_backend_lock = threading.Lock()
+
+def torch_batch_size(batch_size):
+    """
+    Frames per torch micro-batch: stacking only pays off on CUDA, on the
+    CPU time per frame grows with the batch, so there it is always 1
+    """
+    return max(1, batch_size) if get_device() == "cuda" else 1
+
+def get_torch_backend():
+    global _torch_backend
+    with _torch_backend_lock:
+        if _torch_backend is None:
+            _torch_backend = TorchBackend()
+        return _torch_backend
+
+def analyze_frames(frames, preset="full", backend="opencv", batch_size=TORCH_BATCH_SIZE):
+    """
+    Analyze a list of frames with the chosen backend. The torch backend
+    stacks equally sized working frames into micro-batches of batch_size
+    (of one frame on the CPU, see torch_batch_size).
+    """
+    if backend != "torch":
+        return [analyze_frame(frame, preset) for frame in frames]
+
+    analyses = [None] * len(frames)
+    groups = {}
+    for i, frame in enumerate(frames):
+        h, w = frame.shape[:2]
+        scale = preset_scale(frame.shape, preset)
+        working = frame
+        if scale < 1.0:
+            size = (max(1, round(w * scale)), max(1, round(h * scale)))
+            working = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        groups.setdefault((working.shape, scale), []).append((i, working, scale))
+
+    engine = get_torch_backend()
+    batch_size = torch_batch_size(batch_size)
+    for items in groups.values():
+        for start in range(0, len(items), batch_size):
+            chunk = items[start:start + batch_size]
+            try:
+                results = engine.analyze_batch([working for _, working, _ in chunk], chunk[0][2])
+            except Exception as e:
+                print(f"Error in torch batch analysis: {e}")
+                results = [empty_analysis(working.shape) for _, working, _ in chunk]
+            for (i, working, _), analysis in zip(chunk, results):
+                h, w = frames[i].shape[:2]
+                if working.shape[:2] != (h, w):
+                    analysis["zones"] = {name: cv2.resize(zone, (w, h), interpolation=cv2.INTER_NEAREST)
+                                         for name, zone in analysis["zones"].items()}
+                    analysis["mask"] = cv2.resize(analysis["mask"], (w, h),
+                                                  interpolation=cv2.INTER_NEAREST)
+                analyses[i] = analysis
+    return analyses
+
 # ==========================
+# ANALYSIS WORKER POOL
+# ==========================
+
+# Server worker processes on this machine (uvicorn and gunicorn read
+# WEB_CONCURRENCY as their default worker count); each gets a share of the CPUs
+SERVER_WORKERS = max(1, int(os.environ.get("WEB_CONCURRENCY", "1") or 1))
+ANALYSIS_WORKERS = max(1, (os.cpu_count() or 1) // SERVER_WORKERS)
+
+_analysis_pool = None
+_analysis_pool_lock = threading.Lock()
+
+def get_analysis_pool():
+    """
+    Process pool for CPU-heavy analysis, so it never runs on the event loop.
+    Uses spawn so workers never inherit server threads or locks.
+    """
+    global _analysis_pool
+    with _analysis_pool_lock:
+        if _analysis_pool is None:
+            _analysis_pool = ProcessPoolExecutor(max_workers=ANALYSIS_WORKERS,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+        return _analysis_pool
+
+def _warm_worker():
+    get_color_lut()
+    return os.getpid()
+
+def warm_analysis_pool():
+    pool = get_analysis_pool()
+    for future in [pool.submit(_warm_worker) for _ in range(ANALYSIS_WORKERS)]:
+        future.result()
 
-@app.post("/api/infer/video")
-async def infer_video(file: UploadFile = File(...)):
+def _timed_call(fn, args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+def submit_analysis(fn, *args, pool=None):
+    """
+    Submit fn(*args) to the analysis pool, accounting its queue wait and
+    worker busy time in the metrics. Returns a future for fn's result.
+    """
+    metrics = get_metrics()
+    submitted = time.perf_counter()
+    result = Future()
+
+    def done(future):
+        busy = 0.0
+        try:
+            value, busy = future.result()
+            result.set_result(value)
+        except Exception as e:
+            result.set_exception(e)
+        finally:
+            metrics.pool_finished(busy, max(0.0, time.perf_counter() - submitted - busy))
+
+    task = (pool or get_analysis_pool()).submit(_timed_call, fn, args)
+    metrics.pool_submitted()
+    task.add_done_callback(done)
+    return result
+
+def shutdown_analysis_pool():
+    global _analysis_pool
+    with _analysis_pool_lock:
+        if _analysis_pool is not None:
+            _analysis_pool.shutdown(wait=False, cancel_futures=True)
+            _analysis_pool = None
+
+def _analyze_shared_frame(frame_name, shape, output_name, preset="full", source_scale=1.0,
+                          zone_options=None, render=True):
+    """
+    Worker: analyze and annotate a frame held in shared memory, writing the
+    annotated frame into the output block (unless render is False).
+    Returns the JSON-safe summary.
+    """
+    with attach_shared(frame_name, shape) as frame, attach_shared(output_name, shape) as output:
+        timings = {}
+        analysis = analyze_frame(frame, preset, source_scale, timings, zone_options)
+        if render:
+            started = time.perf_counter()
+            annotate_frame(frame, analysis, timings, out=output)
+            _lap(timings, "render", started)
+        del frame, output
+
+    return {
+        "risk_level": analysis["risk_level"],
+        "water_coverage": analysis["water_coverage"],
+        "explainability": analysis["explainability"],
+        "water_bodies": analysis["water_bodies"],
+        "timings": timings
+    }
+
+@contextlib.contextmanager
+def attach_shared(name, shape):
+    """
+    Worker side of SharedFrameTask: a uint8 array over the named block.
+    Every view of it must be dropped before the with block ends.
+    """
+    shm = shared_memory.SharedMemory(name=name)
     try:
-        video_path = UPLOAD_DIR / file.filename
-        with open(video_path, "wb") as f:
-            f.write(await file.read())
+        yield np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+    finally:
+        shm.close()
 
-        cap = cv2.VideoCapture(str(video_path))
-        if not cap.isOpened():
-            return JSONResponse({"error": "Invalid video format"}, status_code=400)
-            
-        fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-        out_path = OUTPUT_DIR / f"out_{int(time.time())}.mp4"
+class SharedFrameTask:
+    """
+    A frame copied once into shared memory plus, unless output is False,
+    an output block of the same size, so pool workers never pickle pixel
+    data. close() frees both blocks.
+    """
 
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        w = int(cap.get(3))
-        h = int(cap.get(4))
+    def __init__(self, frame, output=True):
+        frame = np.ascontiguousarray(frame)
+        self.shape = frame.shape
+        self.frame_shm = shared_memory.SharedMemory(create=True, size=max(1, frame.nbytes))
+        self.output_shm = None
+        try:
+            if output:
+                self.output_shm = shared_memory.SharedMemory(create=True, size=max(1, frame.nbytes))
+            np.ndarray(self.shape, dtype=np.uint8, buffer=self.frame_shm.buf)[:] = frame
+        except BaseException:
+            self.close()
+            raise
 
-        out = cv2.VideoWriter(str(out_path), fourcc, fps, (w, h))
+    def submit(self, pool, preset="full", source_scale=1.0, zone_options=None, render=True):
+        return self.submit_call(_analyze_shared_frame, self.output_shm.name, preset,
+                                source_scale, zone_options, render, pool=pool)
 
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
+    def submit_call(self, fn, *args, pool=None):
+        """
+        Submit fn(frame block name, shape, *args) to the analysis pool
+        """
+        return submit_analysis(fn, self.frame_shm.name, self.shape, *args, pool=pool)
 
-            analysis = analyze_frame(frame)
-            annotated = annotate_frame(frame, analysis)
-            out.write(annotated)
+    def output(self):
+        return np.ndarray(self.shape, dtype=np.uint8, buffer=self.output_shm.buf).copy()
 
-        cap.release()
-        out.release()
+    def close(self):
+        for shm in (self.frame_shm, self.output_shm):
+            if shm is not None:
+                shm.close()
+                shm.unlink()
 
-        return JSONResponse({
-            "status": "done",
-            "output_video": out_path.name
-        })
-    except Exception as e:
-        print(f"Error in video inference: {e}")
-        return JSONResponse({"error": str(e)}, status_code=500)
+def analyze_in_pool(frame):
+    """
+    Blocking: analyze and annotate a frame in the process pool.
+    Returns (summary, annotated frame).
+    """
+    task = SharedFrameTask(frame)
+    try:
+        summary = task.submit(get_analysis_pool()).result()
+        return summary, task.output()
+    finally:
+        task.close()
+
+async def analyze_in_pool_async(frame, preset="full", source_scale=1.0, zone_options=None,
+                                render=True):
+    """
+    Awaitable analyze_in_pool that keeps the event loop free. Without
+    render the annotated frame is skipped and comes back as None.
+    """
+    task = SharedFrameTask(frame)
+    try:
+        future = task.submit(get_analysis_pool(), preset, source_scale, zone_options, render)
+        summary = await asyncio.wrap_future(future)
+        return summary, task.output() if render else None
+    finally:
+        task.close()
+
+def process_video_frame_in_pool(frame):
+    return analyze_in_pool(frame)[1]
 
 # ==========================
-# SERVE FRONTEND FILES
+# UPLOADS
 # ==========================
 
-# Serve frontend files (AFTER API routes to avoid conflicts)
-app.mount("/", StaticFiles(directory=STATIC_DIR, html=True), name="static")
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_IMAGE_UPLOAD_BYTES = 64 * 1024 * 1024
+MAX_VIDEO_UPLOAD_BYTES = 2 * 1024 * 1024 * 1024
+MAX_BATCH_UPLOAD_BYTES = 1024 * 1024 * 1024
+MAX_RASTER_UPLOAD_BYTES = 4 * 1024 * 1024 * 1024
+# Allowance for multipart boundaries and headers around the file part
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+UPLOAD_LIMITS = {
+    "/api/infer/image": MAX_IMAGE_UPLOAD_BYTES,
+    "/api/infer/mask": MAX_IMAGE_UPLOAD_BYTES,
+    "/api/infer/video": MAX_VIDEO_UPLOAD_BYTES,
+    "/api/jobs/video": MAX_VIDEO_UPLOAD_BYTES,
+    "/api/infer/raster": MAX_RASTER_UPLOAD_BYTES,
+    "/api/infer/batch": MAX_BATCH_UPLOAD_BYTES,
+}
+
+class UploadTooLarge(Exception):
+    pass
+
+def _upload_too_large_response(limit):
+    return JSONResponse({"error": f"Upload exceeds the {limit // (1024 * 1024)} MB limit"},
+                        status_code=413)
+
+async def reject_oversized_uploads(request, call_next):
+    # Refuse declared oversize bodies before any of them is read
+    limit = UPLOAD_LIMITS.get(request.url.path)
+    length = request.headers.get("content-length", "")
+    if limit is not None and length.isdigit() and int(length) > limit + MULTIPART_OVERHEAD_BYTES:
+        return _upload_too_large_response(limit)
+    return await call_next(request)
+
+def _upload_suffix(filename):
+    suffix = Path(filename or "").suffix.lower()
+    return suffix if suffix[1:].isalnum() and len(suffix) <= 10 else ""
+
+async def save_upload(file, dest_dir, max_bytes, name=None, digest=None):
+    """
+    Stream an upload to dest_dir in fixed-size chunks under a unique name.
+    Raises UploadTooLarge (and removes the partial file) past max_bytes.
+    If given, digest (a hashlib object) is fed every chunk on the way.
+    """
+    dest_dir = Path(dest_dir)
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    path = dest_dir / f"{name or uuid.uuid4().hex}{_upload_suffix(file.filename)}"
+    size = 0
+    try:
+        with open(path, "wb") as f:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(max_bytes)
+                if digest is not None:
+                    digest.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+    return path
+
+# ==========================
+# ARTIFACT STORE
+# ==========================
+
+# Encoding for rendered images: "jpeg" (fastest), "webp" (smallest) or
+# "png" (lossless, roughly 10x slower than jpeg on 4K frames)
+ARTIFACT_FORMAT = "jpeg"
+ARTIFACT_QUALITY = 90
+# 0-9; higher levels shrink files a little at a steep cost in time
+ARTIFACT_PNG_COMPRESSION = 1
+# Retention for everything written to OUTPUT_DIR
+ARTIFACT_MAX_AGE_SECONDS = 7 * 24 * 3600
+ARTIFACT_MAX_BYTES = 4 * 1024 * 1024 * 1024
+ARTIFACT_SWEEP_INTERVAL = 600
+
+ARTIFACT_ENCODINGS = {
+    "png": (".png", cv2.IMWRITE_PNG_COMPRESSION),
+    "jpeg": (".jpg", cv2.IMWRITE_JPEG_QUALITY),
+    "webp": (".webp", cv2.IMWRITE_WEBP_QUALITY),
+}
+
+def artifact_suffix(fmt=None):
+    return ARTIFACT_ENCODINGS[fmt or ARTIFACT_FORMAT][0]
+
+def new_artifact_path(prefix, suffix, directory=OUTPUT_DIR):
+    """
+    Collision-free path for a new output file
+    """
+    return Path(directory) / f"{prefix}_{uuid.uuid4().hex}{suffix}"
+
+def encode_image(image, fmt=None):
+    """
+    Image encoded in fmt (the configured format by default), as a uint8 array
+    """
+    fmt = fmt or ARTIFACT_FORMAT
+    suffix, param = ARTIFACT_ENCODINGS[fmt]
+    level = ARTIFACT_PNG_COMPRESSION if fmt == "png" else ARTIFACT_QUALITY
+    ok, encoded = cv2.imencode(suffix, image, [param, level])
+    if not ok:
+        raise RuntimeError(f"Failed to encode {fmt} image")
+    return encoded
+
+def write_image_artifact(image, path, fmt=None):
+    """
+    Encode image in the configured format and move it into place
+    atomically, so readers never see a partial file
+    """
+    encoded = encode_image(image, fmt)
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        encoded.tofile(str(tmp_path))
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return path
+
+def sweep_artifacts(directory=OUTPUT_DIR, max_age=ARTIFACT_MAX_AGE_SECONDS,
+                    max_bytes=ARTIFACT_MAX_BYTES):
+    """
+    Delete files older than max_age, then the oldest files until the
+    directory holds at most max_bytes. Returns the number removed.
+    """
+    now = time.time()
+    files = []
+    for path in Path(directory).iterdir():
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        # Skip placeholders and in-flight temporary files
+        if path.is_file() and not path.name.startswith("."):
+            files.append((stat.st_mtime, stat.st_size, path))
+    files.sort()
+
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    for mtime, size, path in files:
+        if now - mtime <= max_age and total <= max_bytes:
+            break
+        try:
+            path.unlink()
+            total -= size
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+_artifact_sweeper_stop = threading.Event()
+
+def _artifact_sweeper():
+    while not _artifact_sweeper_stop.is_set():
+        try:
+            removed = sweep_artifacts()
+            if removed:
+                print(f"[INFO] Removed {removed} expired output files")
+        except Exception as e:
+            print(f"Error in artifact sweep: {e}")
+        _artifact_sweeper_stop.wait(ARTIFACT_SWEEP_INTERVAL)
+
+def start_artifact_sweeper():
+    _artifact_sweeper_stop.clear()
+    threading.Thread(target=_artifact_sweeper, name="artifact-sweeper", daemon=True).start()
+
+def stop_artifact_sweeper():
+    _artifact_sweeper_stop.set()
+
+# ==========================
+# RESULT CACHE
+# ==========================
+
+# Bump whenever detection, zoning or annotation output changes, so stale
+# cached results are never served
+ANALYSIS_VERSION = 2
+RESULT_CACHE_DIR = OUTPUT_DIR / "cached"
+RESULT_CACHE_ENTRIES = 1024
+RESULT_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
+def result_hasher(preset=DEFAULT_PRESET, backend="opencv", zone_options=None):
+    """
+    Content hash for an uploaded image, seeded with the analysis version,
+    preset, backend and zone options
+    """
+    seed = f"analysis-v{ANALYSIS_VERSION}-{preset}-{backend}"
+    if zone_options is not None:
+        seed += "-" + json.dumps(zone_options, sort_keys=True)
+    return hashlib.blake2b(seed.encode(), digest_size=20)
+
+class ResultCache:
+    """
+    Content-addressed analysis results: an in-memory LRU of summaries in
+    front of a size-bounded directory of rendered outputs (<key>.<format>)
+    with their summaries (<key>.json). Least recently used files go first.
+    """
+
+    def __init__(self, directory, max_entries, max_bytes):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.memory = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_bytes = sum(p.stat().st_size for p in self.directory.iterdir() if p.is_file())
+
+    def _paths(self, key):
+        return (self.directory / f"{key}{artifact_suffix()}",
+                self.directory / f"{key}.json")
+
+    def get(self, key):
+        """
+        Cached summary (with "output_image") for key, or None
+        """
+        image_path, summary_path = self._paths(key)
+        with self.lock:
+            summary = self.memory.get(key)
+            if summary is not None and image_path.exists():
+                self.memory.move_to_end(key)
+                self.hits += 1
+                self._touch(image_path, summary_path)
+                return summary
+            try:
+                summary = json.loads(summary_path.read_text())
+            except (OSError, ValueError):
+                self.memory.pop(key, None)
+                self.misses += 1
+                return None
+            if not image_path.exists():
+                self.misses += 1
+                return None
+            self._remember(key, summary)
+            self.hits += 1
+            self._touch(image_path, summary_path)
+            return summary
+
+    def put(self, key, summary, output):
+        """
+        Store a summary and its rendered output; returns the cached summary
+        """
+        image_path, summary_path = self._paths(key)
+        summary = {**summary, "output_image": f"{self.directory.name}/{image_path.name}"}
+        write_image_artifact(output, image_path)
+        summary_path.write_text(json.dumps(summary))
+
+        with self.lock:
+            self.disk_bytes += image_path.stat().st_size + summary_path.stat().st_size
+            self._remember(key, summary)
+            self._evict()
+        return summary
+
+    def _touch(self, *paths):
+        for path in paths:
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+
+    def _remember(self, key, summary):
+        self.memory[key] = summary
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def _evict(self):
+        if self.disk_bytes <= self.max_bytes:
+            return
+        summaries = sorted(self.directory.glob("*.json"), key=lambda p: p.stat().st_mtime)
+        for summary_path in summaries:
+            if self.disk_bytes <= self.max_bytes:
+                break
+            key = summary_path.stem
+            for path in self.directory.glob(f"{key}.*"):
+                try:
+                    size = path.stat().st_size
+                    path.unlink()
+                    self.disk_bytes -= size
+                except OSError:
+                    pass
+            self.memory.pop(key, None)
+            self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "memory_entries": len(self.memory),
+                "disk_bytes": self.disk_bytes,
+                "max_bytes": self.max_bytes
+            }
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+def get_result_cache():
+    global _result_cache
+    with _result_cache_lock:
+        if _result_cache is None:
+            _result_cache = ResultCache(RESULT_CACHE_DIR, RESULT_CACHE_ENTRIES,
+                                        RESULT_CACHE_MAX_BYTES)
+        return _result_cache
+
+async def analyze_cached(key, image_path, preset=DEFAULT_PRESET, zone_options=None):
+    """
+    Summary for the image file with content hash key, decoding and
+    analyzing it in the pool only on a cache miss. None if undecodable.
+    The summary carries this request's per-stage timings.
+    """
+    timings = {}
+    started = time.perf_counter()
+    cache = get_result_cache()
+    summary = cache.get(key)
+    if summary is not None:
+        _lap(timings, "cache", started)
+        return {**summary, "timings": timings}
+
+    frame, source_scale = await asyncio.to_thread(read_image, image_path, preset)
+    started = _lap(timings, "decode", started)
+    if frame is None:
+        return None
+    summary, output = await analyze_in_pool_async(frame, preset, source_scale, zone_options)
+    timings.update(summary.pop("timings"))
+
+    started = time.perf_counter()
+    summary = await asyncio.to_thread(cache.put, key, summary, output)
+    _lap(timings, "encode", started)
+    return {**summary, "timings": timings}
+
+@router.get("/api/cache")
+def cache_stats():
+    return get_result_cache().stats()
+
+# ==========================
+# IMAGE INFERENCE
+# ==========================
+
+# Reduced decode flags, largest reduction first
+REDUCED_DECODES = [
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+]
+
+def image_size(path):
+    """
+    (width, height) from the file header, or None if unknown
+    """
+    if Image is None:
+        return None
+    try:
+        with Image.open(path) as image:
+            return image.size
+    except Exception:
+        return None
+
+def read_image(path, preset="full"):
+    """
+    Decode an image, letting the decoder downscale (JPEG does it in the
+    DCT domain) when the preset never needs more than half the source
+    resolution. Returns (frame, scale relative to the source).
+    """
+    budget = ANALYSIS_PRESETS[preset]
+    size = image_size(path) if budget is not None else None
+    if size is not None:
+        for factor, flag in REDUCED_DECODES:
+            if size[0] * size[1] >= budget * factor * factor:
+                return cv2.imread(str(path), flag), 1.0 / factor
+    return cv2.imread(str(path), cv2.IMREAD_COLOR), 1.0
+
+def source_size(path, frame, source_scale):
+    """
+    (width, height) of the image a frame was decoded from by read_image
+    """
+    if source_scale != 1.0:
+        size = image_size(path)
+        if size is not None:
+            return tuple(size)
+    return frame.shape[1], frame.shape[0]
+
+def _unknown_preset_response():
+    return JSONResponse({"error": f"preset must be one of {', '.join(ANALYSIS_PRESETS)}"},
+                        status_code=400)
+
+def _request_zone_options(engine, units, core_width, buffer_width, meters_per_pixel):
+    """
+    Zone options from query parameters; None for the default zones, so
+    their results and cache keys stay as they were. Raises ValueError.
+    """
+    if engine == "morphology" and core_width is None and buffer_width is None:
+        return None
+    return parse_zone_options(engine, core_width, buffer_width, units, meters_per_pixel)
+
+def _unknown_backend_response():
+    return JSONResponse({"error": f"backend must be one of {', '.join(ANALYSIS_BACKENDS)}"},
+                        status_code=400)
+
+@router.post("/api/infer/image")
+async def infer_image(file: UploadFile = File(...), preset: str = DEFAULT_PRESET,
+                      profile: bool = False, zone_engine: str = "morphology",
+                      zone_units: str = "px", core_width: Optional[float] = None,
+                      buffer_width: Optional[float] = None,
+                      meters_per_pixel: Optional[float] = None):
+    if preset not in ANALYSIS_PRESETS:
+        return _unknown_preset_response()
+    try:
+        zone_options = _request_zone_options(zone_engine, zone_units, core_width,
+                                             buffer_width, meters_per_pixel)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    image_path = None
+    try:
+        started = time.perf_counter()
+        digest = result_hasher(preset, zone_options=zone_options)
+        image_path = await save_upload(file, UPLOAD_DIR, MAX_IMAGE_UPLOAD_BYTES, digest=digest)
+        timings = {}
+        _lap(timings, "upload", started)
+        analysis = await analyze_cached(digest.hexdigest(), image_path, preset, zone_options)
+
+        if analysis is None:
+            return JSONResponse({"error": "Invalid image format"}, status_code=400)
+
+        # Create JSON-safe response by excluding the mask
+        response_data = {
+            "risk": analysis["risk_level"],
+            "water_coverage": analysis["water_coverage"],
+            "details": analysis["explainability"],
+            "water_bodies": analysis["water_bodies"],
+            "output_image": analysis["output_image"],
+            "preset": preset,
+            "zone_options": zone_options,
+            "timings_ms": report_timings({**timings, **analysis["timings"]}, profile)
+        }
+
+        return JSONResponse(response_data)
+    except UploadTooLarge:
+        return _upload_too_large_response(MAX_IMAGE_UPLOAD_BYTES)
+    except Exception as e:
+        print(f"Error in image inference: {e}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+    finally:
+        if image_path is not None:
+            image_path.unlink(missing_ok=True)
+
+# ==========================
+# MASK INFERENCE
+# ==========================
+
+MASK_ENCODINGS = ("rle", "packbits", "geojson")
+# Polygon simplification tolerance in pixels
+POLYGON_EPSILON = 1.5
+
+def encode_mask_rle(mask):
+    """
+    Row-major run lengths, alternating background/water and always
+    starting with a (possibly empty) background run
+    """
+    flat = mask.ravel() > 0
+    if flat.size == 0:
+        return {"size": list(mask.shape[:2]), "counts": []}
+    edges = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    counts = np.diff(np.concatenate(([0], edges, [flat.size])))
+    if flat[0]:
+        counts = np.concatenate(([0], counts))
+    return {"size": list(mask.shape[:2]), "counts": counts.tolist()}
+
+def encode_mask_packbits(mask):
+    """
+    Row-major bitmap, most significant bit first, deflated and base64 encoded
+    """
+    bits = zlib.compress(np.packbits(mask.ravel() > 0).tobytes(), 1)
+    return {"size": list(mask.shape[:2]), "compression": "deflate",
+            "bits": base64.b64encode(bits).decode("ascii")}
+
+def mask_polygons(mask, epsilon=POLYGON_EPSILON, scale=(1.0, 1.0)):
+    """
+    Simplified polygons (outer ring plus holes) in pixel coordinates,
+    mapped to a grid scale (x, y) times finer than the mask's
+    """
+    contours, hierarchy = cv2.findContours(mask, cv2.RETR_CCOMP, cv2.CHAIN_APPROX_SIMPLE)
+    if hierarchy is None:
+        return []
+    scale = np.asarray(scale, dtype=np.float64)
+    rescale = bool((scale != 1.0).any())
+    epsilon = epsilon / scale.max()
+
+    def ring(contour):
+        points = cv2.approxPolyDP(contour, epsilon, True).reshape(-1, 2)
+        if len(points) < 3:
+            return None
+        if rescale:
+            # Pixel centres map to the centres of the source pixels they cover
+            points = np.rint((points + 0.5) * scale - 0.5).astype(np.int64)
+        points = points.tolist()
+        return points + [points[0]]
+
+    polygons = []
+    for i, (_, _, child, parent) in enumerate(hierarchy[0]):
+        if parent != -1:
+            continue
+        outer = ring(contours[i])
+        if outer is None:
+            continue
+        rings = [outer]
+        while child != -1:
+            hole = ring(contours[child])
+            if hole is not None:
+                rings.append(hole)
+            child = hierarchy[0][child][0]
+        polygons.append(rings)
+    return polygons
+
+def encode_zones_geojson(zones, epsilon=POLYGON_EPSILON, scale=(1.0, 1.0)):
+    """
+    One MultiPolygon feature per zone; coordinates are [x, y] pixels
+    with y pointing down, on a grid scale (x, y) times finer than the masks
+    """
+    area = scale[0] * scale[1]
+    return {
+        "type": "FeatureCollection",
+        "features": [{
+            "type": "Feature",
+            "properties": {"zone": name, "pixels": int(round(cv2.countNonZero(zone) * area))},
+            "geometry": {"type": "MultiPolygon", "coordinates": mask_polygons(zone, epsilon, scale)}
+        } for name, zone in zones.items()]
+    }
+
+def encode_zones(zones, encoding, epsilon=POLYGON_EPSILON, source_size=None):
+    """
+    Encoded zone masks at the source (width, height) of a reduced decode:
+    bitmaps are upsampled to it, polygons rescaled
+    """
+    if source_size is not None and zones:
+        h, w = next(iter(zones.values())).shape[:2]
+        if tuple(source_size) == (w, h):
+            source_size = None
+    if encoding == "geojson":
+        scale = (1.0, 1.0) if source_size is None else (source_size[0] / w, source_size[1] / h)
+        return encode_zones_geojson(zones, epsilon, scale)
+    if source_size is not None:
+        zones = {name: cv2.resize(zone, tuple(source_size), interpolation=cv2.INTER_NEAREST)
+                 for name, zone in zones.items()}
+    encode = encode_mask_rle if encoding == "rle" else encode_mask_packbits
+    return {name: encode(zone) for name, zone in zones.items()}
+
+def _analyze_shared_masks(frame_name, shape, encoding, epsilon, preset="full", source_scale=1.0,
+                          zone_options=None, size=None):
+    """
+    Worker: analyze a frame held in shared memory without rendering it.
+    Returns the JSON-safe summary with zone masks encoded at the source
+    (width, height) size.
+    """
+    with attach_shared(frame_name, shape) as frame:
+        timings = {}
+        analysis = analyze_frame(frame, preset, source_scale, timings, zone_options)
+        del frame
+
+    started = time.perf_counter()
+    masks = encode_zones(analysis["zones"], encoding, epsilon, size)
+    _lap(timings, "encode", started)
+    return {
+        "risk_level": analysis["risk_level"],
+        "water_coverage": analysis["water_coverage"],
+        "explainability": analysis["explainability"],
+        "water_bodies": analysis["water_bodies"],
+        "masks": masks,
+        "timings": timings
+    }
+
+@router.post("/api/infer/mask")
+async def infer_mask(file: UploadFile = File(...), encoding: str = "packbits",
+                     epsilon: float = POLYGON_EPSILON, preset: str = DEFAULT_PRESET,
+                     profile: bool = False, zone_engine: str = "morphology",
+                     zone_units: str = "px", core_width: Optional[float] = None,
+                     buffer_width: Optional[float] = None,
+                     meters_per_pixel: Optional[float] = None):
+    if encoding not in MASK_ENCODINGS:
+        return JSONResponse({"error": f"encoding must be one of {', '.join(MASK_ENCODINGS)}"},
+                            status_code=400)
+    if preset not in ANALYSIS_PRESETS:
+        return _unknown_preset_response()
+    try:
+        zone_options = _request_zone_options(zone_engine, zone_units, core_width,
+                                             buffer_width, meters_per_pixel)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    image_path = None
+    task = None
+    try:
+        started = time.perf_counter()
+        image_path = await save_upload(file, UPLOAD_DIR, MAX_IMAGE_UPLOAD_BYTES)
+        timings = {}
+        started = _lap(timings, "upload", started)
+        frame, source_scale = await asyncio.to_thread(read_image, image_path, preset)
+        _lap(timings, "decode", started)
+
+        if frame is None:
+            return JSONResponse({"error": "Invalid image format"}, status_code=400)
+
+        size = source_size(image_path, frame, source_scale)
+        task = SharedFrameTask(frame, output=False)
+        analysis = await asyncio.wrap_future(task.submit_call(
+            _analyze_shared_masks, encoding, max(0.0, epsilon), preset, source_scale,
+            zone_options, size))
+        timings.update(analysis["timings"])
+
+        return JSONResponse({
+            "risk": analysis["risk_level"],
+            "water_coverage": analysis["water_coverage"],
+            "details": analysis["explainability"],
+            "water_bodies": analysis["water_bodies"],
+            "size": [size[1], size[0]],
+            "encoding": encoding,
+            "masks": analysis["masks"],
+            "preset": preset,
+            "zone_options": zone_options,
+            "timings_ms": report_timings(timings, profile)
+        })
+    except UploadTooLarge:
+        return _upload_too_large_response(MAX_IMAGE_UPLOAD_BYTES)
+    except Exception as e:
+        print(f"Error in mask inference: {e}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+    finally:
+        if task is not None:
+            task.close()
+        if image_path is not None:
+            image_path.unlink(missing_ok=True)
+
+# ==========================
+# BATCH INFERENCE
+# ==========================
+
+MAX_BATCH_IMAGES = 1000
+BATCH_IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp"}
+# Bytes extracted from all zip archives of one batch, and the largest
+# uncompressed/compressed ratio accepted for a member (images barely deflate)
+MAX_BATCH_EXTRACTED_BYTES = 2 * MAX_BATCH_UPLOAD_BYTES
+MAX_ZIP_RATIO = 100
+
+def _extract_zip_images(zip_path, dest_dir, limit, preset=DEFAULT_PRESET, backend="opencv",
+                        max_bytes=MAX_BATCH_EXTRACTED_BYTES):
+    """
+    Extract image members of a zip archive under unique names.
+    Returns [(original name, path, content key)], at most limit entries.
+    Members past MAX_ZIP_RATIO are skipped; raises UploadTooLarge once
+    more than max_bytes would be extracted.
+    """
+    images = []
+    extracted = 0
+    with zipfile.ZipFile(zip_path) as archive:
+        for info in archive.infolist():
+            if len(images) >= limit:
+                break
+            suffix = Path(info.filename).suffix.lower()
+            if info.is_dir() or suffix not in BATCH_IMAGE_EXTENSIONS:
+                continue
+            if info.file_size > MAX_IMAGE_UPLOAD_BYTES:
+                continue
+            if info.file_size > MAX_ZIP_RATIO * max(1, info.compress_size):
+                continue
+            if extracted + info.file_size > max_bytes:
+                raise UploadTooLarge(MAX_BATCH_EXTRACTED_BYTES)
+            path = Path(dest_dir) / f"{uuid.uuid4().hex}{suffix}"
+            digest = result_hasher(preset, backend)
+            with archive.open(info) as src, open(path, "wb") as dst:
+                while chunk := src.read(UPLOAD_CHUNK_SIZE):
+                    # The header sizes are the archive's claim; count what is read
+                    extracted += len(chunk)
+                    if extracted > max_bytes:
+                        raise UploadTooLarge(MAX_BATCH_EXTRACTED_BYTES)
+                    digest.update(chunk)
+                    dst.write(chunk)
+            images.append((info.filename, path, digest.hexdigest()))
+    return images
+
+def _batch_line(index, name, analysis, profile=False):
+    if analysis is None:
+        return {"index": index, "name": name, "error": "Invalid image format"}
+    line = {
+        "index": index,
+        "name": name,
+        "risk": analysis["risk_level"],
+        "water_coverage": analysis["water_coverage"],
+        "details": analysis["explainability"],
+        "water_bodies": analysis["water_bodies"],
+        "output_image": analysis["output_image"]
+    }
+    if "timings" in analysis:
+        line["timings_ms"] = report_timings(analysis["timings"], profile)
+    return line
+
+async def _batch_item(index, name, path, key, preset, profile=False):
+    try:
+        return _batch_line(index, name, await analyze_cached(key, path, preset), profile)
+    except Exception as e:
+        print(f"Error in batch image {name}: {e}")
+        return {"index": index, "name": name, "error": str(e)}
+    finally:
+        path.unlink(missing_ok=True)
+
+async def _batch_chunk_torch(chunk, preset):
+    """
+    Lines for a micro-batch of (index, (name, path, key)) analyzed as
+    tensor stacks by the torch backend; cached images are not re-analyzed
+    """
+    cache = get_result_cache()
+    lines = {}
+    misses = []
+    try:
+        for index, (name, path, key) in chunk:
+            summary = cache.get(key)
+            if summary is not None:
+                lines[index] = _batch_line(index, name, summary)
+            else:
+                misses.append((index, name, path, key))
+
+        frames = await asyncio.to_thread(
+            lambda: [cv2.imread(str(path), cv2.IMREAD_COLOR) for _, _, path, _ in misses])
+        decoded = []
+        for miss, frame in zip(misses, frames):
+            if frame is None:
+                lines[miss[0]] = _batch_line(miss[0], miss[1], None)
+            else:
+                decoded.append((miss, frame))
+
+        analyses = await asyncio.to_thread(analyze_frames, [frame for _, frame in decoded],
+                                           preset, "torch", TORCH_BATCH_SIZE)
+        for ((index, name, _, key), frame), analysis in zip(decoded, analyses):
+            output = await asyncio.to_thread(annotate_frame, frame, analysis)
+            summary = {
+                "risk_level": analysis["risk_level"],
+                "water_coverage": analysis["water_coverage"],
+                "explainability": analysis["explainability"],
+                "water_bodies": analysis["water_bodies"]
+            }
+            lines[index] = _batch_line(index, name, await asyncio.to_thread(cache.put, key,
+                                                                            summary, output))
+    except Exception as e:
+        print(f"Error in torch batch: {e}")
+        for index, (name, _, _) in chunk:
+            lines.setdefault(index, {"index": index, "name": name, "error": str(e)})
+    finally:
+        for _, (_, path, _) in chunk:
+            path.unlink(missing_ok=True)
+    return [lines[index] for index, _ in chunk]
+
+async def _batch_results(images, work_dir, preset, backend="opencv", profile=False):
+    """
+    Analyze images in the process pool, yielding one NDJSON line per image
+    as soon as it finishes. At most two images per worker are in flight.
+    The torch backend instead takes micro-batches of TORCH_BATCH_SIZE.
+    """
+    started = time.time()
+    max_in_flight = ANALYSIS_WORKERS * 2
+    pending = set()
+    queued = list(enumerate(images))
+    completed = 0
+    try:
+        while backend == "torch" and queued:
+            chunk, queued = queued[:TORCH_BATCH_SIZE], queued[TORCH_BATCH_SIZE:]
+            for line in await _batch_chunk_torch(chunk, preset):
+                completed += 1
+                yield json.dumps(line) + "\n"
+
+        while queued or pending:
+            while queued and len(pending) < max_in_flight:
+                index, (name, path, key) = queued.pop(0)
+                pending.add(asyncio.ensure_future(_batch_item(index, name, path, key, preset,
+                                                              profile)))
+
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                completed += 1
+                yield json.dumps(task.result()) + "\n"
+
+        yield json.dumps({"summary": {"images": completed, "preset": preset, "backend": backend,
+                                      "seconds": round(time.time() - started, 2)}}) + "\n"
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+@router.post("/api/infer/batch")
+async def infer_batch(files: List[UploadFile] = File(...), preset: str = DEFAULT_PRESET,
+                      backend: str = "opencv", profile: bool = False):
+    if preset not in ANALYSIS_PRESETS:
+        return _unknown_preset_response()
+    if backend not in ANALYSIS_BACKENDS:
+        return _unknown_backend_response()
+
+    work_dir = Path(tempfile.mkdtemp(dir=UPLOAD_DIR))
+    try:
+        images = []
+        extracted = 0
+        for file in files:
+            if len(images) >= MAX_BATCH_IMAGES:
+                break
+            if _upload_suffix(file.filename) == ".zip":
+                zip_path = await save_upload(file, work_dir, MAX_BATCH_UPLOAD_BYTES)
+                members = await asyncio.to_thread(_extract_zip_images, zip_path, work_dir,
+                                                  MAX_BATCH_IMAGES - len(images), preset, backend,
+                                                  MAX_BATCH_EXTRACTED_BYTES - extracted)
+                extracted += sum(path.stat().st_size for _, path, _ in members)
+                images += members
+                zip_path.unlink(missing_ok=True)
+            else:
+                digest = result_hasher(preset, backend)
+                path = await save_upload(file, work_dir, MAX_IMAGE_UPLOAD_BYTES, digest=digest)
+                images.append((file.filename, path, digest.hexdigest()))
+
+        if not images:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            return JSONResponse({"error": "No images in batch"}, status_code=400)
+
+        return StreamingResponse(_batch_results(images, work_dir, preset, backend, profile),
+                                 media_type="application/x-ndjson")
+    except UploadTooLarge as e:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        return _upload_too_large_response(e.args[0])
+    except Exception as e:
+        print(f"Error in batch inference: {e}")
+        shutil.rmtree(work_dir, ignore_errors=True)
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+# ==========================
+# INCREMENTAL VIDEO ANALYSIS
+# ==========================
+
+KEYFRAME_INTERVAL = 30           # frames between forced full analyses
+SCENE_CHANGE_THRESHOLD = 0.5     # changed-area fraction that triggers a keyframe
+INCREMENTAL_TOLERANCE = 1.0      # max drift in coverage percentage points
+INCREMENTAL_BLOCK = 32           # change detection block size (pixels)
+BLOCK_CHANGE_LEVEL = 6           # mean abs gray difference marking a block as changed
+PIXEL_NOISE_LEVEL = 12           # per-pixel difference counted as drift outside changed blocks
+MOTION_WIDTH = 256               # working size for coarse global motion estimation
+MOTION_REFINE_WINDOW = 128       # full-resolution window for motion refinement
+
+def _shift_plane(plane, shift):
+    """
+    Translate a plane by whole pixels (dx, dy), filling exposed borders with 0
+    """
+    dx, dy = shift
+    h, w = plane.shape[:2]
+    shifted = np.zeros_like(plane)
+    if abs(dx) < w and abs(dy) < h:
+        shifted[max(0, dy):h + min(0, dy), max(0, dx):w + min(0, dx)] = \
+            plane[max(0, -dy):h + min(0, -dy), max(0, -dx):w + min(0, -dx)]
+    return shifted
+
+def _fill_exposed(plane, shift, value):
+    """
+    Set the border strips uncovered by a (dx, dy) translation to value
+    """
+    dx, dy = shift
+    if dy > 0:
+        plane[:dy] = value
+    elif dy < 0:
+        plane[dy:] = value
+    if dx > 0:
+        plane[:, :dx] = value
+    elif dx < 0:
+        plane[:, dx:] = value
+
+class IncrementalAnalyzer:
+    """
+    Stateful per-video analyzer that runs analyze_frame only on keyframes.
+    Between keyframes the previous water mask is shifted by the estimated
+    global motion and detection is re-run only inside blocks that changed.
+    A keyframe is forced at a fixed interval, on scene changes, and when
+    the accumulated drift bound exceeds the coverage tolerance.
+    """
+
+    def __init__(self, keyframe_interval=KEYFRAME_INTERVAL,
+                 scene_threshold=SCENE_CHANGE_THRESHOLD,
+                 tolerance=INCREMENTAL_TOLERANCE,
+                 block_size=INCREMENTAL_BLOCK):
+        self.keyframe_interval = max(1, keyframe_interval)
+        self.scene_threshold = scene_threshold
+        self.tolerance = tolerance
+        self.block_size = max(8, block_size)
+        self.frames = 0
+        self.keyframes = 0
+        self.redetected_pixels = 0
+        self.total_pixels = 0
+        self._windows = {}
+        self._reset()
+
+    def _reset(self):
+        self._gray = None
+        self._combined = None
+        self._analysis = None
+        self._since_keyframe = 0
+        self._drift = 0.0
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "keyframes": self.keyframes,
+            "redetected_fraction": round(self.redetected_pixels / max(1, self.total_pixels), 4)
+        }
+
+    def process(self, frame):
+        try:
+            self.frames += 1
+            self.total_pixels += frame.shape[0] * frame.shape[1]
+            features = FrameFeatures(frame)
+            gray = features.gray
+
+            if (self._analysis is None or self._gray.shape != gray.shape or
+                    self._since_keyframe + 1 >= self.keyframe_interval):
+                return self._keyframe(features)
+
+            shift = self._estimate_shift(gray)
+            h, w = gray.shape
+
+            # Difference against the motion-compensated previous frame;
+            # newly exposed borders count as fully changed
+            diff = cv2.absdiff(gray, _shift_plane(self._gray, shift))
+            _fill_exposed(diff, shift, 255)
+
+            changed_blocks = self._changed_blocks(diff)
+            changed_fraction = cv2.countNonZero(changed_blocks) / changed_blocks.size
+            if changed_fraction > self.scene_threshold:
+                return self._keyframe(features)
+
+            # Drift bound: noticeably different pixels left outside changed blocks
+            block_mask = cv2.resize(changed_blocks, (w, h), interpolation=cv2.INTER_NEAREST)
+            noisy = cv2.compare(diff, PIXEL_NOISE_LEVEL, cv2.CMP_GT)
+            noisy[block_mask > 0] = 0
+            self._drift += cv2.countNonZero(noisy) / (h * w)
+            if self._drift * 100 > self.tolerance:
+                return self._keyframe(features)
+
+            self._since_keyframe += 1
+            self._gray = gray
+
+            if changed_fraction == 0 and shift == (0, 0):
+                return self._analysis
+
+            combined = _shift_plane(self._combined, shift)
+            self._redetect(frame, combined, changed_blocks)
+            self._combined = combined
+            self._analysis = analyze_water_mask(combined, frame)
+            return self._analysis
+        except Exception as e:
+            print(f"Error in incremental analysis: {e}")
+            self._reset()
+            return analyze_frame(frame)
+
+    def _keyframe(self, features):
+        frame = features.frame
+        combined = detect_water_mask(features)
+        self.keyframes += 1
+        self.redetected_pixels += frame.shape[0] * frame.shape[1]
+        self._gray = features.gray
+        self._combined = combined
+        self._since_keyframe = 0
+        self._drift = 0.0
+        self._analysis = analyze_water_mask(combined, frame)
+        return self._analysis
+
+    def _estimate_shift(self, gray):
+        """
+        Global translation from the previous frame, by phase correlation on
+        downscaled gray frames, refined at full resolution on a central
+        window. Rounded to whole pixels.
+        """
+        h, w = gray.shape
+        scale = max(1, -(-max(h, w) // MOTION_WIDTH))
+        size = (max(16, w // scale), max(16, h // scale))
+        prev_small = cv2.resize(self._gray, size, interpolation=cv2.INTER_AREA).astype(np.float32)
+        cur_small = cv2.resize(gray, size, interpolation=cv2.INTER_AREA).astype(np.float32)
+        (dx, dy), response = cv2.phaseCorrelate(prev_small, cur_small, self._window(size))
+        if response < 0.1:
+            return (0, 0)
+        dx, dy = int(round(dx * w / size[0])), int(round(dy * h / size[1]))
+
+        # Refine on a full-resolution window around the center
+        half = min(MOTION_REFINE_WINDOW // 2, h // 2 - abs(dy) - 1, w // 2 - abs(dx) - 1)
+        if scale > 1 and half >= 16:
+            cy, cx = h // 2, w // 2
+            prev_win = self._gray[cy - dy - half:cy - dy + half, cx - dx - half:cx - dx + half]
+            cur_win = gray[cy - half:cy + half, cx - half:cx + half]
+            (rx, ry), response = cv2.phaseCorrelate(
+                prev_win.astype(np.float32), cur_win.astype(np.float32),
+                self._window((2 * half, 2 * half)))
+            if response >= 0.1:
+                dx, dy = dx + int(round(rx)), dy + int(round(ry))
+        return (dx, dy)
+
+    def _window(self, size):
+        window = self._windows.get(size)
+        if window is None:
+            window = cv2.createHanningWindow(size, cv2.CV_32F)
+            self._windows[size] = window
+        return window
+
+    def _changed_blocks(self, diff):
+        h, w = diff.shape
+        block = self.block_size
+        grid = (-(-w // block), -(-h // block))
+        padded = cv2.copyMakeBorder(diff, 0, grid[1] * block - h, 0, grid[0] * block - w,
+                                    cv2.BORDER_REPLICATE)
+        means = cv2.resize(padded, grid, interpolation=cv2.INTER_AREA)
+        return cv2.compare(means, BLOCK_CHANGE_LEVEL, cv2.CMP_GT)
+
+    def _redetect(self, frame, combined, changed_blocks):
+        """
+        Re-run detection over each changed region, with halo, in place
+        """
+        h, w = combined.shape
+        block = self.block_size
+        count, _, stats, _ = cv2.connectedComponentsWithStats(changed_blocks, connectivity=8)
+        for label in range(1, count):
+            bx, by, bw, bh = stats[label, :4]
+            y0, y1 = by * block, min(h, (by + bh) * block)
+            x0, x1 = bx * block, min(w, (bx + bw) * block)
+            (hy0, hy1, hx0, hx1), core = _with_halo(y0, y1, x0, x1, DETECTION_HALO, h, w)
+            region = detect_water_mask(FrameFeatures(np.ascontiguousarray(frame[hy0:hy1, hx0:hx1])))
+            combined[y0:y1, x0:x1] = region[core]
+            self.redetected_pixels += (y1 - y0) * (x1 - x0)
+
+# ==========================
+# VIDEO PIPELINE
+# ==========================
+
+VIDEO_WORKERS = max(1, os.cpu_count() or 1)
+VIDEO_QUEUE_DEPTH = 8
+# Upper bounds for request parameters: pipeline threads per video and
+# frames held by each queue (a 4K frame is ~25 MB)
+VIDEO_MAX_WORKERS = VIDEO_WORKERS
+VIDEO_MAX_QUEUE_DEPTH = 32
+
+_PIPELINE_END = object()
+
+def process_video_frame(frame):
+    analysis = analyze_frame(frame)
+    return annotate_frame(frame, analysis)
+
+def process_video_batch_torch(frames):
+    analyses = analyze_frames(frames, backend="torch", batch_size=len(frames))
+    return [annotate_frame(frame, analysis) for frame, analysis in zip(frames, analyses)]
+
+def run_video_pipeline(cap, out, process_frame=process_video_frame,
+                       workers=VIDEO_WORKERS, queue_depth=VIDEO_QUEUE_DEPTH,
+                       progress=None, cancel=None, batch_size=1, process_batch=None):
+    """
+    Decode -> analyze -> encode with each stage on its own thread(s).
+    Stages are joined by bounded queues; a pool of analysis threads works
+    on frames concurrently (OpenCV releases the GIL) and the encoder
+    restores frame order before writing. progress(frames_written) is called
+    after each write; setting the cancel event stops every stage.
+    With process_batch, each analysis thread takes up to batch_size frames
+    that are already decoded and processes them in one call.
+    Returns the number of frames written.
+    """
+    if process_batch is None:
+        process_batch = lambda frames: [process_frame(frame) for frame in frames]
+    workers = min(max(1, workers), VIDEO_MAX_WORKERS)
+    queue_depth = min(max(1, queue_depth), VIDEO_MAX_QUEUE_DEPTH)
+    decoded = queue.Queue(maxsize=queue_depth)
+    processed = queue.Queue(maxsize=queue_depth)
+    metrics = get_metrics()
+    metrics.track_queue(decoded)
+    stop = threading.Event()
+    errors = []
+    written = [0]
+
+    def stopped():
+        return stop.is_set() or (cancel is not None and cancel.is_set())
+
+    def put(q, item):
+        while not stopped():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(q):
+        while not stopped():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return None
+
+    def fail(e):
+        errors.append(e)
+        stop.set()
+
+    def decode():
+        try:
+            index = 0
+            while not stopped():
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                if not put(decoded, (index, frame)):
+                    return
+                index += 1
+        except Exception as e:
+            fail(e)
+        finally:
+            for _ in range(workers):
+                put(decoded, _PIPELINE_END)
+
+    def analyze():
+        try:
+            ended = False
+            while not ended:
+                item = get(decoded)
+                if item is None or item is _PIPELINE_END:
+                    break
+                batch = [item]
+                while len(batch) < batch_size:
+                    try:
+                        item = decoded.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _PIPELINE_END:
+                        ended = True
+                        break
+                    batch.append(item)
+                started = time.perf_counter()
+                outputs = process_batch([frame for _, frame in batch])
+                elapsed = (time.perf_counter() - started) / len(batch)
+                for _ in batch:
+                    metrics.observe_stage("video.frame", elapsed)
+                for (index, _), output in zip(batch, outputs):
+                    if not put(processed, (index, output)):
+                        return
+        except Exception as e:
+            fail(e)
+        finally:
+            put(processed, _PIPELINE_END)
+
+    def encode():
+        try:
+            pending = {}
+            finished = 0
+            while finished < workers:
+                item = get(processed)
+                if item is None:
+                    return
+                if item is _PIPELINE_END:
+                    finished += 1
+                    continue
+                index, frame = item
+                pending[index] = frame
+                # Restore frame order
+                while written[0] in pending:
+                    out.write(pending.pop(written[0]))
+                    written[0] += 1
+                    if progress is not None:
+                        progress(written[0])
+        except Exception as e:
+            fail(e)
+
+    threads = [threading.Thread(target=decode, name="video-decode", daemon=True)]
+    threads += [threading.Thread(target=analyze, name=f"video-analyze-{i}", daemon=True)
+                for i in range(workers)]
+    threads.append(threading.Thread(target=encode, name="video-encode", daemon=True))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+    return written[0]
+
+# ==========================
+# VIDEO INFERENCE
+# ==========================
+
+def process_video_file(video_path, out_path, workers=VIDEO_WORKERS,
+                       queue_depth=VIDEO_QUEUE_DEPTH, incremental=False,
+                       keyframe_interval=KEYFRAME_INTERVAL,
+                       tolerance=INCREMENTAL_TOLERANCE, progress=None, cancel=None,
+                       backend="opencv", batch_size=TORCH_BATCH_SIZE):
+    """
+    Analyze and annotate a video file into out_path.
+    Returns the result summary, or None if the video cannot be opened.
+    """
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        return None
+    # Jobs stored before the request limits existed may carry any value
+    batch_size = min(max(1, batch_size), TORCH_MAX_BATCH_SIZE)
+
+    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    w = int(cap.get(3))
+    h = int(cap.get(4))
+
+    out = cv2.VideoWriter(str(out_path), fourcc, fps, (w, h))
+
+    analyzer = None
+    process_batch = None
+    # Frames are analyzed in the process pool; pipeline threads only move them
+    process_frame = process_video_frame_in_pool
+    if backend == "torch" and not incremental:
+        # One thread feeds micro-batches; torch parallelizes inside each
+        process_batch = process_video_batch_torch
+        batch_size = torch_batch_size(batch_size)
+        workers = 1
+    else:
+        batch_size = 1
+    if incremental:
+        # Keyframe state is sequential, so frames go through one analysis worker
+        analyzer = IncrementalAnalyzer(keyframe_interval=keyframe_interval, tolerance=tolerance)
+        process_frame = lambda frame: annotate_frame(frame, analyzer.process(frame))
+        workers = 1
+
+    try:
+        frames = run_video_pipeline(cap, out, process_frame=process_frame,
+                                    workers=workers, queue_depth=max(queue_depth, batch_size),
+                                    progress=progress, cancel=cancel,
+                                    batch_size=batch_size, process_batch=process_batch)
+    finally:
+        cap.release()
+        out.release()
+
+    result = {
+        "status": "done",
+        "frames": frames,
+        "output_video": Path(out_path).name
+    }
+    if analyzer is not None:
+        result["incremental"] = analyzer.stats()
+    return result
+
+@router.post("/api/infer/video")
+async def infer_video(file: UploadFile = File(...),
+                      workers: int = Query(VIDEO_WORKERS, ge=1, le=VIDEO_MAX_WORKERS),
+                      queue_depth: int = Query(VIDEO_QUEUE_DEPTH, ge=1, le=VIDEO_MAX_QUEUE_DEPTH),
+                      incremental: bool = False, keyframe_interval: int = KEYFRAME_INTERVAL,
+                      tolerance: float = INCREMENTAL_TOLERANCE, backend: str = "opencv",
+                      batch_size: int = Query(TORCH_BATCH_SIZE, ge=1, le=TORCH_MAX_BATCH_SIZE)):
+    if backend not in ANALYSIS_BACKENDS:
+        return _unknown_backend_response()
+
+    video_path = None
+    try:
+        video_path = await save_upload(file, UPLOAD_DIR, MAX_VIDEO_UPLOAD_BYTES)
+
+        out_path = new_artifact_path("video", ".mp4")
+        result = await asyncio.to_thread(
+            process_video_file, video_path, out_path, workers=workers,
+            queue_depth=queue_depth, incremental=incremental,
+            keyframe_interval=keyframe_interval, tolerance=tolerance,
+            backend=backend, batch_size=batch_size)
+        if result is None:
+            return JSONResponse({"error": "Invalid video format"}, status_code=400)
+
+        return JSONResponse(result)
+    except UploadTooLarge:
+        return _upload_too_large_response(MAX_VIDEO_UPLOAD_BYTES)
+    except Exception as e:
+        print(f"Error in video inference: {e}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+    finally:
+        if video_path is not None:
+            video_path.unlink(missing_ok=True)
+
+# ==========================
+# VIDEO JOBS
+# ==========================
+
+JOB_DB_PATH = BASE_DIR / "jobs.sqlite3"
+JOB_UPLOAD_DIR = UPLOAD_DIR / "jobs"
+JOB_WORKERS = 2
+JOB_PROGRESS_INTERVAL = 0.5   # seconds between progress writes
+
+JOB_ACTIVE_STATES = ("queued", "running")
+
+class JobStore:
+    """
+    SQLite-backed job records, so job state survives a restart
+    """
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock, self._db:
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    input_path TEXT,
+                    frames_done INTEGER DEFAULT 0,
+                    frames_total INTEGER DEFAULT 0,
+                    fps REAL DEFAULT 0,
+                    eta_seconds REAL,
+                    result TEXT,
+                    error TEXT,
+                    cancel_requested INTEGER DEFAULT 0,
+                    created REAL NOT NULL,
+                    updated REAL NOT NULL
+                )
+            """)
+            # Server process that runs the job (several workers share the database)
+            columns = [row[1] for row in self._db.execute("PRAGMA table_info(jobs)")]
+            if "owner" not in columns:
+                self._db.execute("ALTER TABLE jobs ADD COLUMN owner INTEGER")
+
+    def create(self, job_id, kind, params, input_path):
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO jobs (id, kind, status, params, input_path, owner, created, updated) "
+                "VALUES (?, ?, 'queued', ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(params), str(input_path), os.getpid(), now, now))
+
+    def claim(self, job_id, owner):
+        """
+        Re-queue a job for this process if it still belongs to owner;
+        False if another process claimed it first
+        """
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = 'queued', owner = ?, frames_done = 0, eta_seconds = NULL, "
+                "updated = ? WHERE id = ? AND owner IS ?",
+                (os.getpid(), time.time(), job_id, owner))
+        return cursor.rowcount == 1
+
+    def update(self, job_id, **fields):
+        if "result" in fields and fields["result"] is not None:
+            fields["result"] = json.dumps(fields["result"])
+        fields["updated"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._db:
+            self._db.execute(f"UPDATE jobs SET {columns} WHERE id = ?",
+                             (*fields.values(), job_id))
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list(self, limit=50):
+        with self._lock:
+            rows = self._db.execute("SELECT * FROM jobs ORDER BY created DESC LIMIT ?",
+                                    (limit,)).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def active(self):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM jobs WHERE status IN ('queued', 'running') ORDER BY created"
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def count(self, status):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = ?",
+                                    (status,)).fetchone()[0]
+
+    @staticmethod
+    def _to_dict(row):
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+def _process_alive(pid):
+    if not pid:
+        return False
+    if psutil is not None:
+        return psutil.pid_exists(pid)
+    if os.name == "nt":
+        # os.kill(pid, 0) would send CTRL_C_EVENT on Windows
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class JobManager:
+    """
+    Runs video jobs on a background worker pool with progress and cancellation
+    """
+
+    def __init__(self, store, workers=JOB_WORKERS):
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers),
+                                            thread_name_prefix="video-job")
+        self._cancel_events = {}
+        self._lock = threading.Lock()
+
+    def submit(self, job_id):
+        with self._lock:
+            self._cancel_events[job_id] = threading.Event()
+        self._executor.submit(self._run, job_id)
+
+    def cancel(self, job_id):
+        job = self.store.get(job_id)
+        if job is None or job["status"] not in JOB_ACTIVE_STATES:
+            return job
+        self.store.update(job_id, cancel_requested=1)
+        with self._lock:
+            event = self._cancel_events.get(job_id)
+        if event is not None:
+            event.set()
+        if job["status"] == "queued":
+            # _run will skip it, so drop its upload here
+            self._finish(job, status="cancelled")
+        return self.store.get(job_id)
+
+    def resume(self):
+        """
+        Re-queue jobs left unfinished by a previous run, from the start.
+        Jobs owned by another live server worker are left to it.
+        """
+        for job in self.store.active():
+            if job["owner"] != os.getpid() and _process_alive(job["owner"]):
+                continue
+            if job["cancel_requested"]:
+                self._finish(job, status="cancelled")
+            elif job["input_path"] and Path(job["input_path"]).exists():
+                if self.store.claim(job["id"], job["owner"]):
+                    self.submit(job["id"])
+            else:
+                self.store.update(job["id"], status="failed", error="Input lost during restart")
+
+    def _run(self, job_id):
+        job = self.store.get(job_id)
+        with self._lock:
+            cancel = self._cancel_events.setdefault(job_id, threading.Event())
+        if job is None or job["status"] != "queued":
+            return
+        if job["cancel_requested"]:
+            self._finish(job, status="cancelled")
+            return
+
+        params = job["params"]
+        out_path = OUTPUT_DIR / f"job_{job_id}.mp4"
+        try:
+            cap = cv2.VideoCapture(job["input_path"])
+            frames_total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) if cap.isOpened() else 0
+            cap.release()
+
+            started = time.time()
+            self.store.update(job_id, status="running", frames_total=frames_total)
+            last_write = [0.0]
+
+            def progress(frames_done):
+                now = time.time()
+                if now - last_write[0] < JOB_PROGRESS_INTERVAL:
+                    return
+                last_write[0] = now
+                fps = frames_done / max(now - started, 1e-6)
+                eta = (frames_total - frames_done) / fps if frames_total and fps > 0 else None
+                self.store.update(job_id, frames_done=frames_done, fps=round(fps, 2),
+                                  eta_seconds=round(eta, 1) if eta is not None else None)
+                # The cancel request may have reached another server worker
+                if self.store.get(job_id)["cancel_requested"]:
+                    cancel.set()
+
+            result = process_video_file(job["input_path"], out_path, progress=progress,
+                                        cancel=cancel, **params)
+            if cancel.is_set():
+                out_path.unlink(missing_ok=True)
+                self._finish(job, status="cancelled")
+            elif result is None:
+                self._finish(job, status="failed", error="Invalid video format")
+            else:
+                elapsed = max(time.time() - started, 1e-6)
+                self._finish(job, status="done", result=result, frames_done=result["frames"],
+                             fps=round(result["frames"] / elapsed, 2), eta_seconds=0)
+        except Exception as e:
+            print(f"Error in video job {job_id}: {e}")
+            out_path.unlink(missing_ok=True)
+            self._finish(job, status="failed", error=str(e))
+        finally:
+            with self._lock:
+                self._cancel_events.pop(job_id, None)
+
+    def _finish(self, job, **fields):
+        self.store.update(job["id"], **fields)
+        if job["input_path"]:
+            Path(job["input_path"]).unlink(missing_ok=True)
+
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+def get_job_manager():
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is None:
+            JOB_UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+            _job_manager = JobManager(JobStore(JOB_DB_PATH))
+            _job_manager.resume()
+        return _job_manager
+
+def job_response(job):
+    frames_total = job["frames_total"]
+    return {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "cancel_requested": job["cancel_requested"],
+        "progress": {
+            "frames_done": job["frames_done"],
+            "frames_total": frames_total,
+            "percent": round(100 * job["frames_done"] / frames_total, 1) if frames_total else None,
+            "fps": job["fps"],
+            "eta_seconds": job["eta_seconds"]
+        },
+        "result": job["result"],
+        "error": job["error"],
+        "created": job["created"],
+        "updated": job["updated"]
+    }
+
+@router.post("/api/jobs/video")
+async def submit_video_job(file: UploadFile = File(...),
+                           workers: int = Query(VIDEO_WORKERS, ge=1, le=VIDEO_MAX_WORKERS),
+                           queue_depth: int = Query(VIDEO_QUEUE_DEPTH, ge=1, le=VIDEO_MAX_QUEUE_DEPTH),
+                           incremental: bool = False, keyframe_interval: int = KEYFRAME_INTERVAL,
+                           tolerance: float = INCREMENTAL_TOLERANCE, backend: str = "opencv",
+                           batch_size: int = Query(TORCH_BATCH_SIZE, ge=1, le=TORCH_MAX_BATCH_SIZE)):
+    if backend not in ANALYSIS_BACKENDS:
+        return _unknown_backend_response()
+
+    try:
+        manager = get_job_manager()
+        job_id = uuid.uuid4().hex
+        input_path = await save_upload(file, JOB_UPLOAD_DIR, MAX_VIDEO_UPLOAD_BYTES, name=job_id)
+
+        params = {
+            "workers": workers,
+            "queue_depth": queue_depth,
+            "incremental": incremental,
+            "keyframe_interval": keyframe_interval,
+            "tolerance": tolerance,
+            "backend": backend,
+            "batch_size": batch_size
+        }
+        manager.store.create(job_id, "video", params, input_path)
+        manager.submit(job_id)
+
+        return JSONResponse(job_response(manager.store.get(job_id)), status_code=202)
+    except UploadTooLarge:
+        return _upload_too_large_response(MAX_VIDEO_UPLOAD_BYTES)
+    except Exception as e:
+        print(f"Error submitting video job: {e}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+@router.get("/api/jobs")
+def list_jobs(limit: int = 50):
+    return {"jobs": [job_response(job) for job in get_job_manager().store.list(limit)]}
+
+@router.get("/api/jobs/{job_id}")
+def get_job(job_id: str):
+    job = get_job_manager().store.get(job_id)
+    if job is None:
+        return JSONResponse({"error": "Job not found"}, status_code=404)
+    return job_response(job)
+
+@router.post("/api/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    job = get_job_manager().cancel(job_id)
+    if job is None:
+        return JSONResponse({"error": "Job not found"}, status_code=404)
+    return job_response(job)
+
+# ==========================
+# LIVE STREAMS
+# ==========================
+
+STREAM_PRESET = "fast"
+# Frames older than this when analysis could start on them are dropped
+STREAM_MAX_LATENCY_MS = 1000
+# Latency samples kept per session for the percentiles
+STREAM_LATENCY_WINDOW = 1000
+STREAM_URL_SCHEMES = ("rtsp", "rtsps", "rtmp", "http", "https")
+# Local files (for testing) can only be streamed from this directory
+STREAM_FILE_DIR = BASE_DIR / "test_videos"
+
+_stream_sessions = {}
+
+class StreamSession:
+    """
+    One live stream. Incoming frames go into a single slot, so analysis
+    always takes the newest one: a frame replaced before analysis got to
+    it, or older than the latency bound by then, is dropped instead of
+    queued. Also keeps the session's drop and latency statistics.
+    Used from the event loop only.
+    """
+
+    def __init__(self, source=None, max_latency_ms=STREAM_MAX_LATENCY_MS):
+        self.id = uuid.uuid4().hex[:12]
+        self.source = source
+        self.max_latency = max(0.0, max_latency_ms) / 1000
+        self.started = time.time()
+        self.received = 0
+        self.analyzed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.latencies = deque(maxlen=STREAM_LATENCY_WINDOW)
+        self.finished = False
+        self.disconnected = False
+        self._slot = None
+        self._ready = asyncio.Event()
+
+    def _drop(self, count=1):
+        self.dropped += count
+        get_metrics().stream_frames(dropped=count)
+
+    def offer(self, payload):
+        """Make payload (encoded image bytes or a decoded frame) the newest frame"""
+        if self.finished:
+            return
+        if self._slot is not None:
+            self._drop()
+        get_metrics().stream_frames(received=1)
+        self._slot = (self.received, payload, time.perf_counter())
+        self.received += 1
+        self._ready.set()
+
+    def finish(self):
+        """No more frames; the one waiting is still analyzed"""
+        self.finished = True
+        self._ready.set()
+
+    def close(self):
+        """No more frames and nothing left to analyze"""
+        if self._slot is not None:
+            self._slot = None
+            self._drop()
+        self.finish()
+
+    async def next_frame(self):
+        """
+        (index, payload, arrival time) of the newest frame within the
+        latency bound; None once the stream is finished and drained
+        """
+        while True:
+            if self._slot is None:
+                if self.finished:
+                    return None
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            item, self._slot = self._slot, None
+            if time.perf_counter() - item[2] <= self.max_latency:
+                return item
+            self._drop()
+
+    def completed(self, arrived):
+        """
+        Record a frame whose result is about to go out. Returns its
+        end-to-end latency (arrival to result) in milliseconds.
+        """
+        latency = time.perf_counter() - arrived
+        self.analyzed += 1
+        self.latencies.append(latency)
+        get_metrics().observe_stage("stream.latency", latency)
+        return round(latency * 1000, 1)
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+
+        def percentile(q):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 1)
+
+        elapsed = max(time.time() - self.started, 1e-6)
+        return {
+            "session": self.id,
+            "source": self.source,
+            "received": self.received,
+            "analyzed": self.analyzed,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "drop_rate": round(self.dropped / self.received, 4) if self.received else 0.0,
+            "latency_ms": {"p50": percentile(0.5), "p95": percentile(0.95),
+                           "max": percentile(1.0)},
+            "analyzed_fps": round(self.analyzed / elapsed, 2),
+            "seconds": round(elapsed, 1)
+        }
+
+def open_stream_source(source):
+    """
+    (VideoCapture, is_file) for an RTSP/HTTP(S) URL or a file inside
+    STREAM_FILE_DIR. Raises ValueError for anything else or if the
+    source cannot be opened.
+    """
+    if "://" in source:
+        scheme = source.split("://", 1)[0].lower()
+        if scheme not in STREAM_URL_SCHEMES:
+            raise ValueError(f"stream URLs must use one of {', '.join(STREAM_URL_SCHEMES)}")
+        target, is_file = source, False
+    else:
+        root = STREAM_FILE_DIR.resolve()
+        path = (root / source).resolve()
+        if root not in path.parents or not path.is_file():
+            raise ValueError(f"stream files must be in {STREAM_FILE_DIR.name}/")
+        target, is_file = str(path), True
+
+    cap = cv2.VideoCapture(target)
+    if not cap.isOpened():
+        cap.release()
+        raise ValueError("Cannot open stream source")
+    return cap, is_file
+
+def _read_stream_source(cap, session, loop, stop, paced):
+    """
+    Capture thread: hand every frame to the session until the source ends
+    or stop is set. Paced sources (local files) are read at their frame
+    rate, like a live camera.
+    """
+    fps = cap.get(cv2.CAP_PROP_FPS) if paced else 0
+    interval = 1.0 / fps if fps and fps > 0 else 0.0
+    due = time.perf_counter()
+    try:
+        while not stop.is_set():
+            ret, frame = cap.read()
+            if not ret:
+                break
+            loop.call_soon_threadsafe(session.offer, frame)
+            if interval:
+                due += interval
+                stop.wait(max(0.0, due - time.perf_counter()))
+    except Exception as e:
+        print(f"Error reading stream source: {e}")
+    finally:
+        cap.release()
+        if not loop.is_closed():
+            loop.call_soon_threadsafe(session.finish)
+
+async def _receive_stream_messages(websocket, session, accept_frames):
+    """
+    Client messages: binary messages are encoded frames (when the stream
+    has no source of its own); {"type": "stop"} ends the stream after the
+    frame in hand. A disconnect drops whatever is waiting.
+    """
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                session.disconnected = True
+                session.close()
+                return
+            data = message.get("bytes")
+            if data is not None:
+                if accept_frames and len(data) <= MAX_IMAGE_UPLOAD_BYTES:
+                    session.offer(data)
+                elif accept_frames:
+                    session.failed += 1
+                continue
+            try:
+                command = json.loads(message.get("text") or "null")
+            except ValueError:
+                continue
+            if isinstance(command, dict) and command.get("type") == "stop":
+                session.finish()
+                return
+    except Exception:
+        session.disconnected = True
+        session.close()
+
+def decode_image_bytes(data):
+    """
+    BGR frame from encoded image bytes, or None if they do not decode
+    """
+    try:
+        return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    except cv2.error:
+        return None
+
+async def _stream_error(websocket, message):
+    await websocket.send_json({"type": "error", "error": message})
+    await websocket.close(code=1008)
+
+@router.websocket("/api/stream")
+async def live_stream(websocket: WebSocket, source: Optional[str] = None,
+                      preset: str = STREAM_PRESET,
+                      max_latency_ms: float = STREAM_MAX_LATENCY_MS, annotated: bool = False):
+    """
+    Continuous analysis of a live stream. Frames come from source (an
+    RTSP/HTTP URL or a file in STREAM_FILE_DIR) or, without one, from the
+    client as binary messages holding encoded images. Every analyzed frame
+    is answered with a JSON result, followed by the annotated image as a
+    binary message when annotated is set; a summary with the session's
+    statistics closes the stream.
+    """
+    await websocket.accept()
+    if preset not in ANALYSIS_PRESETS:
+        await _stream_error(websocket, f"preset must be one of {', '.join(ANALYSIS_PRESETS)}")
+        return
+    cap = paced = None
+    if source:
+        try:
+            cap, paced = await asyncio.to_thread(open_stream_source, source)
+        except ValueError as e:
+            await _stream_error(websocket, str(e))
+            return
+
+    session = StreamSession(source, max_latency_ms)
+    _stream_sessions[session.id] = session
+    stop = threading.Event()
+    receiver = asyncio.create_task(_receive_stream_messages(websocket, session, cap is None))
+    if cap is not None:
+        threading.Thread(target=_read_stream_source, name=f"stream-{session.id}", daemon=True,
+                         args=(cap, session, asyncio.get_running_loop(), stop, paced)).start()
+
+    try:
+        await websocket.send_json({"type": "session", "session": session.id, "preset": preset,
+                                   "max_latency_ms": max_latency_ms})
+        while True:
+            item = await session.next_frame()
+            if item is None:
+                break
+            index, frame, arrived = item
+            if isinstance(frame, bytes):
+                frame = await asyncio.to_thread(decode_image_bytes, frame)
+                if frame is None:
+                    session.failed += 1
+                    await websocket.send_json({"type": "error", "frame": index,
+                                               "error": "Invalid image format"})
+                    continue
+
+            summary, output = await analyze_in_pool_async(frame, preset, render=annotated)
+            image = await asyncio.to_thread(encode_image, output) if annotated else None
+            await websocket.send_json({
+                "type": "result",
+                "frame": index,
+                "risk": summary["risk_level"],
+                "water_coverage": summary["water_coverage"],
+                "details": summary["explainability"],
+                "water_bodies": summary["water_bodies"],
+                "latency_ms": session.completed(arrived),
+                "dropped": session.dropped,
+                "drop_rate": round(session.dropped / session.received, 4)
+            })
+            if image is not None:
+                await websocket.send_bytes(image.tobytes())
+
+        if not session.disconnected:
+            await websocket.send_json({"type": "summary", **session.stats()})
+            await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"Error in live stream {session.id}: {e}")
+    finally:
+        stop.set()
+        session.close()
+        receiver.cancel()
+        _stream_sessions.pop(session.id, None)
+
+@router.get("/api/streams")
+def list_streams():
+    return {"streams": [session.stats() for session in _stream_sessions.values()]}
+
+# ==========================
+# LOCATION RE-ANALYSIS
+# ==========================
+
+# Successive images of one location are compared tile by tile at the
+# working resolution; only tiles that changed are analyzed again
+LOCATION_DIR = CACHE_DIR / "locations"
+LOCATION_TILE = 512
+# Share of a tile's pixels whose gray level moved by more than
+# PIXEL_NOISE_LEVEL before the tile counts as changed
+LOCATION_CHANGE_THRESHOLD = 0.005
+# Past this share of changed tiles the whole frame is analyzed at once
+LOCATION_FULL_FRACTION = 0.5
+# Stored locations kept on disk, least recently updated go first
+LOCATION_MAX = 512
+LOCATION_PLANES = ("combined", "mask", "zone_a", "zone_b", "zone_c")
+# zlib level for stored states: level 1 deflates a 4K gray plane in about
+# half the default level's time for 5-15% more bytes
+LOCATION_COMPRESSION = 1
+
+_location_locks = weakref.WeakValueDictionary()
+
+def valid_location_id(location_id):
+    return (0 < len(location_id) <= 64 and not location_id.startswith(".") and
+            all(c.isascii() and (c.isalnum() or c in "-_.") for c in location_id))
+
+def location_state_path(location_id):
+    return LOCATION_DIR / f"{location_id}.npz"
+
+def load_location_state(path):
+    """
+    Stored planes of a location (gray frame, mask and zones at the working
+    resolution, plus the settings they were made with), or None
+    """
+    try:
+        with np.load(path) as stored:
+            state = {name: stored[name] for name in stored.files}
+        for name in LOCATION_PLANES:
+            # Binary planes are stored bit-packed along rows
+            if name in state and "gray" in state and state[name].shape != state["gray"].shape:
+                width = state["gray"].shape[1]
+                state[name] = np.unpackbits(state[name], axis=1, count=width) * np.uint8(255)
+        return state
+    except (OSError, ValueError):
+        return None
+
+def _binary_plane(plane):
+    return cv2.countNonZero(plane) == cv2.countNonZero(cv2.compare(plane, 255, cv2.CMP_EQ))
+
+def save_location_state(path, state):
+    """
+    Write a location's state atomically, then trim the store to LOCATION_MAX.
+    Planes holding only 0 and 255 are bit-packed (zone C can also hold 1s
+    from its uint8 difference) and every array is deflated at
+    LOCATION_COMPRESSION, the .npz layout np.savez_compressed writes.
+    """
+    state = {name: np.packbits(value > 0, axis=1) if name in LOCATION_PLANES and _binary_plane(value)
+             else np.asanyarray(value)
+             for name, value in state.items()}
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED,
+                             compresslevel=LOCATION_COMPRESSION) as archive:
+            for name, value in state.items():
+                with archive.open(f"{name}.npy", "w", force_zip64=True) as member:
+                    np.lib.format.write_array(member, value, allow_pickle=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    stored = sorted(path.parent.glob("*.npz"), key=lambda p: p.stat().st_mtime)
+    for old in stored[:max(0, len(stored) - LOCATION_MAX)]:
+        old.unlink(missing_ok=True)
+
+def changed_tiles(gray, previous_gray, tiles, threshold):
+    """
+    Share of changed pixels in each tile and which tiles pass threshold
+    """
+    changed = cv2.compare(cv2.absdiff(gray, previous_gray), PIXEL_NOISE_LEVEL, cv2.CMP_GT)
+    fractions = np.array([cv2.countNonZero(changed[y0:y1, x0:x1]) / ((y1 - y0) * (x1 - x0))
+                          for y0, y1, x0, x1 in tiles])
+    return fractions, fractions > threshold
+
+def _dirty_tiles(changed, tiles, halo, h, w):
+    """Which tiles have a nonzero pixel of changed within their halo"""
+    dirty = []
+    for y0, y1, x0, x1 in tiles:
+        (hy0, hy1, hx0, hx1), _ = _with_halo(y0, y1, x0, x1, halo, h, w)
+        dirty.append(cv2.countNonZero(changed[hy0:hy1, hx0:hx1]) > 0)
+    return np.array(dirty, dtype=bool)
+
+def reanalyze_location(frame, previous=None, preset=DEFAULT_PRESET, source_scale=1.0,
+                       tile_size=LOCATION_TILE, threshold=LOCATION_CHANGE_THRESHOLD,
+                       timings=None):
+    """
+    Analysis of a new image of a location, reusing the previous image's
+    results where they still hold. Detection runs again only on tiles whose
+    content changed, zones only on tiles whose filtered mask changed
+    (both with their halo, so each tile matches the untiled result). Road
+    suppression, water body typing and the inventory depend on whole
+    regions and run over the full merged mask. Without a usable previous
+    state, or when most tiles changed, the whole frame is analyzed.
+    Returns (analysis, new state, change map).
+    """
+    started = time.perf_counter()
+    h, w = frame.shape[:2]
+    scale = preset_scale(frame.shape, preset)
+    working = frame
+    if scale < 1.0:
+        size = (max(1, round(w * scale)), max(1, round(h * scale)))
+        working = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    total_scale = scale * source_scale
+    features = FrameFeatures(working, total_scale)
+    gray = features.gray
+    wh, ww = gray.shape
+    tiles = list(_tile_grid(wh, ww, tile_size))
+    started = _lap(timings, "resize", started)
+
+    usable = (previous is not None and
+              all(name in previous for name in ("gray", *LOCATION_PLANES)) and
+              previous["gray"].shape == gray.shape and
+              int(previous.get("tile_size", 0)) == tile_size and
+              str(previous.get("preset")) == preset)
+    if usable:
+        fractions, changed = changed_tiles(gray, previous["gray"], tiles, threshold)
+        usable = changed.mean() <= LOCATION_FULL_FRACTION
+    else:
+        fractions = np.ones(len(tiles))
+    if not usable:
+        changed = np.ones(len(tiles), dtype=bool)
+    started = _lap(timings, "compare", started)
+
+    # Per-pixel detection, on changed tiles only
+    if usable:
+        combined = previous["combined"].copy()
+        for (y0, y1, x0, x1), tile_changed in zip(tiles, changed):
+            if tile_changed:
+                (hy0, hy1, hx0, hx1), core = _with_halo(y0, y1, x0, x1, DETECTION_HALO, wh, ww)
+                region = np.ascontiguousarray(working[hy0:hy1, hx0:hx1])
+                combined[y0:y1, x0:x1] = detect_water_mask(FrameFeatures(region, total_scale))[core]
+    else:
+        combined = detect_water_mask(features)
+    started = _lap(timings, "detect", started)
+
+    filtered = suppress_road_false_positives(combined, working, total_scale)
+    started = _lap(timings, "regions.road_suppression", started)
+
+    # Zones, on tiles whose filtered mask changed within the zone halo
+    if usable:
+        rezoned = _dirty_tiles(cv2.compare(filtered, previous["mask"], cv2.CMP_NE),
+                               tiles, ZONE_HALO, wh, ww)
+        zones = {name: previous[name].copy() for name in ("zone_a", "zone_b", "zone_c")}
+        for (y0, y1, x0, x1), tile_dirty in zip(tiles, rezoned):
+            if tile_dirty:
+                (hy0, hy1, hx0, hx1), core = _with_halo(y0, y1, x0, x1, ZONE_HALO, wh, ww)
+                region = np.ascontiguousarray(filtered[hy0:hy1, hx0:hx1])
+                tile_zones = classify_water_zones(region, None, total_scale)
+                for name, zone in zip(("zone_a", "zone_b", "zone_c"), tile_zones):
+                    zones[name][y0:y1, x0:x1] = zone[core]
+    else:
+        rezoned = changed
+        zones = dict(zip(("zone_a", "zone_b", "zone_c"),
+                         classify_water_zones(filtered, working, total_scale)))
+    zone_pixels = [cv2.countNonZero(zone) for zone in zones.values()]
+    started = _lap(timings, "regions.zones", started)
+
+    water_body_type, water_bodies = describe_water_bodies(filtered, working, zones, total_scale)
+    analysis = build_analysis(wh * ww, zone_pixels, water_body_type,
+                              mask_edge_confidence(filtered), zones, filtered, water_bodies)
+    started = _lap(timings, "regions", started)
+
+    state = {"gray": gray, "combined": combined, "mask": filtered, **zones,
+             "tile_size": tile_size, "preset": preset,
+             "water_coverage": analysis["water_coverage"]}
+    if working is not frame:
+        analysis["zones"] = {name: cv2.resize(zone, (w, h), interpolation=cv2.INTER_NEAREST)
+                             for name, zone in zones.items()}
+        analysis["mask"] = cv2.resize(filtered, (w, h), interpolation=cv2.INTER_NEAREST)
+        _lap(timings, "upsample", started)
+
+    rows, cols = -(-wh // tile_size), -(-ww // tile_size)
+    change_map = {
+        "baseline": previous is None,
+        "full": not usable,
+        "tile_size": round(tile_size / total_scale),
+        "rows": rows,
+        "cols": cols,
+        "tiles": len(tiles),
+        "changed_tiles": int(changed.sum()),
+        "rezoned_tiles": int(rezoned.sum()),
+        "changed": changed.reshape(rows, cols).astype(int).tolist(),
+        "change_fraction": np.round(fractions, 4).reshape(rows, cols).tolist()
+    }
+    return analysis, state, change_map
+
+def _analyze_shared_location(frame_name, shape, state_path, encoding, epsilon, preset="full",
+                             source_scale=1.0, tile_size=LOCATION_TILE,
+                             threshold=LOCATION_CHANGE_THRESHOLD, size=None):
+    """
+    Worker: re-analyze a location from the frame held in shared memory and
+    its stored state, then store the new state. Returns the JSON-safe
+    summary with zone masks encoded at the source (width, height) size
+    and the change map.
+    """
+    with attach_shared(frame_name, shape) as frame:
+        timings = {}
+        started = time.perf_counter()
+        previous = load_location_state(state_path)
+        _lap(timings, "load", started)
+        analysis, state, change_map = reanalyze_location(frame, previous, preset, source_scale,
+                                                         tile_size, threshold, timings)
+        del frame
+
+    started = time.perf_counter()
+    save_location_state(state_path, state)
+    started = _lap(timings, "store", started)
+    masks = encode_zones(analysis["zones"], encoding, epsilon, size)
+    _lap(timings, "encode", started)
+
+    if previous is not None and "water_coverage" in previous:
+        change_map["water_coverage_delta"] = round(
+            analysis["water_coverage"] - float(previous["water_coverage"]), 2)
+    return {
+        "risk_level": analysis["risk_level"],
+        "water_coverage": analysis["water_coverage"],
+        "explainability": analysis["explainability"],
+        "water_bodies": analysis["water_bodies"],
+        "masks": masks,
+        "change_map": change_map,
+        "timings": timings
+    }
+
+@router.post("/api/locations/{location_id}/infer")
+async def infer_location(location_id: str, file: UploadFile = File(...),
+                         encoding: str = "packbits", epsilon: float = POLYGON_EPSILON,
+                         preset: str = DEFAULT_PRESET, tile_size: int = LOCATION_TILE,
+                         change_threshold: float = LOCATION_CHANGE_THRESHOLD,
+                         profile: bool = False):
+    """
+    Analyze a new image of a location, re-running analysis only on the
+    tiles that changed since the location's previous image
+    """
+    if not valid_location_id(location_id):
+        return JSONResponse({"error": "location id must be 1-64 letters, digits, '-', '_' or '.'"},
+                            status_code=400)
+    if encoding not in MASK_ENCODINGS:
+        return JSONResponse({"error": f"encoding must be one of {', '.join(MASK_ENCODINGS)}"},
+                            status_code=400)
+    if preset not in ANALYSIS_PRESETS:
+        return _unknown_preset_response()
+
+    image_path = None
+    task = None
+    try:
+        started = time.perf_counter()
+        image_path = await save_upload(file, UPLOAD_DIR, MAX_IMAGE_UPLOAD_BYTES)
+        timings = {}
+        started = _lap(timings, "upload", started)
+        frame, source_scale = await asyncio.to_thread(read_image, image_path, preset)
+        _lap(timings, "decode", started)
+
+        if frame is None:
+            return JSONResponse({"error": "Invalid image format"}, status_code=400)
+
+        size = source_size(image_path, frame, source_scale)
+        task = SharedFrameTask(frame, output=False)
+
+        # Updates of one location run one at a time, each on the state the last one stored
+        lock = _location_locks.get(location_id)
+        if lock is None:
+            lock = _location_locks[location_id] = asyncio.Lock()
+        async with lock:
+            analysis = await asyncio.wrap_future(task.submit_call(
+                _analyze_shared_location, location_state_path(location_id), encoding, max(0.0, epsilon), preset,
+                source_scale, max(64, tile_size), min(max(change_threshold, 0.0), 1.0), size))
+        timings.update(analysis["timings"])
+
+        return JSONResponse({
+            "location": location_id,
+            "risk": analysis["risk_level"],
+            "water_coverage": analysis["water_coverage"],
+            "details": analysis["explainability"],
+            "water_bodies": analysis["water_bodies"],
+            "size": [size[1], size[0]],
+            "encoding": encoding,
+            "masks": analysis["masks"],
+            "change_map": analysis["change_map"],
+            "preset": preset,
+            "timings_ms": report_timings(timings, profile)
+        })
+    except UploadTooLarge:
+        return _upload_too_large_response(MAX_IMAGE_UPLOAD_BYTES)
+    except Exception as e:
+        print(f"Error in location inference: {e}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+    finally:
+        if task is not None:
+            task.close()
+        if image_path is not None:
+            image_path.unlink(missing_ok=True)
+
+@router.delete("/api/locations/{location_id}")
+def forget_location(location_id: str):
+    if not valid_location_id(location_id):
+        return JSONResponse({"error": "Unknown location"}, status_code=404)
+    path = location_state_path(location_id)
+    if not path.exists():
+        return JSONResponse({"error": "Unknown location"}, status_code=404)
+    path.unlink(missing_ok=True)
+    return {"location": location_id, "deleted": True}
+
+# ==========================
+# RASTER INFERENCE
+# ==========================
+
+@router.post("/api/infer/raster")
+async def infer_raster(file: UploadFile = File(...), tile_size: int = TILE_SIZE):
+    try:
+        work_dir = Path(tempfile.mkdtemp(dir=UPLOAD_DIR))
+        try:
+            raster_path = await save_upload(file, work_dir, MAX_RASTER_UPLOAD_BYTES, name="raster")
+
+            raster = await asyncio.to_thread(open_raster, raster_path)
+            if raster is None:
+                return JSONResponse({"error": "Invalid raster format"}, status_code=400)
+
+            raster_npy = raster_path.with_suffix(".npy")
+            analysis = await asyncio.to_thread(analyze_raster_tiled, str(raster_npy),
+                                               str(work_dir), tile_size=max(256, tile_size))
+            preview = await asyncio.to_thread(raster_preview, raster, analysis)
+
+            out_path = new_artifact_path("raster", artifact_suffix())
+            await asyncio.to_thread(write_image_artifact, preview, out_path)
+
+            return JSONResponse({
+                "risk": analysis["risk_level"],
+                "water_coverage": analysis["water_coverage"],
+                "details": analysis["explainability"],
+                "water_bodies": analysis["water_bodies"],
+                "tiles": analysis.get("tiles", 0),
+                "raster_size": [int(raster.shape[1]), int(raster.shape[0])],
+                "output_image": out_path.name
+            })
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    except UploadTooLarge:
+        return _upload_too_large_response(MAX_RASTER_UPLOAD_BYTES)
+    except Exception as e:
+        print(f"Error in raster inference: {e}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+# ==========================
+# APP FACTORY
+# ==========================
+
+def create_app():
+    """
+    Build the FastAPI application. Each server worker calls this once, e.g.
+        uvicorn floodPredictor:create_app --factory --workers 4
+    The color LUT is a memory-mapped file, so workers share its pages.
+    """
+    prepare_dirs()
+    app = FastAPI(title="Flood Risk Predictor Backend")
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.middleware("http")(record_request_metrics)
+    app.middleware("http")(reject_oversized_uploads)
+    app.on_event("startup")(warm_up)
+    app.on_event("shutdown")(shut_down)
+    app.include_router(router)
+
+    # Serve frontend files (AFTER API routes to avoid conflicts)
+    app.mount("/", StaticFiles(directory=STATIC_DIR, html=True), name="static")
+    return app
 
 # ==========================
 # AUTO-LAUNCH
 # ==========================
 
 def launch():
+    import webbrowser
     url = "http://127.0.0.1:8000"
     print("[INFO] Opening browser...")
     webbrowser.open(url)
@@ -807,5 +4491,6 @@ def launch():
 # ==========================
 
 if __name__ == "__main__":
+    import uvicorn
     launch()
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(create_app(), host="0.0.0.0", port=8000)
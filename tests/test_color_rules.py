@@ -0,0 +1,77 @@
+"""
+classify_colors must give the same masks as the per-rule inRange chain
+the detectors used before the color LUT.
+"""
+
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import floodPredictor as fp
+
+
+def reference_masks(frame):
+    """Per-pixel color masks exactly as the detectors built them before the LUT"""
+    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+    lab = cv2.cvtColor(frame, cv2.COLOR_BGR2LAB)
+
+    hsv_water = cv2.inRange(hsv, np.array([80, 30, 30]), np.array([150, 255, 255]))
+    hsv_water = cv2.bitwise_or(hsv_water, cv2.inRange(hsv, np.array([0, 0, 40]), np.array([35, 255, 130])))
+    hsv_water = cv2.bitwise_or(hsv_water, cv2.inRange(hsv, np.array([5, 40, 40]), np.array([30, 220, 170])))
+    hsv_water = cv2.bitwise_or(hsv_water, cv2.inRange(hsv, np.array([90, 20, 50]), np.array([130, 100, 150])))
+
+    vegetation = cv2.bitwise_or(
+        cv2.inRange(hsv, np.array([40, 30, 30]), np.array([85, 200, 180])),
+        cv2.inRange(hsv, np.array([0, 0, 20]), np.array([180, 80, 80])),
+    )
+
+    h, s, v = hsv[:, :, 0], hsv[:, :, 1], hsv[:, :, 2]
+    l, a, b = lab[:, :, 0], lab[:, :, 1], lab[:, :, 2]
+    mixed1 = ((h >= 35) & (h <= 95) & (s >= 30) & (s <= 150) &
+              (v >= 40) & (v <= 180)).astype(np.uint8) * 255
+    mixed2 = ((l >= 40) & (l <= 140) & (a >= 110) & (a <= 135) &
+              (b >= 110) & (b <= 145)).astype(np.uint8) * 255
+    mixed = cv2.bitwise_or(mixed1, mixed2)
+
+    luminance = ((l > 30) & (l < 120)).astype(np.uint8) * 255
+
+    return hsv_water, vegetation, mixed, luminance
+
+
+def lut_masks(frame):
+    rules = fp.classify_colors(frame)
+    return (
+        fp.rule_mask(rules, fp.HSV_WATER_BITS),
+        fp.rule_mask(rules, fp.VEGETATION_BITS),
+        fp.rule_mask(rules, fp.MIXED_BITS),
+        fp.rule_mask(rules, fp.LUMINANCE_BIT),
+    )
+
+
+def assert_same_masks(frame, label):
+    for name, got, expected in zip(("hsv_water", "vegetation", "mixed", "luminance"),
+                                   lut_masks(frame), reference_masks(frame)):
+        assert np.array_equal(got > 0, expected > 0), f"{label}: {name}"
+
+
+def test_every_color():
+    codes = np.arange(1 << 24, dtype=np.uint32)
+    frame = np.stack([codes >> 16, (codes >> 8) & 255, codes & 255], axis=-1)
+    assert_same_masks(frame.astype(np.uint8).reshape(4096, 4096, 3), "all colors")
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_random_frames(seed):
+    rng = np.random.default_rng(seed)
+    h, w = rng.integers(1, 400, 2)
+    assert_same_masks(rng.integers(0, 256, (h, w, 3), dtype=np.uint8), f"random {h}x{w}")
+
+
+def test_test_images():
+    for path in sorted((fp.BASE_DIR / "test_images").glob("*.png")):
+        assert_same_masks(cv2.imread(str(path)), path.name)
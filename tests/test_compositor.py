@@ -0,0 +1,113 @@
+"""
+annotate_frame and composite_zone_overlay must render exactly what the
+original overlay code rendered, including frames too small for the legend.
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import floodPredictor as fp
+
+
+def reference_overlay(heatmaps):
+    """Original zone overlay: one clipped channel sum per zone color"""
+    heatmap_a, heatmap_b, heatmap_c = heatmaps[:, :, 0], heatmaps[:, :, 1], heatmaps[:, :, 2]
+    overlay = np.zeros(heatmaps.shape, dtype=np.uint8)
+    overlay[:, :, 2] = np.clip(overlay[:, :, 2] + (heatmap_a * 255).astype(np.uint8), 0, 255)
+    overlay[:, :, 1] = np.clip(overlay[:, :, 1] + (heatmap_b * 200).astype(np.uint8), 0, 255)
+    overlay[:, :, 2] = np.clip(overlay[:, :, 2] + (heatmap_b * 255).astype(np.uint8), 0, 255)
+    overlay[:, :, 0] = np.clip(overlay[:, :, 0] + (heatmap_c * 255).astype(np.uint8), 0, 255)
+    overlay[:, :, 1] = np.clip(overlay[:, :, 1] + (heatmap_c * 255).astype(np.uint8), 0, 255)
+    return overlay
+
+
+def reference_annotate(frame, analysis):
+    """Original annotate_frame overlay and compositing"""
+    h, w = frame.shape[:2]
+    output = frame.copy()
+    zones = analysis["zones"]
+    heatmaps = fp.create_zone_heatmaps([zones["zone_a"], zones["zone_b"], zones["zone_c"]], frame.shape)
+    output = cv2.addWeighted(output, 0.6, reference_overlay(heatmaps), 0.4, 0)
+
+    output = fp.add_water_edge_labels(output, zones, analysis)
+    risk = analysis["risk_level"]
+    water_type = analysis["explainability"].get("water_body_type", "unknown")
+    header_text = f"FLOOD RISK: {risk} | {water_type.upper()} | Coverage: {analysis['water_coverage']}%"
+    cv2.rectangle(output, (0, 0), (w, 50), (0, 0, 0), -1)
+    risk_colors = {"Minimal": (0, 255, 0), "Low": (0, 200, 100), "Guarded": (0, 255, 255),
+                   "Elevated": (0, 165, 255), "Severe": (0, 100, 255), "Extreme": (0, 0, 255)}
+    cv2.putText(output, header_text, (20, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8,
+                risk_colors.get(risk, (255, 255, 255)), 2)
+
+    # Legend: the original blends a full-frame copy, then draws the items
+    legend_x, legend_y = w - 220, h - 140
+    overlay = output.copy()
+    cv2.rectangle(overlay, (legend_x, legend_y), (legend_x + 200, legend_y + 120), (0, 0, 0), -1)
+    output = cv2.addWeighted(output, 0.7, overlay, 0.3, 0)
+    cv2.putText(output, "FLOOD ANALYSIS", (legend_x + 10, legend_y + 20), cv2.FONT_HERSHEY_SIMPLEX,
+                0.5, (255, 255, 255), 1)
+    y_offset = 40
+    for label, color in (("Core Water", (0, 0, 200)), ("Risk Buffer", (0, 165, 255)),
+                         ("Low Risk", (255, 255, 0))):
+        cv2.rectangle(output, (legend_x + 10, legend_y + y_offset),
+                      (legend_x + 25, legend_y + y_offset + 10), color, -1)
+        cv2.putText(output, label, (legend_x + 35, legend_y + y_offset + 8), cv2.FONT_HERSHEY_SIMPLEX,
+                    0.4, (255, 255, 255), 1)
+        y_offset += 20
+    cv2.putText(output, f"Generated: {time.strftime('%Y-%m-%d %H:%M UTC')}", (20, h - 10),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.4, (200, 200, 200), 1)
+    return output
+
+
+def synthetic_frame(h, w, seed=0):
+    """Blue river band with a lake and speckle on a sand-colored background"""
+    rng = np.random.default_rng(seed)
+    frame = np.full((h, w, 3), (170, 200, 220), dtype=np.uint8)
+    xs = np.arange(w)
+    centre = (h / 2 + h / 6 * np.sin(xs / w * 2 * np.pi)).astype(np.int32)
+    for x, c in zip(xs, centre):
+        frame[max(c - h // 20, 0):c + h // 20, x] = (160, 90, 40)
+    cv2.circle(frame, (w // 4, h // 4), min(h, w) // 10, (150, 100, 50), -1)
+    noise = rng.integers(-20, 20, frame.shape, dtype=np.int16)
+    return np.clip(frame.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+
+@pytest.fixture(autouse=True)
+def fixed_clock(monkeypatch):
+    """Both renderers stamp the time; keep it from changing between them"""
+    monkeypatch.setattr(time, "strftime", lambda fmt, *args: "2026-01-01 00:00 UTC")
+
+
+def assert_identical(frame, label):
+    analysis = fp.analyze_frame(frame)
+    expected = reference_annotate(frame, analysis)
+    assert np.array_equal(fp.annotate_frame(frame, analysis), expected), label
+    out = np.empty_like(frame)
+    assert np.array_equal(fp.annotate_frame(frame, analysis, out=out), expected), f"{label} (out=)"
+
+
+def test_test_images():
+    for path in sorted((fp.BASE_DIR / "test_images").glob("*.png")):
+        assert_identical(cv2.imread(str(path)), path.name)
+
+
+@pytest.mark.parametrize("h, w", [(720, 1280), (90, 160), (150, 120), (40, 300), (300, 40)])
+def test_synthetic_frames(h, w):
+    # Below 220x140 the legend box and text are clipped at the frame edges
+    assert_identical(synthetic_frame(h, w), f"{w}x{h}")
+
+
+def test_overlay_on_random_heatmaps():
+    rng = np.random.default_rng(0)
+    for _ in range(10):
+        h, w = rng.integers(1, 200, 2)
+        heatmaps = rng.random((h, w, 3), dtype=np.float32)
+        heatmaps[rng.random((h, w)) < 0.3] = 1.0
+        assert np.array_equal(fp.composite_zone_overlay(heatmaps), reference_overlay(heatmaps))
@@ -0,0 +1,81 @@
+"""
+Mask endpoints must answer in source pixels when read_image decodes a
+JPEG at reduced size.
+"""
+
+import base64
+import sys
+import zlib
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import floodPredictor as fp
+
+SOURCE_SIZE = (2401, 1803)
+
+
+@pytest.fixture
+def jpeg(tmp_path, monkeypatch):
+    """A JPEG large enough for a 1/2 decode under the fast preset"""
+    path = sorted((fp.BASE_DIR / "test_images").glob("*.png"))[1]
+    frame = cv2.resize(cv2.imread(str(path)), SOURCE_SIZE, interpolation=cv2.INTER_LINEAR)
+    out = tmp_path / "source.jpg"
+    cv2.imwrite(str(out), frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
+    # The Pillow header read, without needing Pillow installed
+    monkeypatch.setattr(fp, "image_size", lambda p: SOURCE_SIZE)
+    return out
+
+
+def decode_packbits(encoded):
+    h, w = encoded["size"]
+    bits = np.frombuffer(zlib.decompress(base64.b64decode(encoded["bits"])), np.uint8)
+    return np.unpackbits(bits)[:h * w].reshape(h, w) * 255
+
+
+def expected_zones(path):
+    frame, scale = fp.read_image(path, "fast")
+    assert scale == 0.5 and frame.shape[1] < SOURCE_SIZE[0]
+    zones = fp.analyze_frame(frame, "fast", scale)["zones"]
+    # zone_c may hold 1 rather than 255; the encoders only keep nonzero
+    return {name: np.where(cv2.resize(zone, SOURCE_SIZE, interpolation=cv2.INTER_NEAREST) > 0,
+                           255, 0).astype(np.uint8)
+            for name, zone in zones.items()}
+
+
+def test_masks_and_polygons_in_source_pixels(jpeg):
+    expected = expected_zones(jpeg)
+    w, h = SOURCE_SIZE
+    with TestClient(fp.create_app()) as client:
+        body = jpeg.read_bytes()
+        packed = client.post("/api/infer/mask?preset=fast",
+                             files={"file": ("source.jpg", body)}).json()
+        assert packed["size"] == [h, w]
+        for name, zone in expected.items():
+            assert np.array_equal(decode_packbits(packed["masks"][name]), zone), name
+
+        geojson = client.post("/api/infer/mask?preset=fast&encoding=geojson",
+                              files={"file": ("source.jpg", body)}).json()
+        for feature in geojson["masks"]["features"]:
+            zone = expected[feature["properties"]["zone"]]
+            assert abs(feature["properties"]["pixels"] - cv2.countNonZero(zone)) <= 0.01 * zone.size
+            points = np.array([p for polygon in feature["geometry"]["coordinates"]
+                               for ring in polygon for p in ring]).reshape(-1, 2)
+            if len(points):
+                assert points.min() >= 0 and (points.max(axis=0) < (w, h)).all()
+                assert points[:, 0].max() > w * 0.6 or points[:, 1].max() > h * 0.6
+
+        located = client.post("/api/locations/reduced-decode-test/infer?preset=fast",
+                              files={"file": ("source.jpg", body)}).json()
+        client.delete("/api/locations/reduced-decode-test")
+        assert located["size"] == [h, w]
+        for name, zone in expected.items():
+            assert np.array_equal(decode_packbits(located["masks"][name]), zone), name
+        change_map = located["change_map"]
+        assert change_map["rows"] == -(-h // change_map["tile_size"])
+        assert change_map["cols"] == -(-w // change_map["tile_size"])
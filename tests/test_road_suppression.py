@@ -0,0 +1,70 @@
+"""
+suppress_road_false_positives must keep exactly the pixels the original
+per-contour loop kept.
+"""
+
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import floodPredictor as fp
+
+
+def reference_suppression(mask, scale=1.0):
+    """Original suppress_road_false_positives: one contour at a time"""
+    opened = cv2.morphologyEx(mask, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2, 2)))
+    contours, _ = cv2.findContours(opened, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    filtered_mask = np.zeros_like(mask)
+    for contour in contours:
+        area = cv2.contourArea(contour)
+        if area < 30 * scale * scale:
+            continue
+        width, height = cv2.minAreaRect(contour)[1]
+        if width > 0 and height > 0:
+            aspect_ratio = max(width, height) / min(width, height)
+            perimeter = cv2.arcLength(contour, True)
+            if perimeter > 0 and (aspect_ratio > 12 or area / (perimeter * perimeter) < 0.005):
+                continue
+        cv2.drawContours(filtered_mask, [contour], -1, 255, -1)
+    return filtered_mask
+
+
+def noisy_mask(rng, h, w):
+    """Blurred speckle with thin lines (roads) and filled or hollow rings"""
+    mask = (rng.random((h, w)) < rng.uniform(0.2, 0.8)).astype(np.uint8) * 255
+    mask = cv2.GaussianBlur(mask, (0, 0), rng.uniform(0.5, 4))
+    mask = (mask > rng.integers(60, 200)).astype(np.uint8) * 255
+    for _ in range(6):
+        start = tuple(int(v) for v in rng.integers(0, (w, h)))
+        end = tuple(int(v) for v in rng.integers(0, (w, h)))
+        cv2.line(mask, start, end, 255, int(rng.integers(1, 4)))
+    for _ in range(3):
+        centre = tuple(int(v) for v in rng.integers(0, (w, h)))
+        cv2.circle(mask, centre, int(rng.integers(3, 40)), int(rng.choice([0, 255])), int(rng.choice([-1, 1, 2])))
+    return mask
+
+
+@pytest.mark.parametrize("scale", [1.0, 0.5, 0.37])
+def test_matches_per_contour_loop_on_noisy_masks(scale):
+    rng = np.random.default_rng(int(scale * 100))
+    for _ in range(100):
+        h, w = rng.integers(20, 300, 2)
+        mask = noisy_mask(rng, h, w)
+        expected = reference_suppression(mask, scale)
+        assert np.array_equal(fp.suppress_road_false_positives(mask, None, scale), expected)
+
+
+def test_matches_per_contour_loop_on_test_images():
+    for path in sorted((fp.BASE_DIR / "test_images").glob("*.png")):
+        mask = fp.detect_water_mask(fp.FrameFeatures(cv2.imread(str(path))))
+        assert np.array_equal(fp.suppress_road_false_positives(mask, None), reference_suppression(mask)), path.name
+
+
+def test_empty_mask():
+    mask = np.zeros((64, 64), np.uint8)
+    assert not fp.suppress_road_false_positives(mask, None).any()
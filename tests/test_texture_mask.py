@@ -0,0 +1,52 @@
+"""
+texture_mask must keep exactly the pixels the original float64 gradient
+magnitude test kept.
+"""
+
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import floodPredictor as fp
+
+
+def reference_texture(gray, ksize, threshold):
+    """Original low-texture mask: sqrt(gx**2 + gy**2) in float64"""
+    grad_x = cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=ksize)
+    grad_y = cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=ksize)
+    return (np.sqrt(grad_x**2 + grad_y**2) < threshold).astype(np.uint8) * 255
+
+
+def gray_frames(rng):
+    """Noise, blurred noise (gradients near the thresholds) and ramps"""
+    for _ in range(20):
+        h, w = rng.integers(1, 300, 2)
+        noise = rng.integers(0, 256, (h, w), dtype=np.uint8)
+        yield noise
+        yield cv2.GaussianBlur(noise, (0, 0), rng.uniform(0.5, 6))
+        step = rng.integers(1, 8)
+        yield (np.arange(w, dtype=np.int64)[None, :] * step + np.arange(h)[:, None] * (8 - step)
+               ).astype(np.uint8)
+
+
+@pytest.mark.parametrize("ksize, threshold", [(3, 15), (5, 25), (3, 25), (5, 15)])
+def test_matches_float64_magnitude(ksize, threshold):
+    rng = np.random.default_rng(ksize * 100 + threshold)
+    for gray in gray_frames(rng):
+        assert np.array_equal(fp.texture_mask(gray, ksize, threshold),
+                              reference_texture(gray, ksize, threshold)), gray.shape
+
+
+def test_matches_float64_magnitude_on_test_images():
+    for path in sorted((fp.BASE_DIR / "test_images").glob("*.png")):
+        gray = cv2.cvtColor(cv2.imread(str(path)), cv2.COLOR_BGR2GRAY)
+        blurred = cv2.GaussianBlur(gray, (9, 9), 0)
+        assert np.array_equal(fp.texture_mask(gray, 3, 15), reference_texture(gray, 3, 15)), path.name
+        out = np.full(gray.shape, 7, np.uint8)
+        assert fp.texture_mask(blurred, 5, 25, out=out) is out
+        assert np.array_equal(out, reference_texture(blurred, 5, 25)), path.name
@@ -0,0 +1,61 @@
+"""
+analyze_raster_tiled must give the same result as analyze_frame on the
+whole raster, whatever the tile size.
+"""
+
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import floodPredictor as fp
+
+
+def synthetic_frame(h, w, seed=0):
+    """Blue river band with a lake and speckle on a sand-colored background"""
+    rng = np.random.default_rng(seed)
+    frame = np.full((h, w, 3), (170, 200, 220), dtype=np.uint8)
+    xs = np.arange(w)
+    centre = (h / 2 + h / 6 * np.sin(xs / w * 2 * np.pi)).astype(np.int32)
+    for x, c in zip(xs, centre):
+        frame[max(c - h // 20, 0):c + h // 20, x] = (160, 90, 40)
+    cv2.circle(frame, (w // 4, h // 4), min(h, w) // 10, (150, 100, 50), -1)
+    noise = rng.integers(-20, 20, frame.shape, dtype=np.int16)
+    return np.clip(frame.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+
+def frames():
+    yield "synthetic 1000x1450", synthetic_frame(1000, 1450)
+    for path in sorted((fp.BASE_DIR / "test_images").glob("*.png"))[:2]:
+        yield path.name, cv2.imread(str(path))
+
+
+@pytest.fixture(scope="module")
+def pool():
+    # Tiles run in threads here, so the test does not spawn worker processes
+    with ThreadPoolExecutor(2) as executor:
+        yield executor
+
+
+@pytest.mark.parametrize("tile_size", [300, 448])
+def test_matches_whole_frame_analysis(tmp_path, pool, tile_size):
+    for i, (name, frame) in enumerate(frames()):
+        # Neither tile size divides any of the frame sides
+        assert frame.shape[0] % tile_size and frame.shape[1] % tile_size
+        work_dir = tmp_path / str(i)
+        work_dir.mkdir()
+        np.save(work_dir / "raster.npy", frame)
+
+        expected = fp.analyze_frame(frame)
+        tiled = fp.analyze_raster_tiled(str(work_dir / "raster.npy"), str(work_dir),
+                                        tile_size=tile_size, pool=pool)
+        assert tiled["tiles"] > 1, name
+        for key in ("risk_level", "water_coverage", "explainability", "water_bodies"):
+            assert tiled[key] == expected[key], f"{name}: {key}"
+        for zone, plane in expected["zones"].items():
+            assert np.array_equal(np.asarray(tiled["zones"][zone]), plane), f"{name}: {zone}"